@@ -3,13 +3,15 @@ import json
 import re
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from flask import Blueprint, jsonify, request
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from . import auth
 from . import config
 from . import db
+from . import fulltext
+from . import image_utils
 from . import static_site
 from . import tagging
 from . import storage
@@ -80,9 +82,18 @@ def _touch_rebuild_flag(reason: str) -> None:
         pass
 
 
+def _mark_dirty(kind: str, refs: Optional[Iterable[str]] = None, reason: str = "") -> None:
+    """
+    记录待重建内容供 worker 增量构建；写库失败时退回强制重建标记。
+    """
+    try:
+        db.mark_dirty(kind, refs, reason)
+    except Exception:
+        _touch_rebuild_flag(reason)
+
+
 def _load_alias_map() -> Dict[str, str]:
-    meta, _ = tagging.load_tags_config()
-    return tagging.build_alias_map(meta)
+    return tagging.tag_registry().alias_map
 
 
 def _parse_tags_input(
@@ -102,10 +113,7 @@ def _parse_tags_input(
 
 
 def _missing_parent_tags(tags: List[str]) -> List[str]:
-    meta, _ = tagging.load_tags_config()
-    alias_map = tagging.build_alias_map(meta)
-    parent_map = tagging.build_parent_map(meta, alias_map)
-    return tagging.missing_parent_tags(tags, parent_map)
+    return tagging.tag_registry().missing_parents(tags)
 
 
 def _allowed_extension_from_mime(mime: str) -> Optional[str]:
@@ -163,6 +171,8 @@ def _resolve_upload_status(uuid_value: str, owner_user_id: int) -> dict:
 
     if _file_exists_with_uuid(config.RAW_DIR, uuid_value):
         return {"stage": "processing", "percent": 60, "message": "处理中"}
+    if _file_exists_with_uuid(config.DEFERRED_DIR, uuid_value):
+        return {"stage": "processing", "percent": 50, "message": "大图排队处理中"}
     if _file_exists_with_uuid(config.QUARANTINE_DIR, uuid_value):
         return {"stage": "failed", "percent": 100, "message": "已隔离"}
     return {"stage": "missing", "percent": 0, "message": "未找到记录"}
@@ -307,7 +317,7 @@ def admin_update_collections():
         storage.fsync_path(cfg_path.parent)
     except Exception:
         pass
-    _touch_rebuild_flag("collections_updated")
+    _mark_dirty("collection", reason="collections_updated")
     return jsonify({"ok": True, "collections": cleaned, "default_collection": default_collection})
 
 
@@ -334,7 +344,7 @@ def admin_update_auth_config():
     if not mode:
         return _json_error("注册模式不正确")
     config.update_auth_config({"registration_mode": mode})
-    _touch_rebuild_flag("auth_config_updated")
+    _mark_dirty("site", reason="auth_config_updated")
     return jsonify({"ok": True, "registration_mode": config.AUTH_REGISTRATION_MODE})
 
 
@@ -451,6 +461,60 @@ def admin_upload_status():
     return resp
 
 
+def _parse_date_arg(raw: Optional[str]) -> Optional[str]:
+    value = str(raw or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError("日期格式应为 YYYY-MM-DD")
+
+
+def _admin_image_filters(args) -> Tuple[List[str], List[Any]]:
+    """
+    把后台作品列表的查询参数翻译成 SQL 条件（分区过滤依赖同步后的 image_collections，由调用方追加）：
+    tag（可多个，与 /api/search 相同：含别名与所有子标签）、owner（用户名）、q（标题/描述/原文件名全文匹配）、
+    orientation（landscape/portrait/square/unknown）、since/until（按上传日期，闭区间）。
+    """
+    where: List[str] = []
+    params: List[Any] = []
+    tag_values = [v for v in args.getlist("tag") if str(v).strip()]
+    if tag_values:
+        tags, err = _parse_tags_input(tag_values)
+        if err:
+            raise ValueError(err)
+        registry = tagging.tag_registry()
+        for tag in tags or []:
+            variants = registry.stored_variants(tag)
+            where.append("uuid IN (SELECT image_uuid FROM image_tags WHERE tag IN (SELECT value FROM json_each(?)))")
+            params.append(json.dumps(variants, ensure_ascii=False))
+    owner = str(args.get("owner") or "").strip()
+    if owner:
+        where.append("owner_user_id = (SELECT id FROM auth_users WHERE username = ?)")
+        params.append(owner)
+    query = str(args.get("q") or "").strip()
+    if query:
+        clause, clause_params = db.text_match_sql("images", query)
+        where.append(clause)
+        params.extend(clause_params)
+    orientation = str(args.get("orientation") or "").strip().lower()
+    if orientation and orientation != "all":
+        clause = static_site.orientation_sql(orientation)
+        if not clause:
+            raise ValueError("orientation 无效")
+        where.append(clause)
+    since = _parse_date_arg(args.get("since"))
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    until = _parse_date_arg(args.get("until"))
+    if until:
+        where.append("created_at < date(?, '+1 day')")
+        params.append(until)
+    return where, params
+
+
 @bp.get("/upload/admin/images")
 def admin_images():
     user = _require_admin()
@@ -458,34 +522,41 @@ def admin_images():
         return _json_error("未授权", 401)
     db.ensure_schema()
     status = (request.args.get("status") or "active").lower()
-    where = "deleted_at IS NULL" if status != "trash" else "deleted_at IS NOT NULL"
+    collection_filter = str(request.args.get("collection") or "").strip()
+    try:
+        limit, cursor = db.parse_page_args(request.args.get("limit"), request.args.get("cursor"), 2)
+        where, params = _admin_image_filters(request.args)
+    except ValueError as exc:
+        return _json_error(str(exc))
+    where.insert(0, "deleted_at IS NULL" if status != "trash" else "deleted_at IS NOT NULL")
+    collection_index = static_site.collection_index()
     with db.connect() as conn:
-        rows = conn.execute(
-            f"""
-            SELECT id AS image_id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height,
-                   sha256, dominant_color, created_at, thumb_path, stored_path,
-                   title_override, description, tags_json, collection_override, deleted_at, trash_path
-            FROM images
-            WHERE {where}
-            ORDER BY created_at DESC
+        if collection_filter:
+            collection_index = static_site.sync_collection_table(conn)
+            where.append(f"{static_site.collection_sql('images')} = ?")
+            params.extend([collection_index.default_collection, collection_filter])
+        rows, next_cursor = db.keyset_page(
+            conn,
             """
-        ).fetchall()
+            id AS image_id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height,
+            sha256, dominant_color, created_at, thumb_path, stored_path,
+            title_override, description, tags_json, collection_override, deleted_at, trash_path
+            """,
+            f"FROM images WHERE {' AND '.join(where)}",
+            params,
+            ("created_at", "id"),
+            cursor,
+            limit,
+        )
 
     alias_map = _load_alias_map()
-    collections_meta, default_collection, _ = static_site.load_collections_config()
     items = []
     for row in rows:
         row_dict = dict(row)
         uuid = row_dict["uuid"]
         tags = _load_tags_from_row(row_dict, alias_map)
         title = row_dict.get("title_override") or static_site.simple_title(row_dict.get("original_name") or "")
-        collection_override = row_dict.get("collection_override")
-        collection = collection_override or default_collection
-        if not collection_override:
-            for key, meta in collections_meta.items():
-                if uuid in meta.get("uuids", set()):
-                    collection = key
-                    break
+        collection = collection_index.resolve(uuid, row_dict.get("collection_override"))
         thumb_path_value = row_dict.get("thumb_path")
         thumb_name = Path(thumb_path_value).name if thumb_path_value else ""
         item = {
@@ -517,6 +588,7 @@ def admin_images():
         {
             "ok": True,
             "images": items,
+            "next_cursor": next_cursor,
             "collections": collections,
             "default_collection": default_collection,
         }
@@ -550,6 +622,7 @@ def admin_update_image(uuid: str):
         row = conn.execute("SELECT uuid FROM images WHERE uuid=?", (uuid,)).fetchone()
         if not row:
             return _json_error("作品不存在", 404)
+        tags_json = json.dumps(tags or [], ensure_ascii=False)
         conn.execute(
             """
             UPDATE images
@@ -559,12 +632,15 @@ def admin_update_image(uuid: str):
             (
                 title or None,
                 description or None,
-                json.dumps(tags or [], ensure_ascii=False),
+                tags_json,
                 collection or None,
                 uuid,
             ),
         )
-    _touch_rebuild_flag("image_metadata_updated")
+        db.write_image_tags(conn, uuid, tags_json)
+        fulltext.update_images(conn, [uuid])
+        db.mark_dirty("image", [uuid], "image_metadata_updated", conn=conn)
+    db.notify_dirty()
     try:
         db.insert_audit("admin_update_image", uuid, user)
     except Exception:
@@ -580,7 +656,7 @@ def admin_delete_image(uuid: str):
     db.ensure_schema()
     with db.transaction() as conn:
         row = conn.execute(
-            "SELECT stored_path, thumb_path, ext, deleted_at FROM images WHERE uuid=?",
+            "SELECT stored_path, thumb_path, thumb_renditions, ext, deleted_at FROM images WHERE uuid=?",
             (uuid,),
         ).fetchone()
         if not row:
@@ -598,6 +674,11 @@ def admin_delete_image(uuid: str):
                 (config.STORAGE / thumb_path).unlink(missing_ok=True)
             except Exception:
                 pass
+        for item in image_utils.parse_renditions(row["thumb_renditions"]):
+            try:
+                (config.THUMB_DIR / item["file"]).unlink(missing_ok=True)
+            except Exception:
+                pass
         now = datetime.datetime.utcnow()
         purge_after = now + datetime.timedelta(days=config.TRASH_RETENTION_DAYS)
         conn.execute(
@@ -608,7 +689,8 @@ def admin_delete_image(uuid: str):
             """,
             (now.isoformat(), trash_path, purge_after.isoformat(), uuid),
         )
-    _touch_rebuild_flag("image_deleted")
+        db.mark_dirty("image", [uuid], "image_deleted", conn=conn)
+    db.notify_dirty()
     try:
         db.insert_audit("admin_delete_image", uuid, user)
     except Exception:
@@ -622,16 +704,22 @@ def admin_tags():
     if not user:
         return _json_error("未授权", 401)
     db.ensure_schema()
-    meta, order = tagging.load_tags_config()
-    alias_map = tagging.build_alias_map(meta)
+    registry = tagging.tag_registry()
+    meta, order, alias_map = registry.meta, registry.order, registry.alias_map
+    # 原始标签经别名映射到规范标签后按作品去重计数；未注册的标签在连接时被丢弃
     with db.connect() as conn:
         rows = conn.execute(
-            "SELECT tags_json FROM images WHERE deleted_at IS NULL"
+            """
+            SELECT alias.value AS tag, COUNT(DISTINCT t.image_uuid) AS count
+            FROM image_tags t
+            JOIN json_each(?) alias ON alias.key = t.tag
+            JOIN images i ON i.uuid = t.image_uuid
+            WHERE i.deleted_at IS NULL
+            GROUP BY alias.value
+            """,
+            (json.dumps(alias_map, ensure_ascii=False),),
         ).fetchall()
-    counts: Dict[str, int] = {}
-    for row in rows:
-        for tag in _load_tags_from_row(dict(row), alias_map):
-            counts[tag] = counts.get(tag, 0) + 1
+    counts: Dict[str, int] = {row["tag"]: row["count"] for row in rows}
     ordered = (order or []) + sorted(meta.keys())
     seen = set()
     tags = []
@@ -714,7 +802,7 @@ def admin_tag_types_update():
     if not cleaned:
         return _json_error("至少保留一个类型")
     tagging.save_tag_types_config(cleaned)
-    _touch_rebuild_flag("tag_types_updated")
+    _mark_dirty("tag", reason="tag_types_updated")
     return jsonify({"ok": True, "types": cleaned})
 
 
@@ -792,7 +880,7 @@ def admin_tags_meta():
     if cycle:
         return _json_error(f"父子标签存在循环: {' > '.join(cycle)}")
     tagging.save_tags_config(meta, order)
-    _touch_rebuild_flag("tag_meta_updated")
+    _mark_dirty("tag", [tag], "tag_meta_updated")
     return jsonify({"ok": True, "tag": tag})
 
 
@@ -816,7 +904,7 @@ def admin_tags_meta_delete():
             info["alias_to"] = ""
     order = [item for item in order if item != tag]
     tagging.save_tags_config(meta, order)
-    _touch_rebuild_flag("tag_meta_deleted")
+    _mark_dirty("tag", [tag], "tag_meta_deleted")
     return jsonify({"ok": True})
 
 
@@ -849,10 +937,24 @@ def admin_wiki_write():
     tmp = wiki_path.with_suffix(".tmp")
     tmp.write_text(markdown, encoding="utf-8")
     tmp.replace(wiki_path)
-    _touch_rebuild_flag("wiki_updated")
+    _mark_dirty("template", ["pages/wiki.html.j2"], "wiki_updated")
     return jsonify({"ok": True})
 
 
+def _images_with_tag(conn, tag: str) -> List[str]:
+    rows = conn.execute(
+        """
+        SELECT t.image_uuid
+        FROM image_tags t
+        JOIN images i ON i.uuid = t.image_uuid
+        WHERE t.tag=? AND i.deleted_at IS NULL
+        ORDER BY t.image_uuid
+        """,
+        (tag,),
+    ).fetchall()
+    return [row["image_uuid"] for row in rows]
+
+
 @bp.post("/upload/admin/tags/rename")
 def admin_tags_rename():
     user = _require_admin()
@@ -874,27 +976,38 @@ def admin_tags_rename():
         return _json_error("新标签已存在")
 
     db.ensure_schema()
-    updated = 0
     with db.transaction() as conn:
-        rows = conn.execute(
-            "SELECT uuid, tags_json FROM images WHERE deleted_at IS NULL"
-        ).fetchall()
-        for row in rows:
-            tag_list = _load_tags_from_row(dict(row))
-            if old_tag not in tag_list:
-                continue
-            new_list = []
-            for tag in tag_list:
-                if tag == old_tag:
-                    if new_tag not in new_list:
-                        new_list.append(new_tag)
-                elif tag not in new_list:
-                    new_list.append(tag)
+        affected = _images_with_tag(conn, old_tag)
+        if affected:
+            scope = json.dumps(affected)
+            # 同一作品已同时带有新旧标签时，只保留排在前面的一个，位置沿用旧标签
+            conn.execute(
+                """
+                DELETE FROM image_tags
+                WHERE tag=? AND image_uuid IN (SELECT value FROM json_each(?))
+                  AND EXISTS (
+                      SELECT 1 FROM image_tags prior
+                      WHERE prior.image_uuid = image_tags.image_uuid AND prior.tag=? AND prior.position < image_tags.position
+                  )
+                """,
+                (new_tag, scope, old_tag),
+            )
             conn.execute(
-                "UPDATE images SET tags_json=?, updated_at=CURRENT_TIMESTAMP WHERE uuid=?",
-                (json.dumps(new_list, ensure_ascii=False), row["uuid"]),
+                """
+                DELETE FROM image_tags
+                WHERE tag=? AND image_uuid IN (SELECT value FROM json_each(?))
+                  AND image_uuid IN (SELECT image_uuid FROM image_tags WHERE tag=?)
+                """,
+                (old_tag, scope, new_tag),
             )
-            updated += 1
+            conn.execute(
+                "UPDATE image_tags SET tag=? WHERE tag=? AND image_uuid IN (SELECT value FROM json_each(?))",
+                (new_tag, old_tag, scope),
+            )
+            db.sync_tags_json(conn, affected)
+            fulltext.update_images(conn, affected)
+            db.mark_dirty("image", affected, "tags_renamed", conn=conn)
+    updated = len(affected)
     if old_tag in meta:
         info = meta.pop(old_tag)
         info["tag"] = new_tag
@@ -904,8 +1017,7 @@ def admin_tags_rename():
             if tagging.normalize_tag(item.get("alias_to") or "") == old_tag:
                 item["alias_to"] = new_tag
         tagging.save_tags_config(meta, order)
-    if updated:
-        _touch_rebuild_flag("tags_renamed")
+    _mark_dirty("tag", [old_tag, new_tag], "tags_renamed")
     return jsonify({"ok": True, "updated": updated})
 
 
@@ -932,21 +1044,16 @@ def admin_tags_delete():
         tagging.save_tags_config(meta, order)
 
     db.ensure_schema()
-    updated = 0
     with db.transaction() as conn:
-        rows = conn.execute(
-            "SELECT uuid, tags_json FROM images WHERE deleted_at IS NULL"
-        ).fetchall()
-        for row in rows:
-            tag_list = _load_tags_from_row(dict(row))
-            if target not in tag_list:
-                continue
-            new_list = [t for t in tag_list if t != target]
+        affected = _images_with_tag(conn, target)
+        if affected:
             conn.execute(
-                "UPDATE images SET tags_json=?, updated_at=CURRENT_TIMESTAMP WHERE uuid=?",
-                (json.dumps(new_list, ensure_ascii=False), row["uuid"]),
+                "DELETE FROM image_tags WHERE tag=? AND image_uuid IN (SELECT value FROM json_each(?))",
+                (target, json.dumps(affected)),
             )
-            updated += 1
-    if updated:
-        _touch_rebuild_flag("tags_deleted")
+            db.sync_tags_json(conn, affected)
+            fulltext.update_images(conn, affected)
+            db.mark_dirty("image", affected, "tags_deleted", conn=conn)
+    updated = len(affected)
+    _mark_dirty("tag", [target], "tags_deleted")
     return jsonify({"ok": True, "updated": updated})
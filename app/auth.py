@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import hashlib
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Iterable, Optional
+from typing import Iterable, Iterator, Optional
 
 from werkzeug.security import check_password_hash, generate_password_hash
 
@@ -17,6 +18,19 @@ class AuthUser:
     is_active: bool
 
 
+@contextmanager
+def _write_scope(conn=None) -> Iterator:
+    """
+    调用方传入 conn 时由调用方负责提交；否则走 db.transaction()，
+    在外层事务中调用时只加深嵌套层级，不会提前提交或回滚外层事务。
+    """
+    if conn is not None:
+        yield conn
+        return
+    with db.transaction() as owned:
+        yield owned
+
+
 def ensure_schema(conn) -> None:
     conn.execute(
         """
@@ -117,10 +131,7 @@ def create_invite(
         raise ValueError("邀请码不能为空")
     if max_uses is not None and max_uses < 1:
         raise ValueError("最大使用次数必须大于 0")
-    owned_conn = conn is None
-    if owned_conn:
-        conn = db.connect()
-    try:
+    with _write_scope(conn) as conn:
         ensure_schema(conn)
         code_hash = _hash_invite(code)
         code_prefix = code[:6]
@@ -136,16 +147,7 @@ def create_invite(
             (code_hash,),
         ).fetchone()
         invite_id = int(row["id"])
-        if owned_conn:
-            conn.commit()
         return invite_id
-    except Exception:
-        if owned_conn:
-            conn.rollback()
-        raise
-    finally:
-        if owned_conn:
-            conn.close()
 
 
 def consume_invite(code: str, user_id: int, *, ip: Optional[str] = None, conn) -> Optional[str]:
@@ -201,10 +203,7 @@ def create_user(
 ) -> AuthUser:
     if not username or not password:
         raise ValueError("用户名或密码不能为空")
-    owned_conn = conn is None
-    if owned_conn:
-        conn = db.connect()
-    try:
+    with _write_scope(conn) as conn:
         ensure_schema(conn)
         password_hash = generate_password_hash(password)
         conn.execute(
@@ -222,40 +221,19 @@ def create_user(
                 "INSERT OR IGNORE INTO auth_user_groups (user_id, group_id) VALUES (?, ?)",
                 (user_id, group_id),
             )
-        if owned_conn:
-            conn.commit()
         return AuthUser(id=user_id, username=user_row["username"], is_active=bool(user_row["is_active"]))
-    except Exception:
-        if owned_conn:
-            conn.rollback()
-        raise
-    finally:
-        if owned_conn:
-            conn.close()
 
 
 def set_password(username: str, password: str, *, conn=None) -> None:
     if not password:
         raise ValueError("密码不能为空")
-    owned_conn = conn is None
-    if owned_conn:
-        conn = db.connect()
-    try:
+    with _write_scope(conn) as conn:
         ensure_schema(conn)
         password_hash = generate_password_hash(password)
         conn.execute(
             "UPDATE auth_users SET password_hash=?, updated_at=CURRENT_TIMESTAMP WHERE username=?",
             (password_hash, username),
         )
-        if owned_conn:
-            conn.commit()
-    except Exception:
-        if owned_conn:
-            conn.rollback()
-        raise
-    finally:
-        if owned_conn:
-            conn.close()
 
 
 def authenticate(username: str, password: str, *, required_group: Optional[str] = None) -> Optional[AuthUser]:
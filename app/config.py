@@ -13,10 +13,15 @@ THUMB_DIR = STORAGE / "thumb"
 TRASH_DIR = STORAGE / "trash"
 WWW_DIR = STORAGE / "www"
 WWW_STAGING = STORAGE / "www_staging"
+GENERATIONS_DIR = STORAGE / "generations"  # 每次发布一个子目录，www 为指向当前发布代的符号链接
 UPLOAD_PAUSE_FLAG = STORAGE / ".upload_paused"
 FORCE_REBUILD_FLAG = STORAGE / ".force_rebuild"
-LAST_STATIC_MTIME = WWW_DIR / ".last_static_mtime"
+BUILD_DIRTY_SIGNAL = STORAGE / ".build_dirty"   # 写入 build_dirty 表后 touch，用于唤醒 worker
+LAST_STATIC_MTIME = STORAGE / ".last_static_mtime"  # 放在发布代之外，回滚切换 www 后标记不随之改变
 STATUS_DATA_DIR = STORAGE / "status_data"
+DEFERRED_DIR = STORAGE / "deferred"
+TEMPLATE_CACHE_DIR = STORAGE / ".jinja_cache"  # Jinja 编译后的字节码缓存，可随时删除
+IMAGE_CONTEXT_CACHE_PATH = STORAGE / ".image_context_cache.json"  # 作品派生渲染上下文缓存，可随时删除
 
 # 上传限制
 MAX_UPLOAD_BYTES = 30 * 1024 * 1024  # 30MB
@@ -44,6 +49,59 @@ THUMB_SIZE = (960, 960)
 THUMB_QUALITY = 82
 THUMB_FORMAT = os.environ.get("GALLERY_THUMB_FORMAT", "WEBP").upper()
 THUMB_EXT = ".webp" if THUMB_FORMAT == "WEBP" else ".jpg"
+# 响应式缩略图阶梯（宽度，px）：在主缩略图之外按级联缩放生成，供 srcset 使用；留空则只保留主缩略图
+THUMB_RENDITION_WIDTHS = tuple(
+    sorted(
+        {int(v) for v in os.environ.get("GALLERY_THUMB_RENDITIONS", "240,480").split(",") if v.strip()},
+        reverse=True,
+    )
+)
+THUMB_AVIF = os.environ.get("GALLERY_THUMB_AVIF", "0") == "1"   # 额外输出 AVIF（需 Pillow 支持，否则忽略）
+THUMB_AVIF_QUALITY = int(os.environ.get("GALLERY_THUMB_AVIF_QUALITY", "60"))
+# 瀑布流卡片宽度约 220-277px，窄屏两列
+THUMB_SIZES_ATTR = os.environ.get("GALLERY_THUMB_SIZES", "(max-width: 640px) 50vw, 280px")
+# 首页与标签页分页：每页作品数（<= 0 关闭分页）
+LIST_PAGE_SIZE = int(os.environ.get("GALLERY_PAGE_SIZE", "60"))
+# 搜索索引分片：每片作品数，分片按内容哈希命名，可长期缓存
+SEARCH_CHUNK_SIZE = int(os.environ.get("GALLERY_SEARCH_CHUNK_SIZE", "500"))
+# 动态搜索接口 /api/search（SQLite FTS5）；静态索引总量超过 SEARCH_API_MIN_INDEX_BYTES 时 search.js 改用接口筛选
+SEARCH_API = os.environ.get("GALLERY_SEARCH_API", "1") != "0"
+SEARCH_API_MIN_INDEX_BYTES = int(os.environ.get("GALLERY_SEARCH_API_MIN_INDEX_BYTES", str(2 * 1024 * 1024)))
+THUMB_REDUCING_GAP = 2              # 先按 DCT/reduce 缩到目标尺寸的 2 倍再重采样，兼顾质量与内存
+# 单张图片解码的峰值内存预算（字节），超出则移入 deferred 目录，空闲时在独立子进程中处理；0 表示不限制
+IMAGE_PEAK_BUDGET_BYTES = int(os.environ.get("GALLERY_IMAGE_PEAK_BUDGET", str(160 * 1024 * 1024)))
+
+# Worker 并行处理（进程数 <= 1 时保持串行；内存上限按解码后像素估算，限制同批并发）
+WORKER_PROCESSES = int(os.environ.get("GALLERY_WORKER_PROCESSES", "1"))
+WORKER_MEMORY_LIMIT_BYTES = int(os.environ.get("GALLERY_WORKER_MEMORY_LIMIT", str(256 * 1024 * 1024)))
+# Worker 唤醒方式：auto（Linux 下用 inotify，不可用时回退轮询）/ poll；事件模式下空闲超时用于周期性维护
+WORKER_WAKEUP = os.environ.get("GALLERY_WORKER_WAKEUP", "auto").lower()
+WORKER_IDLE_TIMEOUT = int(os.environ.get("GALLERY_WORKER_IDLE_TIMEOUT", "60"))
+# /status.html 历史曲线覆盖的时间窗口（秒），快照按写入时间裁剪，与快照频率无关；STATUS_HISTORY_MAX 为条数上限
+STATUS_HISTORY_SECONDS = int(os.environ.get("GALLERY_STATUS_HISTORY_SECONDS", "600"))
+STATUS_HISTORY_MAX = int(os.environ.get("GALLERY_STATUS_HISTORY_MAX", "120"))
+# 合并发布：新图入库后静默 PUBLISH_QUIET_SECONDS 秒再构建；最早一张等待超过 PUBLISH_MAX_DELAY_SECONDS
+# 或累计达到 PUBLISH_MAX_BATCH 张时立即构建
+PUBLISH_QUIET_SECONDS = float(os.environ.get("GALLERY_PUBLISH_QUIET", "3"))
+PUBLISH_MAX_DELAY_SECONDS = float(os.environ.get("GALLERY_PUBLISH_MAX_DELAY", "30"))
+PUBLISH_MAX_BATCH = int(os.environ.get("GALLERY_PUBLISH_MAX_BATCH", "200"))
+# 增量构建克隆已发布站点的方式：auto（reflink -> 硬链接 -> 复制）/ reflink / hardlink / copy
+CLONE_STRATEGY = os.environ.get("GALLERY_CLONE_STRATEGY", "auto").lower()
+# 保留的发布代数量（含当前），用于即时回滚
+PUBLISH_GENERATIONS = max(1, int(os.environ.get("GALLERY_PUBLISH_GENERATIONS", "3")))
+# 发布时的权限处理：delta 只校正本次写入的文件（写入时已带 0644/0755），full 为整树 chmod
+PUBLISH_PERMISSIONS = os.environ.get("GALLERY_PUBLISH_PERMISSIONS", "delta").lower()
+# 周期权限巡检：每次随机抽查的路径数（0 关闭）与间隔秒数；抽查发现异常时再做一次整树修复
+PERMISSION_AUDIT_SAMPLE = int(os.environ.get("GALLERY_PERMISSION_AUDIT_SAMPLE", "64"))
+PERMISSION_AUDIT_INTERVAL = int(os.environ.get("GALLERY_PERMISSION_AUDIT_INTERVAL", "60"))
+# 列表接口（后台作品、我的作品、收藏、画廊）每页条数与上限，按 (时间, id) 键集分页
+API_PAGE_SIZE = int(os.environ.get("GALLERY_API_PAGE_SIZE", "60"))
+API_PAGE_SIZE_MAX = int(os.environ.get("GALLERY_API_PAGE_SIZE_MAX", "200"))
+# SQLite 连接：每个线程复用一条预先配置好的连接（GALLERY_DB_POOL=0 时每次新开）
+DB_POOL = os.environ.get("GALLERY_DB_POOL", "1") != "0"
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("GALLERY_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.environ.get("GALLERY_DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("GALLERY_DB_MMAP_SIZE", str(128 * 1024 * 1024)))
 
 ALLOWED_MIME = {
     "image/jpeg": ".jpg",
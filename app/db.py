@@ -1,27 +1,113 @@
+import base64
+import json
+import os
 import sqlite3
+import threading
 from contextlib import contextmanager
-from typing import Iterator, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from . import config
 
 DB_PATH = config.ROOT / "db" / "gallery.db"
 _SCHEMA_READY = False
+# 迁移所针对的库文件（路径、inode）；库文件被恢复或替换后重新迁移
+_SCHEMA_IDENTITY: Optional[tuple] = None
+_FTS_READY = False
 
 
-def connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+class PooledConnection(sqlite3.Connection):
+    """
+    线程持有的长连接。transaction() 嵌套时只由最外层提交/回滚，期间 `with connect()` 不会提前提交；
+    调用方的 close() 只回滚未提交的改动，连接留给同线程下次使用。
+    """
+
+    depth = 0
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.depth:
+            return False
+        return super().__exit__(exc_type, exc, tb)
+
+    def close(self) -> None:
+        if not self.depth and self.in_transaction:
+            self.rollback()
+
+    def discard(self) -> None:
+        super().close()
+
+
+_local = threading.local()
+# fork 出的子进程不能关闭父进程的 SQLite 句柄，只能丢弃引用；留在这里避免被回收时关闭
+_inherited: list = []
+
+
+def _configure(conn: sqlite3.Connection) -> None:
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA foreign_keys=ON;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)};")
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KB)};")
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+
+
+def _db_identity() -> tuple:
+    try:
+        st = os.stat(DB_PATH)
+        inode = (st.st_dev, st.st_ino)
+    except OSError:
+        inode = None
+    return os.getpid(), str(DB_PATH), inode
+
+
+def connect() -> sqlite3.Connection:
+    """
+    返回当前线程的池化连接（首次使用时打开并设置 PRAGMA）；数据库文件被替换、路径变化或 fork 后重新打开。
+    """
+    if not config.DB_POOL:
+        conn = sqlite3.connect(DB_PATH, timeout=config.DB_BUSY_TIMEOUT_MS / 1000)
+        _configure(conn)
+        return conn
+    identity = _db_identity()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.identity != identity:
+        if _local.identity[0] != identity[0]:
+            _inherited.append(conn)
+        else:
+            conn.discard()
+        conn = None
+    if conn is None:
+        conn = sqlite3.connect(
+            DB_PATH,
+            timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            factory=PooledConnection,
+        )
+        _configure(conn)
+        _local.conn = conn
+        # 新建库文件时 inode 在打开后才确定
+        _local.identity = _db_identity()
     return conn
 
 
+def release_thread_connection() -> None:
+    """
+    关闭当前线程持有的连接（线程退出前或测试清理时调用）。
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.discard()
+
+
 def ensure_schema() -> None:
     """
-    轻量迁移：为现有库补齐新字段与索引。
+    轻量迁移：为现有库补齐新字段与索引。每个进程只做一次，库文件被替换（如从备份恢复）后重做，
+    避免查询依赖的索引（如 images_for_site 指定的 idx_images_site_created）在新文件中缺失。
     """
-    global _SCHEMA_READY
-    if _SCHEMA_READY:
+    global _SCHEMA_READY, _SCHEMA_IDENTITY, _FTS_READY
+    if _SCHEMA_READY and _SCHEMA_IDENTITY == _db_identity()[1:]:
         return
     with connect() as conn:
         cols = {row["name"] for row in conn.execute("PRAGMA table_info(images)").fetchall()}
@@ -34,11 +120,34 @@ def ensure_schema() -> None:
             "deleted_at": "deleted_at DATETIME",
             "trash_path": "trash_path TEXT",
             "purge_after": "purge_after DATETIME",
+            "thumb_renditions": "thumb_renditions TEXT",
         }
         for name, ddl in additions.items():
             if name not in cols:
                 conn.execute(f"ALTER TABLE images ADD COLUMN {ddl}")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_deleted_at ON images(deleted_at)")
+        # 列表接口的热点查询：未删除作品按时间倒序，可再按上传者或状态过滤；部分索引只收录对应行。
+        # 单列 deleted_at 索引会诱使规划器先过滤再排序，由下面的部分索引取代
+        conn.execute("DROP INDEX IF EXISTS idx_images_deleted_at")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_images_live_created ON images(created_at) WHERE deleted_at IS NULL"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_images_trash_created ON images(created_at) WHERE deleted_at IS NOT NULL"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_images_owner_live_created ON images(owner_user_id, created_at) WHERE deleted_at IS NULL"
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_images_site_created ON images(created_at)
+            WHERE status IN ('processed','published') AND deleted_at IS NULL
+            """
+        )
+        build_cols = {row["name"] for row in conn.execute("PRAGMA table_info(builds)").fetchall()}
+        if build_cols and "image_count" not in build_cols:
+            conn.execute("ALTER TABLE builds ADD COLUMN image_count INTEGER")
+        if build_cols and "generation" not in build_cols:
+            conn.execute("ALTER TABLE builds ADD COLUMN generation TEXT")
         from . import auth
 
         auth.ensure_schema(conn)
@@ -57,6 +166,51 @@ def ensure_schema() -> None:
             """
         )
         conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_requests_owner ON upload_requests(owner_user_id)")
+        has_image_tags = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='image_tags'"
+        ).fetchone()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_tags (
+                image_uuid TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (image_uuid, tag),
+                FOREIGN KEY (image_uuid) REFERENCES images(uuid) ON DELETE CASCADE
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_image_tags_tag ON image_tags(tag, image_uuid)")
+        if not has_image_tags:
+            for row in conn.execute(
+                "SELECT uuid, tags_json FROM images WHERE tags_json IS NOT NULL AND tags_json != '[]'"
+            ).fetchall():
+                write_image_tags(conn, row["uuid"], row["tags_json"])
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS image_collections (
+                uuid TEXT PRIMARY KEY,
+                collection TEXT NOT NULL
+            )
+            """
+        )
+        # 物化表/索引的同步状态（已同步的配置摘要等），与被同步的数据在同一事务里更新
+        conn.execute("CREATE TABLE IF NOT EXISTS search_state (key TEXT PRIMARY KEY, value TEXT)")
+        _FTS_READY = _ensure_images_fts(conn)
+        from . import fulltext
+
+        fulltext.ensure_schema(conn)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS build_dirty (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL CHECK (kind IN ('image','tag','collection','site','template')),
+                ref TEXT,
+                reason TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS user_favorites (
@@ -106,20 +260,239 @@ def ensure_schema() -> None:
         conn.execute(
             "CREATE INDEX IF NOT EXISTS idx_user_gallery_images_gallery ON user_gallery_images(gallery_id)"
         )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_gallery_images_order ON user_gallery_images(gallery_id, position, created_at)"
+        )
     _SCHEMA_READY = True
+    # 新建库文件时 inode 在打开后才确定
+    _SCHEMA_IDENTITY = _db_identity()[1:]
+
+
+# images_fts 的列：前三列由触发器随 images 同步，tags 列写入展开后的标签（由 app/fulltext.py 维护）
+FTS_TEXT_COLUMNS = ("title_override", "description", "original_name")
+FTS_COLUMNS = FTS_TEXT_COLUMNS + ("tags",)
+
+
+def _ensure_images_fts(conn: sqlite3.Connection) -> bool:
+    """
+    建立作品全文索引 images_fts（rowid 即 images.id，trigram 分词，中文子串也能命中）。
+    标题/描述/原文件名由触发器随 images 增量更新；后台文本过滤与公开搜索共用这一张表。
+    旧版的外部内容表（无 tags 列）与独立的 search_fts 在这里替换掉。
+    SQLite 未编译 FTS5 时返回 False，文本过滤退回 LIKE。
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='images_fts'").fetchone()
+    if exists:
+        cols = {row["name"] for row in conn.execute("PRAGMA table_info(images_fts)").fetchall()}
+        if "tags" not in cols:
+            for trigger in ("images_fts_insert", "images_fts_delete", "images_fts_update"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute("DROP TABLE images_fts")
+            exists = None
+    conn.execute("DROP TRIGGER IF EXISTS search_fts_purge")
+    conn.execute("DROP TABLE IF EXISTS search_fts")
+    if not exists:
+        try:
+            conn.execute(f"CREATE VIRTUAL TABLE images_fts USING fts5({', '.join(FTS_COLUMNS)}, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            return False
+        conn.execute(
+            f"""
+            INSERT INTO images_fts (rowid, {', '.join(FTS_COLUMNS)})
+            SELECT id, title_override, description, original_name, '' FROM images
+            """
+        )
+        # 标签列尚未写入，交给 fulltext.ensure_schema 回填
+        conn.execute("DELETE FROM search_state WHERE key='tag_signature'")
+    text_columns = ", ".join(FTS_TEXT_COLUMNS)
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+            INSERT INTO images_fts (rowid, {', '.join(FTS_COLUMNS)})
+            VALUES (new.id, new.title_override, new.description, new.original_name, '');
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+            DELETE FROM images_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE OF {text_columns} ON images BEGIN
+            UPDATE images_fts
+            SET title_override = new.title_override, description = new.description, original_name = new.original_name
+            WHERE rowid = new.id;
+        END
+        """
+    )
+    return True
+
+
+def fts_available() -> bool:
+    return _FTS_READY
+
+
+def fts_terms(query: str, columns: Sequence[str], like_table: str) -> Tuple[Optional[str], List[str], List[object]]:
+    """
+    拆分空白分隔的查询，每个词都要命中 columns 中的某一列：
+    不少于 3 个字符的词合成 images_fts 的 MATCH 表达式（trigram 子串匹配），
+    更短的词或无 FTS5 时生成对 like_table 对应列的 LIKE 条件。返回 (MATCH 表达式, LIKE 条件, 参数)。
+    """
+    match_terms: List[str] = []
+    clauses: List[str] = []
+    params: List[object] = []
+    for term in query.split():
+        if _FTS_READY and len(term) >= 3:
+            match_terms.append('"' + term.replace('"', '""') + '"')
+            continue
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append("(" + " OR ".join(f"{like_table}.{col} LIKE ? ESCAPE '\\'" for col in columns) + ")")
+        params.extend([pattern] * len(columns))
+    if not match_terms:
+        return None, clauses, params
+    match = " AND ".join(match_terms)
+    if tuple(columns) != FTS_COLUMNS:
+        match = "{" + " ".join(columns) + "} : (" + match + ")"
+    return match, clauses, params
+
+
+def text_match_sql(alias: str, query: str) -> Tuple[str, List[object]]:
+    """
+    生成标题/描述/原文件名的文本匹配条件：空白分隔的每个词都要命中（不含标签列）。
+    """
+    match, clauses, params = fts_terms(query, FTS_TEXT_COLUMNS, alias)
+    if match:
+        clauses.insert(0, f"{alias}.id IN (SELECT rowid FROM images_fts WHERE images_fts MATCH ?)")
+        params.insert(0, match)
+    return " AND ".join(clauses), params
+
+
+def write_image_tags(conn: sqlite3.Connection, uuid: str, tags_json: Optional[str]) -> None:
+    """
+    过渡期双写：images.tags_json 仍是读取来源，同一事务内把规范化后的原始标签（不做别名解析）
+    按顺序同步到 image_tags，供按标签的集合操作与计数使用。
+    """
+    from . import tagging
+
+    tags = tagging.parse_tags_json(tags_json)
+    conn.execute("DELETE FROM image_tags WHERE image_uuid=?", (uuid,))
+    conn.executemany(
+        "INSERT INTO image_tags (image_uuid, tag, position) VALUES (?, ?, ?)",
+        [(uuid, tag, position) for position, tag in enumerate(tags)],
+    )
+
+
+def sync_tags_json(conn: sqlite3.Connection, uuids: Iterable[str]) -> None:
+    """
+    image_tags 被集合语句改写后，按其内容重新生成这些作品的 tags_json。
+    """
+    conn.execute(
+        """
+        UPDATE images
+        SET tags_json = (
+                SELECT json_group_array(tag)
+                FROM (SELECT tag FROM image_tags WHERE image_uuid = images.uuid ORDER BY position)
+            ),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE uuid IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(list(uuids)),),
+    )
 
 
 @contextmanager
 def transaction() -> Iterator[sqlite3.Connection]:
     conn = connect()
+    if not isinstance(conn, PooledConnection):
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return
+    conn.depth += 1
     try:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
+        if conn.depth == 1:
+            conn.commit()
+    except BaseException:
+        if conn.depth == 1:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        conn.depth -= 1
+
+
+def encode_cursor(values: Sequence[object]) -> str:
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(raw: str, size: int) -> List[object]:
+    try:
+        padded = raw + "=" * (-len(raw) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception as exc:
+        raise ValueError("cursor 无效") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("cursor 无效")
+    # 游标值会原样绑定到 SQL 参数，只接受排序列可能出现的标量（bool 是 int 子类，单独排除）
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError("cursor 无效")
+    return values
+
+
+def parse_page_args(limit_raw: Optional[str], cursor_raw: Optional[str], size: int) -> Tuple[int, Optional[List[object]]]:
+    """
+    解析列表接口的 limit / cursor 参数；limit 缺省为 API_PAGE_SIZE，并截断到 API_PAGE_SIZE_MAX。
+    """
+    limit = config.API_PAGE_SIZE
+    if limit_raw not in (None, ""):
+        try:
+            limit = int(str(limit_raw))
+        except ValueError as exc:
+            raise ValueError("limit 无效") from exc
+        if limit <= 0:
+            raise ValueError("limit 无效")
+    limit = min(limit, config.API_PAGE_SIZE_MAX)
+    cursor = decode_cursor(str(cursor_raw), size) if cursor_raw else None
+    return limit, cursor
+
+
+def keyset_page(
+    conn: sqlite3.Connection,
+    select: str,
+    from_where: str,
+    params: Sequence[object],
+    order: Sequence[str],
+    cursor: Optional[Sequence[object]],
+    limit: int,
+) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """
+    按 order 各列整体倒序的键集分页：from_where 以 WHERE 子句结尾，续页条件以行值比较追加，
+    不随页数增加扫描量。返回本页行与下一页 cursor（没有更多时为 None）。
+    """
+    cursor_columns = ", ".join(f"{column} AS _cursor_{i}" for i, column in enumerate(order))
+    sql = f"SELECT {select}, {cursor_columns} {from_where}"
+    args = list(params)
+    if cursor:
+        sql += f" AND ({', '.join(order)}) < ({', '.join('?' for _ in order)})"
+        args.extend(cursor)
+    sql += " ORDER BY " + ", ".join(f"{column} DESC" for column in order) + " LIMIT ?"
+    args.append(limit + 1)
+    rows = conn.execute(sql, args).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([last[f"_cursor_{i}"] for i in range(len(order))])
 
 
 def insert_audit(event: str, ref: Optional[str], payload: Optional[str] = None) -> None:
@@ -128,3 +501,78 @@ def insert_audit(event: str, ref: Optional[str], payload: Optional[str] = None)
             "INSERT INTO audit_log (event, ref, payload) VALUES (?, ?, ?)",
             (event, ref, payload),
         )
+
+
+DIRTY_KINDS = ("image", "tag", "collection", "site", "template")
+
+
+@dataclass
+class DirtySet:
+    """
+    build_dirty 中 upto 及之前的待重建记录；refs 为 None 表示该类内容整体变化。
+    """
+
+    upto: int = 0
+    refs: Dict[str, Optional[Set[str]]] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.refs)
+
+    def images(self) -> Set[str]:
+        return set(self.refs.get("image") or ())
+
+
+def mark_dirty(
+    kind: str,
+    refs: Optional[Iterable[str]] = None,
+    reason: str = "",
+    conn: Optional[sqlite3.Connection] = None,
+) -> None:
+    """
+    记录待重建内容。传入 conn 时随调用方事务一起提交（调用方提交后再 notify_dirty）；
+    否则自行提交并通知 worker。
+    """
+    if kind not in DIRTY_KINDS:
+        raise ValueError(f"unknown dirty kind: {kind}")
+    values = [str(ref) for ref in refs] if refs is not None else [None]
+    rows = [(kind, ref, reason) for ref in values]
+    if not rows:
+        return
+    if conn is not None:
+        conn.executemany("INSERT INTO build_dirty (kind, ref, reason) VALUES (?, ?, ?)", rows)
+        return
+    ensure_schema()
+    with transaction() as own:
+        own.executemany("INSERT INTO build_dirty (kind, ref, reason) VALUES (?, ?, ?)", rows)
+    notify_dirty()
+
+
+def notify_dirty() -> None:
+    try:
+        config.BUILD_DIRTY_SIGNAL.write_text("1", encoding="utf-8")
+    except OSError:
+        pass
+
+
+def pending_dirty() -> DirtySet:
+    ensure_schema()
+    result = DirtySet()
+    with connect() as conn:
+        rows = conn.execute("SELECT id, kind, ref FROM build_dirty ORDER BY id").fetchall()
+    for row in rows:
+        result.upto = max(result.upto, int(row["id"]))
+        kind = row["kind"]
+        if row["ref"] is None:
+            result.refs[kind] = None
+            continue
+        bucket = result.refs.setdefault(kind, set())
+        if bucket is not None:
+            bucket.add(row["ref"])
+    return result
+
+
+def clear_dirty(upto: int) -> None:
+    if upto <= 0:
+        return
+    with transaction() as conn:
+        conn.execute("DELETE FROM build_dirty WHERE id <= ?", (upto,))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import sqlite3
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from . import db
+from . import static_site
+from . import tagging
+
+# 列权重（bm25，顺序同 db.FTS_COLUMNS）：标题 > 标签 > 简介 > 原文件名
+_WEIGHTS = "10.0, 2.0, 1.0, 5.0"
+_SITE_WHERE = "i.status IN ('processed','published') AND i.deleted_at IS NULL"
+
+_READY = False
+# 按 TagRegistry 快照缓存的标签展开结果，配置未变时不重复计算
+_expansion: Optional[Tuple[tagging.TagRegistry, "_TagExpansion"]] = None
+
+
+def ensure_schema(conn: sqlite3.Connection) -> bool:
+    """
+    公开搜索复用 db 建立的 images_fts，这里只负责其中的 tags 列：写入展开后的标签（别名、所有祖先标签）。
+    标签列依赖标签配置，只能由应用代码维护；索引新建后在此整列回填。
+    SQLite 未编译 FTS5 时返回 False，/api/search 不可用。
+    """
+    global _READY
+    _READY = db.fts_available()
+    if not _READY:
+        return False
+    row = conn.execute("SELECT value FROM search_state WHERE key='tag_signature'").fetchone()
+    if not row:
+        _rebuild_tags(conn, _TagExpansion.load())
+    return True
+
+
+def available() -> bool:
+    return _READY
+
+
+class _TagExpansion:
+    """
+    作品标签 -> 写入索引的标签文本：规范名、别名与全部祖先标签。
+    signature 随别名/父子关系变化，用来判断索引是否需要整体重建。
+    """
+
+    def __init__(self, registry: tagging.TagRegistry):
+        self.registry = registry
+        self.alias_map = registry.alias_map
+        self.aliases = registry.aliases
+        payload = json.dumps([registry.alias_map, registry.parent_map], ensure_ascii=False, sort_keys=True)
+        self.signature = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls) -> "_TagExpansion":
+        global _expansion
+        registry = tagging.tag_registry()
+        if _expansion is None or _expansion[0] is not registry:
+            _expansion = (registry, cls(registry))
+        return _expansion[1]
+
+    def index_text(self, tags_json: Optional[str]) -> str:
+        tags = tagging.parse_tags_json(tags_json, self.alias_map, drop_unknown=True)
+        expanded = self.registry.expand(tags)
+        names = set(expanded)
+        for tag in expanded:
+            names.update(self.aliases.get(tag, []))
+        return " ".join(sorted(names))
+
+
+def _index_rows(conn: sqlite3.Connection, rows: Sequence[sqlite3.Row], expansion: _TagExpansion) -> None:
+    conn.executemany(
+        "UPDATE images_fts SET tags=? WHERE rowid=?",
+        [(expansion.index_text(row["tags_json"]), row["id"]) for row in rows],
+    )
+
+
+_SOURCE_SQL = "SELECT id, tags_json FROM images"
+
+
+def _rebuild_tags(conn: sqlite3.Connection, expansion: _TagExpansion) -> None:
+    _index_rows(conn, conn.execute(_SOURCE_SQL).fetchall(), expansion)
+    conn.execute(
+        "INSERT INTO search_state (key, value) VALUES ('tag_signature', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (expansion.signature,),
+    )
+
+
+def refresh(conn: sqlite3.Connection) -> bool:
+    """
+    标签配置（别名、父子关系）变化后，已写入的展开标签全部过时，整列重写。
+    由 worker 在后台调用；配置未变时只做一次签名比对。返回是否重写了索引。
+    """
+    if not _READY:
+        return False
+    expansion = _TagExpansion.load()
+    row = conn.execute("SELECT value FROM search_state WHERE key='tag_signature'").fetchone()
+    if row and row["value"] == expansion.signature:
+        return False
+    _rebuild_tags(conn, expansion)
+    return True
+
+
+def update_images(conn: sqlite3.Connection, uuids: Iterable[str]) -> None:
+    """
+    在调用方的事务内重写这些作品的标签列（入库、编辑标签后调用；标题/简介由触发器同步）。
+    """
+    if not _READY:
+        return
+    rows = conn.execute(
+        f"{_SOURCE_SQL} WHERE uuid IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(uuids)),),
+    ).fetchall()
+    _index_rows(conn, rows, _TagExpansion.load())
+
+
+def search(
+    conn: sqlite3.Connection,
+    query: str = "",
+    tags: Sequence[str] = (),
+    collection: str = "",
+    orientation: str = "",
+    limit: int = 60,
+    offset: int = 0,
+) -> List[sqlite3.Row]:
+    """
+    站点公开作品的全文检索：q 中空白分隔的词都要在标题/简介/原文件名/展开标签中出现，
+    有可排名的词时按 bm25 排序，否则按上传时间倒序。tags 按层级匹配（选父标签包含子标签作品）。
+    只读已有索引与 image_collections，标签/分区配置刚变化、worker 尚未同步时结果可能暂时是旧的。
+    """
+    expansion = _TagExpansion.load()
+    match, clauses, params = db.fts_terms(query, db.FTS_COLUMNS, "images_fts")
+    where = [_SITE_WHERE] + clauses
+    for tag in tags:
+        variants = expansion.registry.stored_variants(tag)
+        where.append("i.uuid IN (SELECT image_uuid FROM image_tags WHERE tag IN (SELECT value FROM json_each(?)))")
+        params.append(json.dumps(variants, ensure_ascii=False))
+    if collection:
+        index = static_site.collection_index()
+        where.append(f"{static_site.collection_sql('i')} = ?")
+        params.extend([index.default_collection, collection])
+    if orientation:
+        clause = static_site.orientation_sql(orientation, "i")
+        if not clause:
+            raise ValueError("orientation 无效")
+        where.append(clause)
+    order = "i.created_at DESC, i.id DESC"
+    if match:
+        where.insert(0, "images_fts MATCH ?")
+        params.insert(0, match)
+        order = f"bm25(images_fts, {_WEIGHTS}), {order}"
+    source = "images i"
+    if match or clauses:
+        source = "images_fts JOIN images i ON i.id = images_fts.rowid"
+    return conn.execute(
+        f"""
+        SELECT i.id AS image_id, i.uuid, i.original_name, i.ext, i.bytes, i.width, i.height,
+               i.thumb_width, i.thumb_height, i.dominant_color, i.created_at, i.thumb_path, i.stored_path,
+               i.title_override, i.description, i.tags_json, i.collection_override
+        FROM {source}
+        WHERE {' AND '.join(where)}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+        """,
+        params + [limit, offset],
+    ).fetchall()
@@ -1,6 +1,9 @@
 import hashlib
+import io
+import json
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from PIL import Image, ImageStat
 
@@ -9,6 +12,40 @@ from . import config
 Image.MAX_IMAGE_PIXELS = config.MAX_PIXELS
 
 
+class DecodeBudgetExceeded(ValueError):
+    """
+    预估解码峰值内存超过 IMAGE_PEAK_BUDGET_BYTES，交由 deferred 通道处理。
+    """
+
+
+@dataclass(frozen=True)
+class Rendition:
+    filename: str
+    width: int
+    height: int
+    format: str
+
+
+@dataclass(frozen=True)
+class ImageAnalysis:
+    width: int
+    height: int
+    bytes: int
+    sha256: str
+    thumb_width: int
+    thumb_height: int
+    dominant_color: str
+    renditions: Tuple[Rendition, ...] = ()
+
+    def renditions_json(self) -> str:
+        return json.dumps(
+            [
+                {"file": r.filename, "width": r.width, "height": r.height, "format": r.format}
+                for r in self.renditions
+            ]
+        )
+
+
 def compute_sha256(path: Path) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
@@ -28,30 +65,199 @@ def read_dimensions(path: Path) -> Tuple[int, int]:
     return width, height
 
 
+def _thumbnail_size(size: Tuple[int, int]) -> Tuple[int, int]:
+    width, height = size
+    max_w, max_h = config.THUMB_SIZE
+    scale = min(max_w / width, max_h / height, 1.0) if width and height else 1.0
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+def _prepare_reduced_decode(img: Image.Image) -> None:
+    """
+    在 load() 之前调用：JPEG 通过 draft() 走 DCT 缩放，按接近输出尺寸直接解码，
+    峰值内存与 CPU 随输出尺寸而非原图尺寸增长。
+    可上传的格式里只有 JPEG 支持按比例解码；PNG/WebP 在 Pillow 中只能全尺寸解码，
+    峰值内存仍随原图尺寸增长，超大图只能靠解码预算交给 deferred 通道。
+    """
+    if img.format != "JPEG":
+        return
+    thumb_w, thumb_h = _thumbnail_size(img.size)
+    gap = config.THUMB_REDUCING_GAP
+    img.draft(img.mode, (thumb_w * gap, thumb_h * gap))
+
+
+def _reduce_decoded(img: Image.Image) -> Image.Image:
+    """
+    非 JPEG 已按原图尺寸解码完毕，这里先用 reduce() 做整数倍盒式缩小，再交给 thumbnail 精细重采样；
+    只降低重采样的 CPU 开销，不降低解码峰值内存。
+    """
+    if img.mode not in ("L", "LA", "RGB", "RGBA"):
+        return img
+    thumb_w, thumb_h = _thumbnail_size(img.size)
+    gap = config.THUMB_REDUCING_GAP
+    factor = min(img.size[0] // (thumb_w * gap), img.size[1] // (thumb_h * gap))
+    if factor < 2:
+        return img
+    return img.reduce(factor)
+
+
+def _peak_decode_bytes(img: Image.Image) -> int:
+    """
+    按当前（draft 之后的）解码尺寸估算峰值内存：RGBA 解码缓冲 + reduce 中间结果。
+    """
+    width, height = img.size
+    return width * height * 4 * 5 // 4
+
+
+def _thumbnail_image(img: Image.Image) -> Image.Image:
+    img.thumbnail(config.THUMB_SIZE)
+    if config.THUMB_FORMAT == "WEBP":
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            return img.convert("RGBA")
+        return img.convert("RGB")
+    return img.convert("RGB")
+
+
+def _save_thumbnail(thumb: Image.Image, target: Path, fmt: Optional[str] = None) -> None:
+    fmt = fmt or config.THUMB_FORMAT
+    target.parent.mkdir(parents=True, exist_ok=True)
+    save_kwargs = {"quality": config.THUMB_QUALITY}
+    if fmt == "WEBP":
+        save_kwargs["method"] = 6
+    elif fmt == "JPEG":
+        save_kwargs["optimize"] = True
+    elif fmt == "AVIF":
+        save_kwargs["quality"] = config.THUMB_AVIF_QUALITY
+    image = thumb if fmt != "JPEG" or thumb.mode == "RGB" else thumb.convert("RGB")
+    image.save(target, format=fmt, **save_kwargs)
+
+
+def avif_supported() -> bool:
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def rendition_filename(thumb_filename: str, width: Optional[int], ext: str) -> str:
+    """
+    L20250101A001.webp -> L20250101A001-480w.webp；width 为 None 表示与主缩略图同尺寸（仅换格式）。
+    """
+    stem = Path(thumb_filename).stem
+    return f"{stem}-{width}w{ext}" if width else f"{stem}{ext}"
+
+
+def _save_renditions(thumb: Image.Image, target: Path) -> Tuple[Rendition, ...]:
+    """
+    从主缩略图出发逐级缩小（960 -> 480 -> 240），每一级只在上一级结果上重采样，
+    避免对原图重复解码与全尺寸缩放。宽度不小于主缩略图的档位直接跳过。
+    """
+    formats = [(config.THUMB_FORMAT, config.THUMB_EXT)]
+    if config.THUMB_AVIF and avif_supported():
+        formats.append(("AVIF", ".avif"))
+    renditions: List[Rendition] = []
+    if len(formats) > 1:
+        name = rendition_filename(target.name, None, ".avif")
+        _save_thumbnail(thumb, target.with_name(name), "AVIF")
+        renditions.append(Rendition(name, thumb.size[0], thumb.size[1], "avif"))
+    current = thumb
+    for width in config.THUMB_RENDITION_WIDTHS:
+        if width >= thumb.size[0]:
+            continue
+        height = max(round(current.size[1] * width / current.size[0]), 1)
+        current = current.resize((width, height), Image.LANCZOS)
+        for fmt, ext in formats:
+            name = rendition_filename(target.name, width, ext)
+            _save_thumbnail(current, target.with_name(name), fmt)
+            renditions.append(Rendition(name, width, height, fmt.lower()))
+    return tuple(renditions)
+
+
+def parse_renditions(raw: Optional[str]) -> List[dict]:
+    if not raw:
+        return []
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict) and item.get("file") and item.get("width")]
+
+
+def _mean_color(img: Image.Image) -> str:
+    small = img.convert("RGB").resize((32, 32))
+    stat = ImageStat.Stat(small)
+    r, g, b = [int(c) for c in stat.mean]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
 def make_thumbnail(source: Path, target: Path) -> Tuple[int, int]:
     with Image.open(source) as img:
+        _prepare_reduced_decode(img)
         img.load()
-        img.thumbnail(config.THUMB_SIZE)
-        if config.THUMB_FORMAT == "WEBP":
-            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
-                rgb = img.convert("RGBA")
-            else:
-                rgb = img.convert("RGB")
-        else:
-            rgb = img.convert("RGB")
-        target.parent.mkdir(parents=True, exist_ok=True)
-        save_kwargs = {"quality": config.THUMB_QUALITY}
-        if config.THUMB_FORMAT == "WEBP":
-            save_kwargs["method"] = 6
-        elif config.THUMB_FORMAT == "JPEG":
-            save_kwargs["optimize"] = True
-        rgb.save(target, format=config.THUMB_FORMAT, **save_kwargs)
-        return rgb.size
+        thumb = _thumbnail_image(_reduce_decoded(img))
+        _save_thumbnail(thumb, target)
+        return thumb.size
 
 
 def dominant_color(path: Path) -> str:
     with Image.open(path) as img:
-        small = img.convert("RGB").resize((32, 32))
-    stat = ImageStat.Stat(small)
-    r, g, b = [int(c) for c in stat.mean]
-    return f"#{r:02x}{g:02x}{b:02x}"
+        return _mean_color(img)
+
+
+def analyze_image(
+    path: Path,
+    thumb_target: Path,
+    budget_bytes: Optional[int] = None,
+) -> ImageAnalysis:
+    """
+    单次读取、单次解码：读文件时同步计算 SHA256，
+    尺寸、缩略图、响应式多尺寸版本与主色均从内存中的同一份图像得到。
+    完整解码本身即是数据校验，损坏文件会在此抛出异常。
+    解码前按缩小后的尺寸预估峰值内存，超出 budget_bytes（默认 IMAGE_PEAK_BUDGET_BYTES，
+    0 表示不限制）时抛出 DecodeBudgetExceeded，不进入解码。
+    """
+    if budget_bytes is None:
+        budget_bytes = config.IMAGE_PEAK_BUDGET_BYTES
+    h = hashlib.sha256()
+    buffer = io.BytesIO()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(config.CHUNK_SIZE), b""):
+            h.update(chunk)
+            buffer.write(chunk)
+    size_bytes = buffer.tell()
+    buffer.seek(0)
+    with Image.open(buffer) as img:
+        width, height = img.size
+        if width * height > config.MAX_PIXELS:
+            raise ValueError("像素数超限")
+        _prepare_reduced_decode(img)
+        peak = size_bytes + _peak_decode_bytes(img)
+        if budget_bytes and peak > budget_bytes:
+            raise DecodeBudgetExceeded(f"预估解码内存 {peak} 超出预算 {budget_bytes}")
+        img.load()
+        thumb = _thumbnail_image(_reduce_decoded(img))
+    _save_thumbnail(thumb, thumb_target)
+    renditions = _save_renditions(thumb, thumb_target)
+    color = _mean_color(thumb)
+    return ImageAnalysis(
+        width=width,
+        height=height,
+        bytes=size_bytes,
+        sha256=h.hexdigest(),
+        thumb_width=thumb.size[0],
+        thumb_height=thumb.size[1],
+        dominant_color=color,
+        renditions=renditions,
+    )
+
+
+def estimate_decode_bytes(path: Path) -> int:
+    """
+    仅读取文件头，估算解码峰值内存（已计入 JPEG 的 DCT 缩放），供并行处理做准入控制。
+    """
+    try:
+        with Image.open(path) as img:
+            _prepare_reduced_decode(img)
+            return _peak_decode_bytes(img)
+    except Exception:
+        return 0
@@ -1,8 +1,9 @@
 import datetime
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Set, Tuple
 
 from . import config
 from . import db
@@ -51,13 +52,26 @@ def cleanup_upload_tmp(max_age_hours: int = config.CLEANUP_TMP_MAX_AGE_HOURS) ->
     return removed
 
 
+def _referenced_thumb_names() -> Set[str]:
+    db.ensure_schema()
+    with db.connect() as conn:
+        rows = conn.execute(
+            "SELECT thumb_path, thumb_renditions FROM images WHERE thumb_path IS NOT NULL"
+        ).fetchall()
+    keep: Set[str] = set()
+    for row in rows:
+        if not row["thumb_path"]:
+            continue
+        keep.add(Path(row["thumb_path"]).name)
+        keep.update(item["file"] for item in image_utils.parse_renditions(row["thumb_renditions"]))
+    return keep
+
+
 def cleanup_orphan_thumbs() -> List[str]:
     removed: List[str] = []
     if not config.THUMB_DIR.exists():
         return removed
-    with db.connect() as conn:
-        rows = conn.execute("SELECT thumb_path FROM images WHERE thumb_path IS NOT NULL").fetchall()
-    keep = {Path(row["thumb_path"]).name for row in rows if row["thumb_path"]}
+    keep = _referenced_thumb_names()
     for path in config.THUMB_DIR.iterdir():
         if not path.is_file():
             continue
@@ -140,9 +154,7 @@ def scan_consistency() -> Dict[str, List[str]]:
             except Exception:
                 pass
 
-    with db.connect() as conn:
-        thumb_rows = conn.execute("SELECT thumb_path FROM images WHERE thumb_path IS NOT NULL").fetchall()
-    keep_thumbs = {Path(row["thumb_path"]).name for row in thumb_rows if row["thumb_path"]}
+    keep_thumbs = _referenced_thumb_names()
     orphan_thumbs: List[str] = []
     if config.THUMB_DIR.exists():
         for path in config.THUMB_DIR.iterdir():
@@ -194,6 +206,19 @@ def run_maintenance() -> Dict[str, List[str]]:
     return report
 
 
+def _regenerate_analysis(raw_path: Path, thumb_path: Path) -> image_utils.ImageAnalysis:
+    """
+    按常规预算解码；超出预算的大图与 deferred 通道一样，不设预算放到独立的单进程子进程里解码，
+    子进程被 OOM 杀死也只影响这一张。
+    """
+    try:
+        return image_utils.analyze_image(raw_path, thumb_path)
+    except image_utils.DecodeBudgetExceeded:
+        pass
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(worker.analyze_raw_file, str(raw_path), str(thumb_path), 0).result()
+
+
 def regenerate_thumbnails(publish: bool = True) -> Dict[str, object]:
     """
     重新从原图生成缩略图，替换旧 JPG/WebP。
@@ -206,7 +231,7 @@ def regenerate_thumbnails(publish: bool = True) -> Dict[str, object]:
     with db.connect() as conn:
         rows = conn.execute(
             """
-            SELECT uuid, stored_path, thumb_path, deleted_at
+            SELECT uuid, stored_path, thumb_path, thumb_renditions, deleted_at
             FROM images
             """
         ).fetchall()
@@ -229,8 +254,7 @@ def regenerate_thumbnails(publish: bool = True) -> Dict[str, object]:
             new_name = worker.next_thumb_filename()
         new_path = config.THUMB_DIR / new_name
         try:
-            thumb_width, thumb_height = image_utils.make_thumbnail(raw_path, new_path)
-            color = image_utils.dominant_color(new_path)
+            analysis = _regenerate_analysis(raw_path, new_path)
         except Exception as exc:  # noqa: BLE001
             failed.append(f"{uuid}:{exc}")
             continue
@@ -238,15 +262,26 @@ def regenerate_thumbnails(publish: bool = True) -> Dict[str, object]:
             conn.execute(
                 """
                 UPDATE images
-                SET thumb_path=?, thumb_width=?, thumb_height=?, dominant_color=?, updated_at=CURRENT_TIMESTAMP
+                SET thumb_path=?, thumb_width=?, thumb_height=?, thumb_renditions=?, dominant_color=?,
+                    updated_at=CURRENT_TIMESTAMP
                 WHERE uuid=?
                 """,
-                (f"thumb/{new_name}", thumb_width, thumb_height, color, uuid),
+                (
+                    f"thumb/{new_name}",
+                    analysis.thumb_width,
+                    analysis.thumb_height,
+                    analysis.renditions_json(),
+                    analysis.dominant_color,
+                    uuid,
+                ),
             )
-        if old_name and old_name != new_name:
-            old_file = config.THUMB_DIR / old_name
+        stale = {item["file"] for item in image_utils.parse_renditions(row["thumb_renditions"])}
+        if old_name:
+            stale.add(old_name)
+        stale -= {new_name} | {r.filename for r in analysis.renditions}
+        for name in stale:
             try:
-                old_file.unlink(missing_ok=True)
+                (config.THUMB_DIR / name).unlink(missing_ok=True)
             except Exception:
                 pass
         updated += 1
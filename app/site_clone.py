@@ -0,0 +1,128 @@
+import errno
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 非 POSIX 平台
+    fcntl = None
+
+from . import config
+
+REFLINK = "reflink"
+HARDLINK = "hardlink"
+COPY = "copy"
+STRATEGIES = (REFLINK, HARDLINK, COPY)
+
+_FICLONE = 0x40049409
+# 这些错误说明整个文件系统不支持该方式，本次克隆内不再尝试
+_UNSUPPORTED_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV, errno.ENOSYS, errno.EPERM}
+
+
+@dataclass
+class CloneStats:
+    strategy: str = ""
+    files: int = 0
+    reflinked: int = 0
+    linked: int = 0
+    copied: int = 0
+    bytes_copied: int = 0
+    dirs: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["seconds"] = round(self.seconds, 4)
+        return data
+
+
+def strategy_chain(preferred: Optional[str] = None) -> List[str]:
+    """
+    由 GALLERY_CLONE_STRATEGY 决定尝试顺序：auto 依次为 reflink、硬链接、复制；
+    指定某一方式时只在它失败后退回复制。
+    """
+    preferred = (preferred or config.CLONE_STRATEGY or "auto").strip().lower()
+    if preferred in (REFLINK, HARDLINK):
+        return [preferred, COPY]
+    if preferred == COPY:
+        return [COPY]
+    chain = [HARDLINK, COPY]
+    if fcntl is not None:
+        chain.insert(0, REFLINK)
+    return chain
+
+
+def _reflink(src: str, dst: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink 不可用")
+    with open(src, "rb") as fsrc:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            fcntl.ioctl(fd, _FICLONE, fsrc.fileno())
+        except OSError:
+            os.close(fd)
+            os.unlink(dst)
+            raise
+        os.close(fd)
+    shutil.copystat(src, dst)
+
+
+class SiteCloner:
+    """
+    用 os.scandir 递归克隆已发布站点到 staging：按文件逐个选择 reflink / 硬链接 / 复制，
+    某种方式因文件系统不支持而失败后本次不再尝试，只对失败的文件降级，不会整棵树重来。
+    """
+
+    def __init__(self, chain: Optional[List[str]] = None) -> None:
+        self.chain = list(chain or strategy_chain())
+        self.stats = CloneStats(strategy=self.chain[0])
+
+    def _clone_file(self, entry: os.DirEntry, dst: str) -> None:
+        src = entry.path
+        for strategy in list(self.chain):
+            try:
+                if strategy == REFLINK:
+                    _reflink(src, dst)
+                    self.stats.reflinked += 1
+                elif strategy == HARDLINK:
+                    os.link(src, dst)
+                    self.stats.linked += 1
+                else:
+                    shutil.copy2(src, dst)
+                    self.stats.copied += 1
+                    self.stats.bytes_copied += entry.stat(follow_symlinks=False).st_size
+                return
+            except OSError as exc:
+                if strategy == COPY:
+                    raise
+                if exc.errno in _UNSUPPORTED_ERRNOS and strategy in self.chain:
+                    self.chain.remove(strategy)
+
+    def _clone_dir(self, src: str, dst: str) -> None:
+        os.makedirs(dst, exist_ok=True)
+        self.stats.dirs += 1
+        with os.scandir(src) as entries:
+            for entry in entries:
+                target = os.path.join(dst, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    self._clone_dir(entry.path, target)
+                elif entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_file(follow_symlinks=False):
+                    self.stats.files += 1
+                    self._clone_file(entry, target)
+
+    def clone(self, src: Path, dst: Path) -> CloneStats:
+        started = time.monotonic()
+        self._clone_dir(str(src), str(dst))
+        self.stats.strategy = self.chain[0]
+        self.stats.seconds = time.monotonic() - started
+        return self.stats
+
+
+def clone_tree(src: Path, dst: Path, preferred: Optional[str] = None) -> CloneStats:
+    return SiteCloner(strategy_chain(preferred)).clone(src, dst)
@@ -1,14 +1,26 @@
+import hashlib
 import json
 import os
+import random
+import re
 import shutil
+import threading
 import time
 from urllib.parse import quote
 from pathlib import Path
-from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    meta as jinja_meta,
+    select_autoescape,
+)
 
 from . import config
+from . import image_utils
+from . import site_clone
 from . import tagging
 from .storage import fsync_path
 
@@ -16,6 +28,12 @@ TEMPLATE_DIR = config.STATIC / "templates"
 ASSET_DIR = config.STATIC
 PAGES_TEMPLATE_DIR = TEMPLATE_DIR / "pages"
 PAGES_STATIC_DIR = ASSET_DIR / "pages"
+BUILD_MANIFEST_NAME = ".build_manifest.json"
+# 渲染逻辑（而非输入数据）变化时递增，使旧 manifest 全部失效
+BUILD_MANIFEST_VERSION = 1
+# 发布目录需要对 www-data 可读
+PUBLIC_FILE_MODE = 0o644
+PUBLIC_DIR_MODE = 0o755
 RESERVED_PAGE_PREFIXES = {
     "api",
     "admin",
@@ -73,12 +91,7 @@ DEFAULT_SITE_CONFIG = {
 }
 
 
-def load_collections_config() -> Tuple[dict, str, List[str]]:
-    """
-    读取手工分区配置，允许将特定 UUID 放入“我的作品”或“他人作品”。
-    未命中时使用默认分区。
-    """
-    cfg_path = ASSET_DIR / "data" / "collections.json"
+def _read_collections_config(cfg_path: Path) -> Tuple[dict, str, List[str]]:
     meta: Dict[str, dict] = {}
     default_collection = "favorites"
     if not cfg_path.exists():
@@ -140,6 +153,106 @@ def load_collections_config() -> Tuple[dict, str, List[str]]:
     return meta, default_collection, order
 
 
+class CollectionIndex:
+    """
+    分区配置与倒排的 uuid → 分区映射；同一 uuid 出现在多个分区时按配置顺序取第一个。
+    meta 等字段在进程内共享，调用方只读不改。
+    """
+
+    def __init__(self, meta: dict, default_collection: str, order: List[str], signature: object) -> None:
+        self.meta = meta
+        self.default_collection = default_collection
+        self.order = order
+        self.signature = signature
+        self.by_uuid: Dict[str, str] = {}
+        for key, info in meta.items():
+            for uuid in info.get("uuids", set()):
+                self.by_uuid.setdefault(uuid, key)
+        payload = json.dumps(sorted(self.by_uuid.items()), ensure_ascii=False)
+        # image_collections 表内容的摘要，写入数据库用来判断表是否需要重写
+        self.digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def resolve(self, uuid: Optional[str], override: Optional[str] = None) -> str:
+        if override:
+            return override
+        return self.by_uuid.get(uuid or "", self.default_collection)
+
+
+class _CollectionsCache:
+    """
+    按 collections.json 的 inode / mtime / 大小缓存解析结果，配置未变时各 API 请求与构建共用同一份索引。
+    """
+
+    def __init__(self) -> None:
+        self.index: Optional[CollectionIndex] = None
+        self.lock = threading.Lock()
+
+    def get(self) -> CollectionIndex:
+        cfg_path = ASSET_DIR / "data" / "collections.json"
+        try:
+            st = cfg_path.stat()
+            signature: object = (str(cfg_path), st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = (str(cfg_path), None)
+        index = self.index
+        if index is not None and index.signature == signature:
+            return index
+        with self.lock:
+            if self.index is None or self.index.signature != signature:
+                meta, default_collection, order = _read_collections_config(cfg_path)
+                self.index = CollectionIndex(meta, default_collection, order, signature)
+            return self.index
+
+
+_collections_cache = _CollectionsCache()
+
+
+def collection_index() -> CollectionIndex:
+    return _collections_cache.get()
+
+
+def load_collections_config() -> Tuple[dict, str, List[str]]:
+    """
+    读取手工分区配置，允许将特定 UUID 放入“我的作品”或“他人作品”。
+    未命中时使用默认分区。结果按文件签名缓存，返回的结构只读。
+    """
+    index = collection_index()
+    return index.meta, index.default_collection, index.order
+
+
+def sync_collection_table(conn) -> CollectionIndex:
+    """
+    把配置中的 uuid → 分区映射物化到 image_collections 表，使列表查询能在 SQL 里按分区过滤。
+    已同步的映射摘要与表内容在同一事务里写入 search_state，事务回滚或其他进程同步了别的配置时，
+    下次调用仍会重写。调用方负责提交事务。
+    """
+    index = collection_index()
+    row = conn.execute("SELECT value FROM search_state WHERE key='collections_digest'").fetchone()
+    if row and row["value"] == index.digest:
+        return index
+    conn.execute("DELETE FROM image_collections")
+    conn.executemany(
+        "INSERT INTO image_collections (uuid, collection) VALUES (?, ?)",
+        sorted(index.by_uuid.items()),
+    )
+    conn.execute(
+        "INSERT INTO search_state (key, value) VALUES ('collections_digest', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (index.digest,),
+    )
+    return index
+
+
+def collection_sql(alias: str = "images") -> str:
+    """
+    与 CollectionIndex.resolve 等价的 SQL 表达式，需要一个绑定参数：默认分区。
+    """
+    return (
+        f"COALESCE(NULLIF({alias}.collection_override, ''), "
+        f"(SELECT ic.collection FROM image_collections ic WHERE ic.uuid = {alias}.uuid), ?)"
+    )
+
+
 def _merge_dict(base: dict, overrides: dict) -> dict:
     merged = dict(base)
     for key, value in overrides.items():
@@ -195,6 +308,25 @@ def classify_orientation(width: Optional[int], height: Optional[int]) -> str:
     return "square"
 
 
+_ORIENTATION_SQL = {
+    "landscape": "{w} > 0 AND {h} > 0 AND {w} * 1.0 / {h} >= 1.1",
+    "portrait": "{w} > 0 AND {h} > 0 AND {h} * 1.0 / {w} >= 1.1",
+    "square": "{w} > 0 AND {h} > 0 AND {w} * 1.0 / {h} < 1.1 AND {h} * 1.0 / {w} < 1.1",
+    "unknown": "(IFNULL({w}, 0) = 0 OR IFNULL({h}, 0) = 0)",
+}
+
+
+def orientation_sql(orientation: str, alias: str = "") -> Optional[str]:
+    """
+    classify_orientation 的 SQL 版本（同样用浮点除法比较，边界一致）；未知取值返回 None。
+    """
+    template = _ORIENTATION_SQL.get(orientation)
+    if template is None:
+        return None
+    prefix = f"{alias}." if alias else ""
+    return template.format(w=f"{prefix}width", h=f"{prefix}height")
+
+
 def size_bucket(width: Optional[int], height: Optional[int]) -> str:
     if not width or not height:
         return "unknown"
@@ -208,6 +340,112 @@ def size_bucket(width: Optional[int], height: Optional[int]) -> str:
     return "compact"
 
 
+def thumb_srcsets(
+    thumb_filename: str,
+    thumb_width: Optional[int],
+    renditions_raw: Optional[str],
+) -> Tuple[str, str]:
+    """
+    返回 (主格式 srcset, AVIF srcset)；没有多尺寸版本时为空串，模板退回单一 src。
+    """
+    primary: List[Tuple[int, str]] = []
+    avif: List[Tuple[int, str]] = []
+    for item in image_utils.parse_renditions(renditions_raw):
+        target = avif if item.get("format") == "avif" else primary
+        target.append((int(item["width"]), f"/thumb/{item['file']}"))
+    if not primary and not avif:
+        return "", ""
+    if thumb_width:
+        primary.append((int(thumb_width), f"/thumb/{thumb_filename}"))
+
+    def join(entries: List[Tuple[int, str]]) -> str:
+        return ", ".join(f"{url} {width}w" for width, url in sorted(entries))
+
+    return join(primary), join(avif)
+
+
+def stable_pages(items: List[dict], page_size: int) -> Tuple[List[dict], List[List[dict]]]:
+    """
+    稳定分页：从最旧的作品开始每 page_size 张切一页，编号 1 为最旧一页；
+    最新一个满页与不足一页的余数合并放在首页（page_size 到 2*page_size-1 张）。
+    新作品只会进入首页，已归档页面的成员不变，增量构建无需重写它们。
+    返回 (首页作品, 归档页列表)，归档页按编号从小到大，页内仍保持新到旧。
+    """
+    if page_size <= 0:
+        return list(items), []
+    full_pages = len(items) // page_size
+    if full_pages <= 1:
+        return list(items), []
+    archived = full_pages - 1
+    front_len = len(items) - archived * page_size
+    chunks: List[List[dict]] = []
+    for number in range(1, archived + 1):
+        end = len(items) - (number - 1) * page_size
+        chunks.append(list(items[end - page_size : end]))
+    return list(items[:front_len]), chunks
+
+
+def page_links(base_url: str, number: int, archived: int) -> dict:
+    """
+    number 为 0 表示首页。newer/older 对应 rel=prev/next。
+    """
+    def url(n: int) -> str:
+        return base_url if n == 0 else f"{base_url}page/{n}/"
+
+    if number == 0:
+        newer = ""
+        older = url(archived) if archived else ""
+    else:
+        newer = url(0) if number == archived else url(number + 1)
+        older = url(number - 1) if number > 1 else ""
+    return {"number": number, "is_first": number == 0, "url": url(number), "newer_url": newer, "older_url": older}
+
+
+def text_bigrams(text: str) -> Set[str]:
+    """
+    搜索用的字符二元组（小写、跳过含空白的组合），与 search.js 的 termBigrams 保持一致。
+    """
+    lowered = text.lower()
+    return {
+        lowered[idx : idx + 2]
+        for idx in range(len(lowered) - 1)
+        if not lowered[idx].isspace() and not lowered[idx + 1].isspace()
+    }
+
+
+def _delta_encode(ids: Iterable[int]) -> List[int]:
+    encoded: List[int] = []
+    previous = 0
+    for value in sorted(set(ids)):
+        encoded.append(value - previous)
+        previous = value
+    return encoded
+
+
+def search_postings(images: List[dict], parent_map: Dict[str, List[str]]) -> dict:
+    """
+    倒排索引：标签（已展开父标签）与标题/简介/标签文本的二元组 -> 作品 id 列表。
+    id 升序后做差分编码，前端按前缀和还原；文本二元组只用来缩小候选，命中后仍逐条校验子串。
+    """
+    tag_postings: Dict[str, List[int]] = {}
+    term_postings: Dict[str, List[int]] = {}
+    for img in images:
+        image_id = img.get("id")
+        if image_id is None:
+            continue
+        tags = img.get("tags", [])
+        for tag in _collect_tag_ancestors(tags, parent_map):
+            tag_postings.setdefault(tag, []).append(int(image_id))
+        hay = f"{img.get('title') or ''} {img.get('description') or ''} {' '.join(tags)}"
+        for gram in text_bigrams(hay):
+            term_postings.setdefault(gram, []).append(int(image_id))
+    return {
+        "encoding": "delta",
+        "tags": {tag: _delta_encode(ids) for tag, ids in sorted(tag_postings.items())},
+        "terms": {gram: _delta_encode(ids) for gram, ids in sorted(term_postings.items())},
+    }
+
+
 def simple_title(name: str) -> str:
     return Path(name).stem or name
 
@@ -449,14 +687,56 @@ def _ensure_extra_page_allowed(url_path: str, source: Path, seen: set) -> None:
     seen.add(url_path)
 
 
+def _render_tag_pages(
+    outputs: "_BuildOutputs",
+    tag: dict,
+    tag_tree: List[dict],
+    images: List[dict],
+    collection_labels: Dict[str, dict],
+    **context: object,
+) -> List[str]:
+    """
+    渲染标签首页与归档页，返回归档页 URL（首页 URL 由调用方另行登记）。
+    归档页的 tag 去掉计数，只有首页随作品数变化。
+    """
+    base_url = f"/tags/{quote(str(tag['slug']), safe='')}/"
+    front, chunks = stable_pages(images, config.LIST_PAGE_SIZE)
+    outputs.render(
+        f"tags/{tag['slug']}/index.html",
+        "tag.html.j2",
+        tag=tag,
+        tag_tree=tag_tree,
+        images=front,
+        page=page_links(base_url, 0, len(chunks)),
+        collections=collection_labels,
+        **context,
+    )
+    archived_tag = dict(tag, count=None)
+    urls: List[str] = []
+    for number, chunk in enumerate(chunks, start=1):
+        page = page_links(base_url, number, len(chunks))
+        urls.append(page["url"])
+        outputs.render(
+            f"tags/{tag['slug']}/page/{number}/index.html",
+            "tag.html.j2",
+            tag=archived_tag,
+            tag_tree=tag_tree,
+            images=chunk,
+            page=page,
+            collections=collection_labels,
+            **context,
+        )
+    return urls
+
+
 def _render_extra_pages(
-    env: Environment,
-    staging_dir: Path,
+    outputs: "_BuildOutputs",
     context: Dict[str, object],
     allow_existing: bool = False,
 ) -> List[str]:
     extra_urls: List[str] = []
     seen_urls: set = set()
+    staging_dir = outputs.staging_dir
 
     if PAGES_TEMPLATE_DIR.exists():
         for tpl_path in sorted(PAGES_TEMPLATE_DIR.rglob("*.html.j2")):
@@ -465,22 +745,18 @@ def _render_extra_pages(
             if base_name == "index" and rel.parent == Path("."):
                 continue
             if base_name == "index":
-                target_dir = staging_dir.joinpath(*rel.parent.parts)
                 url_parts = rel.parent.parts
             else:
-                target_dir = staging_dir.joinpath(*rel.parent.parts, base_name)
                 url_parts = (*rel.parent.parts, base_name)
             if not url_parts:
                 continue
             url_path = "/" + "/".join(url_parts) + "/"
             _ensure_extra_page_allowed(url_path, tpl_path, seen_urls)
-            target = target_dir / "index.html"
-            if target.exists() and not allow_existing:
-                raise ValueError(f"extra page output already exists: {target}")
-            target_dir.mkdir(parents=True, exist_ok=True)
+            target_rel = "/".join((*url_parts, "index.html"))
+            if (staging_dir / target_rel).exists() and not allow_existing:
+                raise ValueError(f"extra page output already exists: {staging_dir / target_rel}")
             template_name = str(tpl_path.relative_to(TEMPLATE_DIR))
-            html = env.get_template(template_name).render(**context)
-            _atomic_write_text(target, html)
+            outputs.render(target_rel, template_name, **context)
             extra_urls.append(url_path)
 
     if PAGES_STATIC_DIR.exists():
@@ -493,38 +769,402 @@ def _render_extra_pages(
             target = staging_dir / rel
             if target.exists() and not allow_existing:
                 raise ValueError(f"extra page output already exists: {target}")
-            target.parent.mkdir(parents=True, exist_ok=True)
-            _atomic_copy_file(src, target)
+            outputs.copy_file("/".join(rel.parts), src)
             extra_urls.append(url_path)
 
     return extra_urls
 
 
-def _atomic_write_text(path: Path, content: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
+def _make_public_dirs(path: Path) -> None:
+    """
+    逐级创建目录并显式设为 0755，不受进程 umask 影响。
+    """
+    missing = []
+    current = path
+    while not current.exists():
+        missing.append(current)
+        current = current.parent
+    for directory in reversed(missing):
+        try:
+            os.mkdir(directory)
+        except FileExistsError:
+            continue
+        os.chmod(directory, PUBLIC_DIR_MODE)
+
+
+def _fresh_tmp_path(path: Path) -> Path:
+    """
+    staging 由已发布站点硬链接而来，文件可能与线上共享 inode：
+    只能写入全新的临时文件再替换，绝不原地改写（残留的 .tmp 也可能是链接，先删掉）。
+    """
+    _make_public_dirs(path.parent)
     tmp_path = path.with_suffix(f"{path.suffix}.tmp")
+    try:
+        tmp_path.unlink()
+    except FileNotFoundError:
+        pass
+    return tmp_path
+
+
+def _atomic_write_text(path: Path, content: str) -> None:
+    tmp_path = _fresh_tmp_path(path)
     tmp_path.write_text(content, encoding="utf-8")
+    os.chmod(tmp_path, PUBLIC_FILE_MODE)
     os.replace(tmp_path, path)
 
 
 def _atomic_copy_file(src: Path, dst: Path) -> None:
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    tmp_path = dst.with_suffix(f"{dst.suffix}.tmp")
+    tmp_path = _fresh_tmp_path(dst)
     shutil.copy2(src, tmp_path)
+    os.chmod(tmp_path, PUBLIC_FILE_MODE)
     os.replace(tmp_path, dst)
 
 
-def _clone_existing_site(base_dir: Path, staging_dir: Path) -> bool:
+def _clone_existing_site(base_dir: Path, staging_dir: Path) -> Optional[site_clone.CloneStats]:
+    """
+    克隆失败（如磁盘满）时清掉半成品并返回 None，由调用方改为完整构建。
+    """
     if not base_dir.exists():
-        return False
-    staging_dir.mkdir(parents=True, exist_ok=True)
+        return None
     try:
-        shutil.copytree(base_dir, staging_dir, copy_function=os.link, dirs_exist_ok=True)
-        return True
+        return site_clone.clone_tree(base_dir, staging_dir)
     except OSError:
-        shutil.copytree(base_dir, staging_dir, dirs_exist_ok=True)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return None
+
+
+def _digest(value: object) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def asset_fingerprint(skip_dirs: Iterable[str] = (), root: Path = ASSET_DIR) -> str:
+    """
+    静态资源指纹（路径 + 大小 + mtime），作为静态目录是否需要重新拷贝的依据；
+    跳过 templates 后的指纹用作 static_version，模板改动只让引用它的页面失效。
+    """
+    skip = {root / name for name in skip_dirs}
+    h = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if Path(dirpath, d) not in skip)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            h.update(f"{os.path.relpath(path, root)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+class _TimedLoader(FileSystemLoader):
+    """
+    统计模板加载（解析编译或读取字节码）的次数与耗时，用于区分编译时间与渲染时间。
+    """
+
+    def __init__(self, searchpath: str) -> None:
+        super().__init__(searchpath)
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def load(self, environment, name, globals=None):
+        started = time.perf_counter()
+        try:
+            return super().load(environment, name, globals)
+        finally:
+            self.loads += 1
+            self.load_seconds += time.perf_counter() - started
+
+
+class _TemplateCache:
+    """
+    跨构建复用的 Jinja 环境：worker 常驻时已编译模板留在内存里，模板目录指纹变化时整体重建；
+    编译结果同时写入 storage 下的字节码缓存，一次性的命令行构建也不必重新编译。
+    模板摘要（含引用的子模板）同样只在指纹变化时重算。
+    """
+
+    def __init__(self) -> None:
+        self.fingerprint = ""
+        self.env: Optional[Environment] = None
+        self.digests: Dict[str, str] = {}
+        self.variables: Dict[str, Optional[frozenset]] = {}
+
+    def _bytecode_cache(self) -> Optional[FileSystemBytecodeCache]:
+        try:
+            config.TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return None
+        if not os.access(config.TEMPLATE_CACHE_DIR, os.W_OK):
+            return None
+        return FileSystemBytecodeCache(str(config.TEMPLATE_CACHE_DIR))
+
+    def environment(self) -> Environment:
+        fingerprint = asset_fingerprint(root=TEMPLATE_DIR)
+        if self.env is None or fingerprint != self.fingerprint:
+            env = Environment(
+                loader=_TimedLoader(str(TEMPLATE_DIR)),
+                autoescape=select_autoescape(["html", "xml"]),
+                bytecode_cache=self._bytecode_cache(),
+                # 指纹已覆盖模板变化，省掉每次 get_template 的 stat
+                auto_reload=False,
+            )
+            env.filters["urlencode"] = lambda value: quote(str(value), safe="")
+            self.env = env
+            self.fingerprint = fingerprint
+            self.digests = {}
+            self.variables = {}
+        return self.env
+
+
+_template_cache = _TemplateCache()
+
+
+class _ImageContextCache:
+    """
+    每张作品派生出的渲染上下文（标签分组、方向、尺寸档位、标题等），以数据库行与标签配置版本的指纹为键，
+    常驻进程内存并持久化到 storage；构建时只对指纹变化的行重新计算。
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[str, dict] = {}
+        self.loaded = False
+        self.dirty = False
+        self.hits = 0
+        self.computed = 0
+
+    def _load(self) -> None:
+        self.loaded = True
+        data = _read_json_dict(config.IMAGE_CONTEXT_CACHE_PATH)
+        if not data or data.get("version") != BUILD_MANIFEST_VERSION:
+            return
+        entries = data.get("entries")
+        if isinstance(entries, dict):
+            self.entries = entries
+
+    def begin(self) -> None:
+        if not self.loaded:
+            self._load()
+        self.hits = 0
+        self.computed = 0
+
+    def get(self, uuid: str, key: str) -> Optional[dict]:
+        entry = self.entries.get(uuid)
+        if entry and entry.get("key") == key:
+            self.hits += 1
+            return entry["context"]
+        return None
+
+    def put(self, uuid: str, key: str, context: dict) -> None:
+        self.entries[uuid] = {"key": key, "context": context}
+        self.computed += 1
+        self.dirty = True
+
+    def save(self, live: Iterable[str]) -> None:
+        live_set = set(live)
+        for uuid in [uuid for uuid in self.entries if uuid not in live_set]:
+            del self.entries[uuid]
+            self.dirty = True
+        if not self.dirty:
+            return
+        try:
+            config.IMAGE_CONTEXT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write_text(
+                config.IMAGE_CONTEXT_CACHE_PATH,
+                json.dumps({"version": BUILD_MANIFEST_VERSION, "entries": self.entries}, ensure_ascii=False),
+            )
+        except OSError:
+            # 缓存写不进去只影响下次构建的速度
+            return
+        self.dirty = False
+
+    def stats(self) -> dict:
+        return {"reused": self.hits, "computed": self.computed}
+
+
+_image_context_cache = _ImageContextCache()
+
+
+def load_build_manifest(site_dir: Path) -> dict:
+    data = _read_json_dict(site_dir / BUILD_MANIFEST_NAME)
+    if not data or data.get("version") != BUILD_MANIFEST_VERSION:
+        return {}
+    return data
+
+
+class _BuildOutputs:
+    """
+    记录每个输出文件的输入指纹（模板及其引用模板的内容 + 渲染上下文），
+    与上次构建的 manifest 比对：指纹未变且文件仍在则跳过渲染与写入。
+    体积较大的共享上下文（站点配置、标签映射等）只在构建开始时计算一次指纹。
+    """
+
+    def __init__(
+        self,
+        env: Environment,
+        staging_dir: Path,
+        previous: Mapping[str, str],
+        shared: Iterable[object],
+        template_digests: Optional[Dict[str, str]] = None,
+        template_variables: Optional[Dict[str, Optional[frozenset]]] = None,
+    ) -> None:
+        self.env = env
+        self.staging_dir = staging_dir
+        self.previous = dict(previous)
+        self.current: Dict[str, str] = {}
+        self.rendered: List[str] = []
+        self.skipped = 0
+        # 按对象身份缓存；shared 中的对象在整个构建期间存活，id 不会被复用
+        self._shared = {id(value): (value, _digest(value)) for value in shared}
+        self._template_digests: Dict[str, str] = {} if template_digests is None else template_digests
+        self._template_variables: Dict[str, Optional[frozenset]] = (
+            {} if template_variables is None else template_variables
+        )
+        self.compile_seconds = 0.0
+        self.render_seconds = 0.0
+        self._loads_before = getattr(env.loader, "loads", 0)
+
+    def template_digest(self, name: str) -> str:
+        cached = self._template_digests.get(name)
+        if cached is not None:
+            return cached
+        self._template_digests[name] = ""  # 防止循环引用
+        source, _filename, _uptodate = self.env.loader.get_source(self.env, name)
+        parts = [hashlib.sha1(source.encode("utf-8")).hexdigest()]
+        referenced = jinja_meta.find_referenced_templates(self.env.parse(source))
+        for ref in sorted(r for r in referenced if r):
+            parts.append(self.template_digest(ref))
+        digest = hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+        self._template_digests[name] = digest
+        return digest
+
+    def template_variables(self, name: str) -> Optional[frozenset]:
+        """
+        模板（含 include/extends 的子模板）实际读取的上下文变量；存在动态引用时返回 None，按全部上下文计算。
+        """
+        if name in self._template_variables:
+            return self._template_variables[name]
+        self._template_variables[name] = frozenset()  # 防止循环引用
+        source, _filename, _uptodate = self.env.loader.get_source(self.env, name)
+        ast = self.env.parse(source)
+        names = set(jinja_meta.find_undeclared_variables(ast))
+        result: Optional[frozenset] = None
+        for ref in jinja_meta.find_referenced_templates(ast):
+            ref_names = self.template_variables(ref) if ref else None
+            if ref_names is None:
+                break
+            names |= ref_names
+        else:
+            result = frozenset(names)
+        self._template_variables[name] = result
+        return result
+
+    def _context_digest(self, context: Mapping[str, object], only: Optional[frozenset] = None) -> str:
+        parts = []
+        for name in sorted(context):
+            if only is not None and name not in only:
+                continue
+            value = context[name]
+            shared = self._shared.get(id(value))
+            parts.append(name)
+            parts.append(shared[1] if shared and shared[0] is value else _digest(value))
+        return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _claim(self, rel: str, key: str, force: bool = False) -> bool:
+        """
+        登记输出并返回是否需要重新生成。
+        """
+        self.current[rel] = key
+        if not force and self.previous.get(rel) == key and (self.staging_dir / rel).exists():
+            self.skipped += 1
+            return False
+        self.rendered.append(rel)
+        return True
+
+    def render(self, rel: str, template_name: str, force: bool = False, **context: object) -> bool:
+        key = _digest(
+            [
+                BUILD_MANIFEST_VERSION,
+                "tpl",
+                self.template_digest(template_name),
+                # 模板没用到的上下文（如自定义页面拿到却不显示的作品计数）不影响输出
+                self._context_digest(context, self.template_variables(template_name)),
+            ]
+        )
+        if not self._claim(rel, key, force):
+            return False
+        load_before = getattr(self.env.loader, "load_seconds", 0.0)
+        started = time.perf_counter()
+        html = self.env.get_template(template_name).render(**context)
+        elapsed = time.perf_counter() - started
+        # 包含的子模板在 render 中才加载，按加载器计时把编译部分拆出来
+        compiled = getattr(self.env.loader, "load_seconds", 0.0) - load_before
+        self.compile_seconds += compiled
+        self.render_seconds += elapsed - compiled
+        _atomic_write_text(self.staging_dir / rel, html)
+        return True
+
+    def template_stats(self) -> dict:
+        return {
+            "loaded": getattr(self.env.loader, "loads", 0) - self._loads_before,
+            "compile_seconds": round(self.compile_seconds, 4),
+            "render_seconds": round(self.render_seconds, 4),
+        }
+
+    def write_text(self, rel: str, inputs: object, produce) -> bool:
+        """
+        非模板输出（JSON 数据、跳转页）：inputs 为决定内容的数据，produce 延迟生成文本。
+        """
+        if not self._claim(rel, _digest([BUILD_MANIFEST_VERSION, "text", inputs])):
+            return False
+        _atomic_write_text(self.staging_dir / rel, produce())
         return True
 
+    def copy_file(self, rel: str, src: Path) -> bool:
+        st = src.stat()
+        if not self._claim(rel, _digest([BUILD_MANIFEST_VERSION, "copy", str(src), st.st_size, st.st_mtime_ns])):
+            return False
+        _atomic_copy_file(src, self.staging_dir / rel)
+        return True
+
+    def finish(self, assets: str, clone: Optional[dict] = None, image_contexts: Optional[dict] = None) -> dict:
+        """
+        删除上次构建产出、本次已不再生成的文件（如已删除作品的详情页），并写入新 manifest。
+        """
+        removed: List[str] = []
+        for rel in sorted(set(self.previous) - set(self.current)):
+            path = self.staging_dir / rel
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError:
+                continue
+            removed.append(rel)
+            parent = path.parent
+            while parent != self.staging_dir:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+        stats = {
+            "rendered": len(self.rendered),
+            "skipped": self.skipped,
+            "removed": len(removed),
+            "templates": self.template_stats(),
+            "image_contexts": image_contexts or {},
+        }
+        manifest = {
+            "version": BUILD_MANIFEST_VERSION,
+            "assets": assets,
+            "outputs": self.current,
+            "stats": stats,
+            "clone": clone,
+            "written": sorted(self.rendered),
+        }
+        _atomic_write_text(self.staging_dir / BUILD_MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+        return stats
+
 
 def build_site(
     images: Iterable[Mapping[str, object]],
@@ -532,20 +1172,28 @@ def build_site(
     changed_uuids: Optional[Iterable[str]] = None,
     full_rebuild: bool = True,
 ) -> Path:
+    """
+    生成站点到 staging 目录。增量模式（给定 base_dir 且非 full_rebuild）先克隆已发布站点，
+    再依据站点内的构建 manifest 只重写输入指纹发生变化的输出，并清理不再生成的旧文件；
+    changed_uuids 中的作品详情页无论指纹是否变化都会重写。
+    """
     build_id = f"build_{int(time.time())}"
     staging_dir = config.WWW_STAGING / build_id
-    reuse_existing = False
+    suffix = 1
+    while staging_dir.exists():
+        staging_dir = config.WWW_STAGING / f"{build_id}_{suffix}"
+        suffix += 1
+    clone_stats = None
     if base_dir and base_dir.exists() and not full_rebuild:
-        reuse_existing = _clone_existing_site(base_dir, staging_dir)
+        clone_stats = _clone_existing_site(base_dir, staging_dir)
+    reuse_existing = clone_stats is not None
     if not reuse_existing:
         staging_dir.mkdir(parents=True, exist_ok=True)
-    static_version = int(time.time())
+    previous_manifest = load_build_manifest(staging_dir) if reuse_existing else {}
+    assets = asset_fingerprint()
+    static_version = asset_fingerprint(skip_dirs=("templates",))
 
-    env = Environment(
-        loader=FileSystemLoader(str(TEMPLATE_DIR)),
-        autoescape=select_autoescape(["html", "xml"]),
-    )
-    env.filters["urlencode"] = lambda value: quote(str(value), safe="")
+    env = _template_cache.environment()
 
     site = load_site_config()
     auth_config = dict(config.AUTH_CONFIG)
@@ -555,15 +1203,15 @@ def build_site(
     site_description = site.get("site_description", "")
     site_url = site.get("site_url", "")
 
-    collections_meta, default_collection, collection_order = load_collections_config()
-    tags_meta, tag_order = tagging.load_tags_config()
-    tag_types_meta, tag_types_order = tagging.load_tag_types_config()
-    alias_map = tagging.build_alias_map(tags_meta)
-    parent_map = tagging.build_parent_map(tags_meta, alias_map)
-    child_map: Dict[str, List[str]] = {}
-    for tag, parents in parent_map.items():
-        for parent in parents:
-            child_map.setdefault(parent, []).append(tag)
+    collections_index = collection_index()
+    collections_meta = collections_index.meta
+    collection_order = collections_index.order
+    registry = tagging.tag_registry()
+    tags_meta, tag_order = registry.meta, registry.order
+    tag_types_meta, tag_types_order = registry.types_meta, registry.types_order
+    alias_map = registry.alias_map
+    parent_map = registry.parent_map
+    child_map = registry.child_map
     tag_slug_map = {
         tag: (info.get("slug") or tag_slug(tag))
         for tag, info in tags_meta.items()
@@ -615,26 +1263,33 @@ def build_site(
     }
 
     changed_set = {str(uuid).lower() for uuid in (changed_uuids or [])}
-    incremental = reuse_existing and bool(changed_set)
 
-    images_ctx: List[dict] = []
-    stats = {"total": 0, "collections": {}}
-    for img in images:
-        img_ctx = dict(img)
-        image_id = img_ctx.get("id")
-        img_ctx["short_id"] = str(image_id).strip() if image_id is not None else ""
-        img_ctx["detail_path"] = image_detail_path(image_id, img_ctx.get("uuid") or "")
-        thumb_path_value = img_ctx.get("thumb_path")
-        img_ctx["thumb_filename"] = (
+    # 标签配置变化会改变每张作品的标签解析与分组结果
+    context_version = _digest(
+        [tags_meta, tag_order, tag_types_meta, tag_types_order, config.THUMB_EXT]
+    )
+
+    def derive_image_context(img: Mapping[str, object]) -> dict:
+        derived: Dict[str, object] = {}
+        image_id = img.get("id")
+        derived["short_id"] = str(image_id).strip() if image_id is not None else ""
+        derived["detail_path"] = image_detail_path(image_id, img.get("uuid") or "")
+        thumb_path_value = img.get("thumb_path")
+        derived["thumb_filename"] = (
             Path(thumb_path_value).name if thumb_path_value else f"{img['uuid']}{config.THUMB_EXT}"
         )
-        img_ctx["raw_filename"] = f"{img['uuid']}{img['ext']}"
-        img_ctx["bytes_human"] = human_bytes(int(img["bytes"]))
-        img_ctx["title"] = img_ctx.get("title_override") or simple_title(str(img["original_name"]))
-        img_ctx["description"] = img_ctx.get("description") or ""
-        img_ctx["tags"] = parse_tags(img_ctx.get("tags_json"), alias_map)
-        img_ctx["tag_groups"] = build_tag_flat_groups(
-            img_ctx["tags"],
+        derived["thumb_srcset"], derived["thumb_avif_srcset"] = thumb_srcsets(
+            derived["thumb_filename"],
+            img.get("thumb_width"),
+            img.get("thumb_renditions"),
+        )
+        derived["raw_filename"] = f"{img['uuid']}{img['ext']}"
+        derived["bytes_human"] = human_bytes(int(img["bytes"]))
+        derived["title"] = img.get("title_override") or simple_title(str(img["original_name"]))
+        derived["description"] = img.get("description") or ""
+        derived["tags"] = parse_tags(img.get("tags_json"), alias_map)
+        derived["tag_groups"] = build_tag_flat_groups(
+            derived["tags"],
             tags_meta,
             parent_map,
             tag_order,
@@ -644,22 +1299,31 @@ def build_site(
             tag_types_order,
             default_tag_type,
         )
-        img_ctx["orientation"] = classify_orientation(
+        derived["orientation"] = classify_orientation(
             int(img["width"]) if img["width"] else None,
             int(img["height"]) if img["height"] else None,
         )
-        img_ctx["size_bucket"] = size_bucket(
+        derived["size_bucket"] = size_bucket(
             int(img["width"]) if img["width"] else None,
             int(img["height"]) if img["height"] else None,
         )
+        # 经过一次 JSON 往返，保证首次计算与读缓存得到的结构一致（元组变列表等）
+        return json.loads(json.dumps(derived, ensure_ascii=False))
 
-        collection_override = img_ctx.get("collection_override")
-        collection = collection_override or default_collection
-        if not collection_override:
-            for key, meta in collections_meta.items():
-                if img_ctx["uuid"] in meta.get("uuids", set()):
-                    collection = key
-                    break
+    _image_context_cache.begin()
+    images_ctx: List[dict] = []
+    stats = {"total": 0, "collections": {}}
+    for img in images:
+        img_ctx = dict(img)
+        uuid = str(img_ctx.get("uuid") or "")
+        context_key = _digest([context_version, img_ctx])
+        derived = _image_context_cache.get(uuid, context_key)
+        if derived is None:
+            derived = derive_image_context(img_ctx)
+            _image_context_cache.put(uuid, context_key, derived)
+        img_ctx.update(derived)
+
+        collection = collections_index.resolve(img_ctx["uuid"], img_ctx.get("collection_override"))
 
         img_ctx["collection"] = collection
         stats["total"] += 1
@@ -684,7 +1348,6 @@ def build_site(
 
     tag_images: Dict[str, List[dict]] = {}
     tag_seen: Dict[str, set] = {}
-    changed_tags: set = set()
 
     def get_ancestors(tag: str, cache: Dict[str, List[str]]) -> List[str]:
         if tag in cache:
@@ -703,12 +1366,8 @@ def build_site(
     ancestors_cache: Dict[str, List[str]] = {}
     for img in images_ctx:
         uu = img.get("uuid")
-        uu_norm = str(uu or "").lower()
-        is_changed = incremental and uu_norm in changed_set
         for tag in img.get("tags", []):
             resolved_tags = [tag] + get_ancestors(tag, ancestors_cache)
-            if is_changed:
-                changed_tags.update(resolved_tags)
             for resolved in resolved_tags:
                 tag_seen.setdefault(resolved, set())
                 if uu in tag_seen[resolved]:
@@ -803,17 +1462,54 @@ def build_site(
         ensure_ascii=False,
     )
 
-    # 拷贝静态资源（增量构建时尽量复用已有内容）
+    # 拷贝静态资源（增量构建时资源指纹未变则复用已有内容）
     static_target = staging_dir / "static"
-    if not reuse_existing or not static_target.exists():
+    if not reuse_existing or not static_target.exists() or previous_manifest.get("assets") != assets:
         if static_target.exists():
             shutil.rmtree(static_target)
         shutil.copytree(ASSET_DIR, static_target, dirs_exist_ok=True)
+        # 只有资源变化时才会重新拷贝，这里整理的就是本次的权限增量
+        _set_world_readable(static_target)
+
+    # 详情页/标签页只用到分区标题，管理页只用到分区列表的名称；去掉计数后，新增作品不会让这些页面全部失效
+    collection_labels = {
+        key: {"title": value["title"], "description": value["description"]}
+        for key, value in collections_ctx.items()
+    }
+    collection_options = [
+        {"slug": item["slug"], "title": item["title"], "description": item["description"]}
+        for item in collections_list
+    ]
+    outputs = _BuildOutputs(
+        env,
+        staging_dir,
+        previous_manifest.get("outputs") or {},
+        [
+            site,
+            auth_config,
+            collections_ctx,
+            collection_labels,
+            collections_list,
+            collection_options,
+            tags_list,
+            tag_slug_map,
+            tag_style_map,
+        ],
+        template_digests=_template_cache.digests,
+        template_variables=_template_cache.variables,
+    )
+    base_ctx = {
+        "site": site,
+        "auth": auth_config,
+        "site_name": site_name,
+        "site_description": site_description,
+        "site_url": site_url,
+        "static_version": static_version,
+    }
 
     data_dir = static_target / "data"
     data_dir.mkdir(parents=True, exist_ok=True)
     search_index = {
-        "generated_at": int(time.time()),
         "images": [
             {
                 "uuid": img["uuid"],
@@ -841,9 +1537,10 @@ def build_site(
         "tags": tags_list,
         "collections": collections_list,
     }
-    _atomic_write_text(
-        data_dir / "search_index.json",
-        json.dumps(search_index, ensure_ascii=False),
+    outputs.write_text(
+        "static/data/search_index.json",
+        search_index,
+        lambda: json.dumps({"generated_at": int(time.time()), **search_index}, ensure_ascii=False),
     )
     tag_index_tags = []
     ordered_tags_all = (tag_order or []) + sorted(tags_meta.keys())
@@ -873,259 +1570,192 @@ def build_site(
             }
         )
     tag_index = {
-        "generated_at": int(time.time()),
         "tags": tag_index_tags,
         "types": tag_types_list,
     }
-    _atomic_write_text(
-        data_dir / "tag_index.json",
-        json.dumps(tag_index, ensure_ascii=False, indent=2),
+    outputs.write_text(
+        "static/data/tag_index.json",
+        tag_index,
+        lambda: json.dumps({"generated_at": int(time.time()), **tag_index}, ensure_ascii=False, indent=2),
     )
+    # 静态索引整体过大时，筛选改走 /api/search，客户端只加载首片用于浏览，不需要倒排索引
+    index_bytes = len(json.dumps(search_index["images"], ensure_ascii=False).encode("utf-8"))
+    search_api = config.SEARCH_API and index_bytes > config.SEARCH_API_MIN_INDEX_BYTES
+    # 分片与分页同样从最旧的作品切起，新作品只改变最新一片；文件名带内容哈希，可永久缓存。
+    # 倒排索引按同样的分片切开，上传或编辑只让所在分片的倒排文件换名
+    head_records, archived_records = stable_pages(search_index["images"], config.SEARCH_CHUNK_SIZE)
+    head_images, archived_images = stable_pages(images_ctx, config.SEARCH_CHUNK_SIZE)
+    chunk_entries = []
+    for records, chunk_images in zip([head_records] + archived_records[::-1], [head_images] + archived_images[::-1]):
+        if not records:
+            continue
+        chunk_rel = f"static/data/search/{_digest(records)[:16]}.json"
+        outputs.write_text(
+            chunk_rel,
+            records,
+            lambda records=records: json.dumps({"images": records}, ensure_ascii=False),
+        )
+        entry = {
+            "path": chunk_rel[len("static/data/") :],
+            "images": len(records),
+            "newest": records[0].get("created_at"),
+            "oldest": records[-1].get("created_at"),
+        }
+        if not search_api:
+            postings = search_postings(chunk_images, parent_map)
+            postings_rel = f"static/data/search/postings-{_digest(postings)[:16]}.json"
+            outputs.write_text(
+                postings_rel,
+                postings,
+                lambda postings=postings: json.dumps(postings, ensure_ascii=False, separators=(",", ":")),
+            )
+            entry["postings"] = postings_rel[len("static/data/") :]
+        chunk_entries.append(entry)
     manifest = {
-        "version": 1,
-        "chunked": False,
-        "generated_at": int(time.time()),
-        "chunks": [
-            {
-                "path": "search_index.json",
-                "images": len(images_ctx),
-                "tags": len(tags_list),
-            }
-        ],
+        "version": 3,
+        "chunked": True,
+        "total": len(images_ctx),
+        "chunks": chunk_entries,
+        "tags": tags_list,
+        "collections": collections_list,
     }
-    _atomic_write_text(
-        data_dir / "search_manifest.json",
-        json.dumps(manifest, ensure_ascii=False, indent=2),
+    if search_api:
+        manifest["search_api"] = "/api/search"
+    outputs.write_text(
+        "static/data/search_manifest.json",
+        manifest,
+        lambda: json.dumps({"generated_at": int(time.time()), **manifest}, ensure_ascii=False, indent=2),
     )
 
-    index_html = env.get_template("index.html.j2").render(
-        images=images_ctx,
+    # 首页带计数与热门标签；归档页只依赖自身成员，计数变化不会让它们失效
+    front_images, index_chunks = stable_pages(images_ctx, config.LIST_PAGE_SIZE)
+    page_urls: List[str] = []
+    outputs.render(
+        "index.html",
+        "index.html.j2",
+        images=front_images,
+        page=page_links("/", 0, len(index_chunks)),
         stats=stats,
         collections=collections_ctx,
         collections_list=collections_list,
         tags=tags_list,
         top_tags=top_tags,
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
         og_image=og_image,
         json_ld=index_json_ld,
         tag_slug_map=tag_slug_map,
         tag_style_map=tag_style_map,
-        static_version=static_version,
+        thumb_sizes=config.THUMB_SIZES_ATTR,
+        **base_ctx,
     )
-    _atomic_write_text(staging_dir / "index.html", index_html)
-
-    search_dir = staging_dir / "search"
-    search_dir.mkdir(parents=True, exist_ok=True)
-    search_html = env.get_template("search.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
+    for number, chunk in enumerate(index_chunks, start=1):
+        page = page_links("/", number, len(index_chunks))
+        page_urls.append(page["url"])
+        outputs.render(
+            f"page/{number}/index.html",
+            "index.html.j2",
+            images=chunk,
+            page=page,
+            stats=None,
+            collections=collection_labels,
+            collections_list=collection_options,
+            tags=[],
+            top_tags=[],
+            og_image="",
+            json_ld="",
+            tag_slug_map=tag_slug_map,
+            tag_style_map=tag_style_map,
+            thumb_sizes=config.THUMB_SIZES_ATTR,
+            **base_ctx,
+        )
+
+    outputs.render(
+        "search/index.html",
+        "search.html.j2",
+        collections_list=collection_options,
         tags=tags_list,
         tag_slug_map=tag_slug_map,
         tag_style_map=tag_style_map,
-        static_version=static_version,
+        **base_ctx,
     )
-    _atomic_write_text(search_dir / "index.html", search_html)
-
-    tags_dir = staging_dir / "tags"
-    tags_dir.mkdir(parents=True, exist_ok=True)
-    tags_index_html = env.get_template("tags.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
+
+    outputs.render(
+        "tags/index.html",
+        "tags.html.j2",
         tags=tags_list,
         tag_slug_map=tag_slug_map,
         tag_style_map=tag_style_map,
-        static_version=static_version,
+        **base_ctx,
     )
-    _atomic_write_text(tags_dir / "index.html", tags_index_html)
-    tag_tpl = env.get_template("tag.html.j2")
-    update_tag_pages = not incremental or bool(changed_tags)
-    if update_tag_pages:
-        for tag in tags_list:
-            if incremental and changed_tags and tag["tag"] not in changed_tags:
-                continue
-            tag_dir = tags_dir / tag["slug"]
-            tag_dir.mkdir(parents=True, exist_ok=True)
-            tag_tree = build_tag_relation_tree(
-                tag.get("tag") or "",
-                tags_meta,
-                parent_map,
-                child_map,
-                tag_order,
-                tag_slug_map,
-                tag_style_map,
-                tag_type_styles,
-                default_tag_type,
-            )
-            tag_html = tag_tpl.render(
-                site=site,
-                auth=auth_config,
-                site_name=site_name,
-                site_description=site_description,
-                site_url=site_url,
-                tag=tag,
-                tag_tree=tag_tree,
-                images=tag_images.get(tag["tag"], []),
-                collections=collections_ctx,
-                collections_list=collections_list,
+    for tag in tags_list:
+        tag_tree = build_tag_relation_tree(
+            tag.get("tag") or "",
+            tags_meta,
+            parent_map,
+            child_map,
+            tag_order,
+            tag_slug_map,
+            tag_style_map,
+            tag_type_styles,
+            default_tag_type,
+        )
+        page_urls.extend(
+            _render_tag_pages(
+                outputs,
+                tag,
+                tag_tree,
+                tag_images.get(tag["tag"], []),
+                collection_labels=collection_labels,
+                collections_list=collection_options,
                 tag_slug_map=tag_slug_map,
                 tag_style_map=tag_style_map,
-                static_version=static_version,
-            )
-            _atomic_write_text(tag_dir / "index.html", tag_html)
-        for alias in alias_pages:
-            if incremental and changed_tags and alias["alias_of"] not in changed_tags:
-                continue
-            tag_dir = tags_dir / alias["slug"]
-            tag_dir.mkdir(parents=True, exist_ok=True)
-            tree_root = alias.get("alias_of") or alias.get("tag") or ""
-            tag_tree = build_tag_relation_tree(
-                tree_root,
-                tags_meta,
-                parent_map,
-                child_map,
-                tag_order,
-                tag_slug_map,
-                tag_style_map,
-                tag_type_styles,
-                default_tag_type,
+                thumb_sizes=config.THUMB_SIZES_ATTR,
+                **base_ctx,
             )
-            tag_html = tag_tpl.render(
-                site=site,
-                auth=auth_config,
-                site_name=site_name,
-                site_description=site_description,
-                site_url=site_url,
-                tag=alias,
-                tag_tree=tag_tree,
-                images=tag_images.get(alias["alias_of"], []),
-                collections=collections_ctx,
-                collections_list=collections_list,
+        )
+    for alias in alias_pages:
+        tree_root = alias.get("alias_of") or alias.get("tag") or ""
+        tag_tree = build_tag_relation_tree(
+            tree_root,
+            tags_meta,
+            parent_map,
+            child_map,
+            tag_order,
+            tag_slug_map,
+            tag_style_map,
+            tag_type_styles,
+            default_tag_type,
+        )
+        page_urls.extend(
+            _render_tag_pages(
+                outputs,
+                alias,
+                tag_tree,
+                tag_images.get(alias["alias_of"], []),
+                collection_labels=collection_labels,
+                collections_list=collection_options,
                 tag_slug_map=tag_slug_map,
                 tag_style_map=tag_style_map,
-                static_version=static_version,
+                thumb_sizes=config.THUMB_SIZES_ATTR,
+                **base_ctx,
             )
-            _atomic_write_text(tag_dir / "index.html", tag_html)
-
-    admin_dir = staging_dir / "admin"
-    admin_dir.mkdir(parents=True, exist_ok=True)
-    admin_html = env.get_template("admin.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
-        static_version=static_version,
-    )
-    _atomic_write_text(admin_dir / "index.html", admin_html)
-
-    admin_images_dir = admin_dir / "images"
-    admin_images_dir.mkdir(parents=True, exist_ok=True)
-    admin_images_html = env.get_template("admin_images.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
-        static_version=static_version,
-    )
-    _atomic_write_text(admin_images_dir / "index.html", admin_images_html)
-
-    admin_upload_dir = admin_dir / "upload"
-    admin_upload_dir.mkdir(parents=True, exist_ok=True)
-    admin_upload_html = env.get_template("admin_upload.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
-        static_version=static_version,
-    )
-    _atomic_write_text(admin_upload_dir / "index.html", admin_upload_html)
-
-    admin_collections_dir = admin_dir / "collections"
-    admin_collections_dir.mkdir(parents=True, exist_ok=True)
-    admin_collections_html = env.get_template("admin_collections.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
-        static_version=static_version,
-    )
-    _atomic_write_text(admin_collections_dir / "index.html", admin_collections_html)
-
-    admin_auth_dir = admin_dir / "auth"
-    admin_auth_dir.mkdir(parents=True, exist_ok=True)
-    admin_auth_html = env.get_template("admin_auth.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        collections_list=collections_list,
-        static_version=static_version,
-    )
-    _atomic_write_text(admin_auth_dir / "index.html", admin_auth_html)
-
-    admin_tags_dir = admin_dir / "tags"
-    admin_tags_dir.mkdir(parents=True, exist_ok=True)
-    admin_tags_html = env.get_template("admin_tags.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        static_version=static_version,
-    )
+        )
 
-    auth_dir = staging_dir / "auth"
-    auth_dir.mkdir(parents=True, exist_ok=True)
-    login_dir = auth_dir / "login"
-    login_dir.mkdir(parents=True, exist_ok=True)
-    login_html = env.get_template("auth_login.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        static_version=static_version,
-    )
-    _atomic_write_text(login_dir / "index.html", login_html)
-
-    register_dir = auth_dir / "register"
-    register_dir.mkdir(parents=True, exist_ok=True)
-    register_html = env.get_template("auth_register.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        static_version=static_version,
-    )
-    _atomic_write_text(register_dir / "index.html", register_html)
-    _atomic_write_text(admin_tags_dir / "index.html", admin_tags_html)
+    for rel, name in [
+        ("admin/index.html", "admin.html.j2"),
+        ("admin/images/index.html", "admin_images.html.j2"),
+        ("admin/upload/index.html", "admin_upload.html.j2"),
+        ("admin/collections/index.html", "admin_collections.html.j2"),
+        ("admin/auth/index.html", "admin_auth.html.j2"),
+    ]:
+        outputs.render(rel, name, collections_list=collection_options, **base_ctx)
+    for rel, name in [
+        ("admin/tags/index.html", "admin_tags.html.j2"),
+        ("auth/login/index.html", "auth_login.html.j2"),
+        ("auth/register/index.html", "auth_register.html.j2"),
+    ]:
+        outputs.render(rel, name, **base_ctx)
 
-    detail_tpl = env.get_template("detail.html.j2")
-    images_dir = staging_dir / "images"
-    images_dir.mkdir(exist_ok=True)
     for img in images_ctx:
-        if incremental and str(img.get("uuid") or "").lower() not in changed_set:
-            continue
         detail_path = img.get("detail_path") or image_detail_path(img.get("id"), img.get("uuid") or "")
         detail_url = f"{site_url}{detail_path}" if site_url else ""
         image_url = f"{site_url}/raw/{img['raw_filename']}" if site_url else f"/raw/{img['raw_filename']}"
@@ -1142,84 +1772,43 @@ def build_site(
             },
             ensure_ascii=False,
         )
-        html = detail_tpl.render(
+        page_key = img.get("short_id") or img.get("uuid") or ""
+        outputs.render(
+            f"images/{page_key}/index.html",
+            "detail.html.j2",
+            force=str(img.get("uuid") or "").lower() in changed_set,
             image=img,
-            site=site,
-            auth=auth_config,
-            site_name=site_name,
-            site_description=site_description,
-            site_url=site_url,
             canonical_url=detail_url,
             image_url=image_url,
             json_ld=detail_json_ld,
-            collections=collections_ctx,
+            collections=collection_labels,
             tag_slug_map=tag_slug_map,
             tag_style_map=tag_style_map,
-            static_version=static_version,
+            **base_ctx,
         )
-        page_key = img.get("short_id") or img.get("uuid") or ""
-        page_dir = images_dir / page_key
-        page_dir.mkdir(parents=True, exist_ok=True)
-        _atomic_write_text(page_dir / "index.html", html)
         legacy_uuid = img.get("uuid") or ""
         if legacy_uuid and legacy_uuid != page_key:
-            legacy_dir = images_dir / legacy_uuid
-            legacy_dir.mkdir(parents=True, exist_ok=True)
-            _atomic_write_text(legacy_dir / "index.html", _redirect_html(detail_path))
-
-    status_html = env.get_template("status.html.j2").render(
-        site=site,
-        auth=auth_config,
-        site_name=site_name,
-        site_description=site_description,
-        site_url=site_url,
-        static_version=static_version,
-    )
-    status_path = staging_dir / "status.html"
-    _atomic_write_text(status_path, status_html)
-    status_dir = staging_dir / "status"
-    status_dir.mkdir(parents=True, exist_ok=True)
-    _atomic_write_text(status_dir / "index.html", status_html)
-
-    for name, target in [
-        ("404.html.j2", staging_dir / "404.html"),
-        ("maintenance.html.j2", staging_dir / "maintenance.html"),
-    ]:
-        html = env.get_template(name).render(
-            site=site,
-            auth=auth_config,
-            site_name=site_name,
-            site_description=site_description,
-            site_url=site_url,
-            static_version=static_version,
-        )
-        _atomic_write_text(target, html)
+            outputs.write_text(
+                f"images/{legacy_uuid}/index.html",
+                detail_path,
+                lambda target=detail_path: _redirect_html(target),
+            )
 
-    for name, subdir in [
-        ("error.html.j2", staging_dir / "error"),
-        ("legal.html.j2", staging_dir / "legal"),
+    for rel in ["status.html", "status/index.html"]:
+        outputs.render(rel, "status.html.j2", **base_ctx)
+
+    for rel, name in [
+        ("404.html", "404.html.j2"),
+        ("maintenance.html", "maintenance.html.j2"),
+        ("error/index.html", "error.html.j2"),
+        ("legal/index.html", "legal.html.j2"),
     ]:
-        subdir.mkdir(parents=True, exist_ok=True)
-        html = env.get_template(name).render(
-            site=site,
-            auth=auth_config,
-            site_name=site_name,
-            site_description=site_description,
-            site_url=site_url,
-            static_version=static_version,
-        )
-        _atomic_write_text(subdir / "index.html", html)
+        outputs.render(rel, name, **base_ctx)
 
     extra_urls = _render_extra_pages(
-        env,
-        staging_dir,
+        outputs,
         {
-            "site": site,
-            "auth": auth_config,
-            "site_name": site_name,
-            "site_description": site_description,
-            "site_url": site_url,
-            "static_version": static_version,
+            **base_ctx,
             "tags": tags_list,
             "collections_list": collections_list,
             "collections": collections_ctx,
@@ -1236,6 +1825,8 @@ def build_site(
     ]
     for path in extra_urls:
         urls.append({"loc": f"{site_url}{path}" if site_url else path})
+    for path in page_urls:
+        urls.append({"loc": f"{site_url}{path}" if site_url else path})
     for tag in tags_list:
         tag_slug_value = quote(str(tag["slug"]), safe="")
         tag_loc = f"{site_url}/tags/{tag_slug_value}/" if site_url else f"/tags/{tag_slug_value}/"
@@ -1250,57 +1841,284 @@ def build_site(
         lastmod = str(img.get("created_at") or "")
         urls.append({"loc": loc, "lastmod": lastmod})
 
-    sitemap = env.get_template("sitemap.xml.j2").render(urls=urls)
-    _atomic_write_text(staging_dir / "sitemap.xml", sitemap)
-
-    robots = env.get_template("robots.txt.j2").render(site_url=site_url)
-    _atomic_write_text(staging_dir / "robots.txt", robots)
+    outputs.render("sitemap.xml", "sitemap.xml.j2", urls=urls)
+    outputs.render("robots.txt", "robots.txt.j2", site_url=site_url)
+    _image_context_cache.save(img["uuid"] for img in images_ctx)
+    outputs.finish(
+        assets,
+        clone=clone_stats.to_dict() if clone_stats else None,
+        image_contexts=_image_context_cache.stats(),
+    )
 
     fsync_path(staging_dir)
     fsync_path(staging_dir.parent)
     return staging_dir
 
 
-def _set_world_readable(path: Path) -> None:
+def _fix_mode(path: str, is_dir: bool, current: Optional[int] = None) -> bool:
     """
-    确保发布目录对 www-data 可读，防止权限导致 403。
+    权限不对时才 chmod，返回是否做了修改。
     """
-    for p in path.rglob("*"):
+    wanted = PUBLIC_DIR_MODE if is_dir else PUBLIC_FILE_MODE
+    try:
+        if current is None:
+            current = os.stat(path, follow_symlinks=False).st_mode
+        if current & 0o777 == wanted:
+            return False
+        os.chmod(path, wanted)
+        return True
+    except (FileNotFoundError, PermissionError):
+        return False
+
+
+def _set_world_readable(path: Path) -> int:
+    """
+    确保发布目录对 www-data 可读，防止权限导致 403；返回修正的路径数。
+    """
+    fixed = int(_fix_mode(str(path), True))
+    stack = [str(path)]
+    while stack:
+        current = stack.pop()
         try:
-            if p.is_dir():
-                os.chmod(p, 0o755)
-            else:
-                os.chmod(p, 0o644)
-        except PermissionError:
+            entries = list(os.scandir(current))
+        except (FileNotFoundError, PermissionError):
             continue
-    try:
-        os.chmod(path, 0o755)
-    except PermissionError:
-        pass
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and entry.is_symlink():
+                    continue
+                mode = entry.stat(follow_symlinks=False).st_mode
+            except OSError:
+                continue
+            fixed += _fix_mode(entry.path, is_dir, mode)
+            if is_dir:
+                stack.append(entry.path)
+    return fixed
+
+
+def _fix_written(site_dir: Path, written: Iterable[str]) -> int:
+    """
+    只校正本次构建写入的文件及其上级目录。
+    """
+    fixed = int(_fix_mode(str(site_dir), True))
+    seen_dirs = set()
+    for rel in written:
+        path = site_dir / rel
+        fixed += _fix_mode(str(path), False)
+        parent = path.parent
+        while parent != site_dir and parent not in seen_dirs:
+            seen_dirs.add(parent)
+            fixed += _fix_mode(str(parent), True)
+            parent = parent.parent
+    return fixed
+
+
+def audit_www_permissions(sample: Optional[int] = None) -> dict:
+    """
+    周期巡检：从站点根目录随机下钻抽查 sample 条路径，沿途校正目录与文件权限；
+    抽查到异常说明权限可能被外部改动过，此时退回整树修复。
+    """
+    sample = config.PERMISSION_AUDIT_SAMPLE if sample is None else sample
+    result = {"checked": 0, "fixed": 0, "full_repair": False}
+    root = live_site_dir()
+    if sample <= 0 or not root.exists():
+        return result
+    for _ in range(sample):
+        current = str(root)
+        result["checked"] += 1
+        result["fixed"] += _fix_mode(current, True)
+        while True:
+            try:
+                with os.scandir(current) as it:
+                    entries = [entry for entry in it if not entry.is_symlink()]
+            except (FileNotFoundError, PermissionError):
+                break
+            if not entries:
+                break
+            entry = random.choice(entries)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            result["checked"] += 1
+            result["fixed"] += _fix_mode(entry.path, is_dir)
+            if not is_dir:
+                break
+            current = entry.path
+    if result["fixed"]:
+        ensure_www_readable()
+        result["full_repair"] = True
+    return result
 
 
 def ensure_www_readable() -> None:
     """
     修复已发布目录的权限，避免静态资源偶发 403。
     """
-    for base in [config.STORAGE, config.WWW_DIR, config.WWW_DIR / "static"]:
+    site_dir = live_site_dir()
+    for base in [config.STORAGE, config.GENERATIONS_DIR, site_dir, site_dir / "static"]:
         if base.exists():
             try:
                 os.chmod(base, 0o755)
             except PermissionError:
                 pass
-    if config.WWW_DIR.exists():
-        _set_world_readable(config.WWW_DIR)
+    if site_dir.exists():
+        _set_world_readable(site_dir)
+
 
+def live_site_dir() -> Path:
+    """
+    当前对外服务的站点目录：www 为指向某个发布代的符号链接时返回其实际路径。
+    """
+    return Path(os.path.realpath(config.WWW_DIR))
 
-def publish(staging_dir: Path) -> None:
+
+def list_generations() -> List[Path]:
+    """
+    已保留的发布代，按发布时间从新到旧排列。
+    """
+    if not config.GENERATIONS_DIR.exists():
+        return []
+    generations = [path for path in config.GENERATIONS_DIR.iterdir() if path.is_dir() and not path.is_symlink()]
+    return sorted(generations, key=_generation_sort_key, reverse=True)
+
+
+def _generation_sort_key(path: Path) -> Tuple[float, int, int]:
+    # 目录名带发布时间（build_<ts>[_n] / legacy_<ts>）；目录 mtime 会随站点根目录内的写入变化，不可靠
+    match = re.match(r"^([a-z]+)_(\d+)(?:_(\d+))?$", path.name)
+    if match:
+        return float(match.group(2)), int(match.group(1) != "legacy"), int(match.group(3) or 0)
+    return path.stat().st_mtime, 0, 0
+
+
+def _point_www_at(generation: Path) -> None:
+    """
+    先在同目录建好临时符号链接，再 rename 覆盖 www：对读者而言 www 始终存在，切换是原子的。
+    """
+    link_tmp = config.WWW_DIR.with_name(f".{config.WWW_DIR.name}.{os.getpid()}.tmp")
+    try:
+        link_tmp.unlink()
+    except FileNotFoundError:
+        pass
+    os.symlink(os.path.relpath(generation, config.WWW_DIR.parent), link_tmp)
+    os.replace(link_tmp, config.WWW_DIR)
+    fsync_path(config.WWW_DIR.parent)
+
+
+def _adopt_legacy_www() -> None:
+    """
+    旧布局下 www 是真实目录：空目录直接删除，否则并入 generations 作为一个可回滚的发布代。
+    """
     target = config.WWW_DIR
-    tmp_old = target.parent / f"www_old_{int(time.time())}"
-    _set_world_readable(staging_dir)
-    if target.exists():
-        os.replace(target, tmp_old)
-    os.replace(staging_dir, target)
-    _set_world_readable(target)
-    fsync_path(target.parent)
-    if tmp_old.exists():
-        shutil.rmtree(tmp_old, ignore_errors=True)
+    if target.is_symlink() or not target.is_dir():
+        return
+    try:
+        target.rmdir()
+        return
+    except OSError:
+        pass
+    # 以目录 mtime 命名，排在新发布代之前
+    os.replace(target, config.GENERATIONS_DIR / f"legacy_{int(target.stat().st_mtime)}")
+
+
+def publish(staging_dir: Path) -> Path:
+    """
+    staging 整体移入 generations/<build_id>，再把 www 符号链接原子地切过去；返回新的发布代目录。
+    旧发布代保留给回滚，按 PUBLISH_GENERATIONS 清理：常驻 worker 交给后台线程，
+    命令行等没有后台线程的进程在发布后同步清理。
+    """
+    # delta 模式下文件写入时已带正确权限，克隆来的文件沿用线上 inode 的权限，只需校正本次写入的部分
+    written = load_build_manifest(staging_dir).get("written")
+    if config.PUBLISH_PERMISSIONS == "full" or written is None:
+        _set_world_readable(staging_dir)
+    else:
+        _fix_written(staging_dir, written)
+    _make_public_dirs(config.GENERATIONS_DIR)
+    # 同一秒内的多次发布用递增后缀区分；后缀取已有同名发布代之后，避免旧代被清理后名字被复用而排序靠后
+    generation = config.GENERATIONS_DIR / staging_dir.name
+    suffix = 0
+    for path in config.GENERATIONS_DIR.glob(f"{staging_dir.name}_*"):
+        tail = path.name[len(staging_dir.name) + 1 :]
+        if tail.isdigit():
+            suffix = max(suffix, int(tail))
+    if suffix or generation.exists():
+        generation = config.GENERATIONS_DIR / f"{staging_dir.name}_{suffix + 1}"
+    os.replace(staging_dir, generation)
+    fsync_path(config.GENERATIONS_DIR)
+    _adopt_legacy_www()
+    _point_www_at(generation)
+    if _reaper_running():
+        _reaper_wakeup.set()
+    else:
+        reap_generations()
+    return generation
+
+
+def rollback(target: Optional[str] = None, steps: int = 1) -> Path:
+    """
+    把 www 切回某个保留的发布代：指定 target 时按名称，否则取当前之后第 steps 个较旧的发布代。
+    回滚只切换链接，下一次构建仍以数据库当前状态为准。
+    """
+    generations = list_generations()
+    if target:
+        chosen = config.GENERATIONS_DIR / target
+        if chosen not in generations:
+            raise ValueError(f"发布代不存在: {target}")
+    else:
+        current = live_site_dir()
+        position = next((idx for idx, path in enumerate(generations) if path.resolve() == current), -1)
+        index = position + steps
+        if index < 0 or index >= len(generations) or position < 0:
+            raise ValueError("没有可回滚的较旧发布代")
+        chosen = generations[index]
+    _point_www_at(chosen)
+    return chosen
+
+
+def reap_generations(keep: Optional[int] = None) -> List[str]:
+    """
+    只保留最新的 keep 个发布代（回滚后的当前发布代即使较旧也始终保留），并清理旧布局遗留的 www_old_* 与临时链接。
+    """
+    keep = max(1, config.PUBLISH_GENERATIONS if keep is None else keep)
+    current = live_site_dir()
+    removed: List[str] = []
+    for path in list_generations()[keep:]:
+        if path.resolve() == current:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path.name)
+    for path in config.WWW_DIR.parent.glob("www_old_*"):
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+    return removed
+
+
+_reaper_wakeup = threading.Event()
+_reaper_lock = threading.Lock()
+_reaper_thread: Optional[threading.Thread] = None
+
+
+def _reaper_main() -> None:
+    while True:
+        _reaper_wakeup.wait()
+        _reaper_wakeup.clear()
+        try:
+            reap_generations()
+        except Exception:
+            continue
+
+
+def _reaper_running() -> bool:
+    with _reaper_lock:
+        return _reaper_thread is not None and _reaper_thread.is_alive()
+
+
+def start_generation_reaper() -> None:
+    """
+    启动后台清理线程（仅常驻 worker 调用）；publish 只负责唤醒它，删除旧树不阻塞发布。
+    """
+    global _reaper_thread
+    with _reaper_lock:
+        if _reaper_thread is None or not _reaper_thread.is_alive():
+            _reaper_thread = threading.Thread(target=_reaper_main, name="generation-reaper", daemon=True)
+            _reaper_thread.start()
+    _reaper_wakeup.set()
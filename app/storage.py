@@ -25,13 +25,18 @@ def ensure_dirs() -> None:
         config.UPLOAD_TMP,
         config.RAW_DIR,
         config.QUARANTINE_DIR,
+        config.DEFERRED_DIR,
         config.THUMB_DIR,
         config.TRASH_DIR,
         config.WWW_DIR,
         config.WWW_STAGING,
+        config.GENERATIONS_DIR,
         config.STATUS_DATA_DIR,
         config.LOG_DIR,
     ]:
+        # www 发布后是指向 generations/<build_id> 的符号链接，不能再当普通目录创建
+        if p.is_symlink():
+            continue
         p.mkdir(parents=True, exist_ok=True)
 
 
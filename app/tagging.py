@@ -1,8 +1,9 @@
 import json
 import re
+import threading
 from pathlib import Path
 from urllib.parse import unquote
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from . import config
 
@@ -66,7 +67,7 @@ def normalize_tag_type(raw: object, allowed_types: Optional[set] = None) -> str:
     if not value:
         return ""
     if allowed_types is None:
-        allowed_types = set(load_tag_types_config()[0].keys())
+        allowed_types = set(tag_registry().types_meta.keys())
     return value if value in allowed_types else ""
 
 
@@ -104,8 +105,7 @@ def _default_tag_types() -> List[dict]:
     return [dict(item) for item in DEFAULT_TAG_TYPES]
 
 
-def load_tag_types_config() -> Tuple[Dict[str, dict], List[str]]:
-    raw = _load_tags_config_raw()
+def _parse_tag_types(raw: dict) -> Tuple[Dict[str, dict], List[str]]:
     items = raw.get("types")
     if not isinstance(items, list):
         items = []
@@ -203,13 +203,15 @@ def normalize_parents(raw: object) -> List[str]:
     return parents
 
 
-def load_tags_config() -> Tuple[Dict[str, dict], List[str]]:
-    raw = _load_tags_config_raw()
+def _parse_tags(
+    raw: dict,
+    tag_types_meta: Dict[str, dict],
+    tag_types_order: List[str],
+) -> Tuple[Dict[str, dict], List[str]]:
     items = raw.get("tags") or []
     if not isinstance(items, list):
         return {}, []
 
-    tag_types_meta, tag_types_order = load_tag_types_config()
     allowed_types = set(tag_types_meta.keys())
     default_type = default_tag_type(tag_types_meta, tag_types_order)
 
@@ -245,6 +247,136 @@ def load_tags_config() -> Tuple[Dict[str, dict], List[str]]:
     return meta, order
 
 
+class TagRegistry:
+    """
+    tags.json 解析后的只读快照：标签与类型元数据、别名映射、父/子映射与每个标签的全部祖先。
+    进程内共享，调用方不得修改其中的结构；需要修改时用 load_tags_config() 取副本。
+    """
+
+    def __init__(
+        self,
+        meta: Dict[str, dict],
+        order: List[str],
+        types_meta: Dict[str, dict],
+        types_order: List[str],
+        signature: object,
+    ) -> None:
+        self.meta = meta
+        self.order = order
+        self.types_meta = types_meta
+        self.types_order = types_order
+        self.signature = signature
+        self.alias_map = build_alias_map(meta)
+        self.aliases: Dict[str, List[str]] = {}
+        for alias, canonical in self.alias_map.items():
+            if alias != canonical:
+                self.aliases.setdefault(canonical, []).append(alias)
+        self.parent_map = build_parent_map(meta, self.alias_map)
+        self.child_map: Dict[str, List[str]] = {}
+        for tag, parents in self.parent_map.items():
+            for parent in parents:
+                self.child_map.setdefault(parent, []).append(tag)
+        self.ancestors: Dict[str, Set[str]] = {tag: self._closure(tag) for tag in self.parent_map}
+
+    def _closure(self, tag: str) -> Set[str]:
+        collected: Set[str] = set()
+        stack = list(self.parent_map.get(tag, []))
+        while stack:
+            current = stack.pop()
+            if current in collected or current == tag:
+                continue
+            collected.add(current)
+            stack.extend(self.parent_map.get(current, []))
+        return collected
+
+    def missing_parents(self, tags: List[str]) -> List[str]:
+        return missing_parent_tags(tags, self.parent_map)
+
+    def expand(self, tags: Iterable[str]) -> Set[str]:
+        """
+        规范标签及其全部祖先。
+        """
+        expanded: Set[str] = set()
+        for tag in tags:
+            expanded.add(tag)
+            expanded.update(self.ancestors.get(tag, ()))
+        return expanded
+
+    def stored_variants(self, tag: str) -> List[str]:
+        """
+        按标签筛选时，image_tags 中可能出现的原始写法：该标签及其所有后代标签，连同它们的别名。
+        后台列表与 /api/search 的 tag 参数共用这一口径。
+        """
+        canonical = self.alias_map.get(normalize_tag(tag)) or normalize_tag(tag)
+        if not canonical:
+            return []
+        variants = {canonical}
+        stack = [canonical]
+        while stack:
+            for child in self.child_map.get(stack.pop(), []):
+                if child not in variants:
+                    variants.add(child)
+                    stack.append(child)
+        for item in list(variants):
+            variants.update(self.aliases.get(item, []))
+        return sorted(variants)
+
+
+_registry: Optional[TagRegistry] = None
+_registry_version = 0
+_registry_lock = threading.Lock()
+
+
+def _registry_signature() -> object:
+    try:
+        st = TAG_CONFIG_PATH.stat()
+        return (str(TAG_CONFIG_PATH), st.st_ino, st.st_mtime_ns, st.st_size, _registry_version)
+    except OSError:
+        return (str(TAG_CONFIG_PATH), None, _registry_version)
+
+
+def tag_registry() -> TagRegistry:
+    """
+    返回当前标签配置的快照。tags.json 的 inode / mtime / 大小不变且本进程未保存过配置时直接复用，
+    不再重复解析与规范化。
+    """
+    global _registry
+    signature = _registry_signature()
+    registry = _registry
+    if registry is not None and registry.signature == signature:
+        return registry
+    with _registry_lock:
+        if _registry is None or _registry.signature != signature:
+            raw = _load_tags_config_raw()
+            types_meta, types_order = _parse_tag_types(raw)
+            meta, order = _parse_tags(raw, types_meta, types_order)
+            _registry = TagRegistry(meta, order, types_meta, types_order, signature)
+        return _registry
+
+
+def invalidate_tag_registry() -> None:
+    global _registry_version
+    with _registry_lock:
+        _registry_version += 1
+
+
+def load_tag_types_config() -> Tuple[Dict[str, dict], List[str]]:
+    registry = tag_registry()
+    return {key: dict(info) for key, info in registry.types_meta.items()}, list(registry.types_order)
+
+
+def load_tags_config() -> Tuple[Dict[str, dict], List[str]]:
+    """
+    返回可修改的标签配置副本；只读场景直接用 tag_registry()。
+    """
+    registry = tag_registry()
+    meta = {
+        tag: {**info, "aliases": list(info.get("aliases") or []), "parents": list(info.get("parents") or [])}
+        for tag, info in registry.meta.items()
+    }
+    return meta, list(registry.order)
+
+
 def _serialize_tags(
     meta: Dict[str, dict],
     order: Optional[List[str]] = None,
@@ -297,6 +429,7 @@ def save_tags_config(meta: Dict[str, dict], order: Optional[List[str]] = None) -
     tmp = TAG_CONFIG_PATH.with_suffix(".tmp")
     tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
     tmp.replace(TAG_CONFIG_PATH)
+    invalidate_tag_registry()
 
 
 def save_tag_types_config(types: List[dict]) -> None:
@@ -315,6 +448,7 @@ def save_tag_types_config(types: List[dict]) -> None:
     tmp = TAG_CONFIG_PATH.with_suffix(".tmp")
     tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
     tmp.replace(TAG_CONFIG_PATH)
+    invalidate_tag_registry()
 
 
 def normalize_tag_types_payload(types: object) -> Tuple[Dict[str, dict], List[str]]:
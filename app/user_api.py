@@ -10,6 +10,7 @@ from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 from . import auth
 from . import config
 from . import db
+from . import fulltext
 from . import static_site
 from . import storage
 from . import tagging
@@ -108,6 +109,8 @@ def _resolve_upload_status(uuid_value: str, owner_user_id: int) -> dict:
 
     if _file_exists_with_uuid(config.RAW_DIR, uuid_value):
         return {"stage": "processing", "percent": 60, "message": "处理中"}
+    if _file_exists_with_uuid(config.DEFERRED_DIR, uuid_value):
+        return {"stage": "processing", "percent": 50, "message": "大图排队处理中"}
     if _file_exists_with_uuid(config.QUARANTINE_DIR, uuid_value):
         return {"stage": "failed", "percent": 100, "message": "已隔离"}
     return {"stage": "missing", "percent": 0, "message": "未找到记录"}
@@ -128,8 +131,7 @@ def _is_admin(user: auth.AuthUser) -> bool:
 
 
 def _load_alias_map() -> dict:
-    meta, _ = tagging.load_tags_config()
-    return tagging.build_alias_map(meta)
+    return tagging.tag_registry().alias_map
 
 
 def _parse_tags_input(raw: Any, *, require_hash: bool = False) -> Tuple[Optional[List[str]], Optional[str]]:
@@ -142,10 +144,7 @@ def _parse_tags_input(raw: Any, *, require_hash: bool = False) -> Tuple[Optional
 
 
 def _missing_parent_tags(tags: List[str]) -> List[str]:
-    meta, _ = tagging.load_tags_config()
-    alias_map = tagging.build_alias_map(meta)
-    parent_map = tagging.build_parent_map(meta, alias_map)
-    return tagging.missing_parent_tags(tags, parent_map)
+    return tagging.tag_registry().missing_parents(tags)
 
 
 def _load_tags_from_row(row: dict) -> List[str]:
@@ -156,32 +155,17 @@ def _allowed_extension_from_mime(mime: str) -> Optional[str]:
     return config.ALLOWED_MIME.get(mime)
 
 
-def _resolve_collection(
-    row: dict,
-    collections_meta: dict,
-    default_collection: str,
-) -> str:
-    collection_override = row.get("collection_override")
-    if collection_override:
-        return collection_override
-    uuid = row.get("uuid")
-    for key, meta in collections_meta.items():
-        if uuid in meta.get("uuids", set()):
-            return key
-    return default_collection
-
-
-def _build_image_item(
-    row_dict: dict,
-    collections_meta: dict,
-    default_collection: str,
-) -> dict:
+def _resolve_collection(row: dict, index: static_site.CollectionIndex) -> str:
+    return index.resolve(row.get("uuid"), row.get("collection_override"))
+
+
+def _build_image_item(row_dict: dict, index: static_site.CollectionIndex) -> dict:
     uuid = row_dict.get("uuid") or ""
     image_id = row_dict.get("image_id")
     tags = _load_tags_from_row(row_dict)
     title = row_dict.get("title_override") or static_site.simple_title(row_dict.get("original_name") or "")
-    collection = _resolve_collection(row_dict, collections_meta, default_collection)
-    collection_title = collections_meta.get(collection, {}).get("title", collection)
+    collection = _resolve_collection(row_dict, index)
+    collection_title = index.meta.get(collection, {}).get("title", collection)
     thumb_path_value = row_dict.get("thumb_path")
     thumb_name = Path(thumb_path_value).name if thumb_path_value else ""
     item = {
@@ -351,24 +335,30 @@ def my_images():
     user, err = _require_user()
     if err:
         return err
+    try:
+        limit, cursor = db.parse_page_args(request.args.get("limit"), request.args.get("cursor"), 2)
+    except ValueError as exc:
+        return _json_error(str(exc))
     db.ensure_schema()
     with db.connect() as conn:
-        rows = conn.execute(
+        rows, next_cursor = db.keyset_page(
+            conn,
             """
-            SELECT id AS image_id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height,
-                   dominant_color, created_at, thumb_path, stored_path,
-                   title_override, description, tags_json, collection_override
-            FROM images
-            WHERE deleted_at IS NULL AND owner_user_id=?
-            ORDER BY created_at DESC
+            id AS image_id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height,
+            dominant_color, created_at, thumb_path, stored_path,
+            title_override, description, tags_json, collection_override
             """,
+            "FROM images WHERE deleted_at IS NULL AND owner_user_id=?",
             (user.id,),
-        ).fetchall()
+            ("created_at", "id"),
+            cursor,
+            limit,
+        )
 
-    collections_meta, default_collection, _ = static_site.load_collections_config()
+    index = static_site.collection_index()
     items = []
     for row in rows:
-        item = _build_image_item(dict(row), collections_meta, default_collection)
+        item = _build_image_item(dict(row), index)
         items.append(item)
 
     collections, default_collection = _load_collections_list()
@@ -376,6 +366,7 @@ def my_images():
         {
             "ok": True,
             "images": items,
+            "next_cursor": next_cursor,
             "collections": collections,
             "default_collection": default_collection,
         }
@@ -404,31 +395,43 @@ def list_favorites():
     user, err = _require_user()
     if err:
         return err
+    try:
+        limit, cursor = db.parse_page_args(request.args.get("limit"), request.args.get("cursor"), 2)
+    except ValueError as exc:
+        return _json_error(str(exc))
     db.ensure_schema()
+    from_where = """
+        FROM user_favorites f
+        JOIN images i ON i.uuid = f.image_uuid
+        WHERE f.user_id=? AND i.deleted_at IS NULL
+    """
     with db.connect() as conn:
-        rows = conn.execute(
+        # 收藏按收藏时间排序，同一秒内以收藏记录的 rowid 区分先后
+        rows, next_cursor = db.keyset_page(
+            conn,
             """
-            SELECT i.id AS image_id,
-                   f.image_uuid AS uuid,
-                   f.created_at AS favorited_at,
-                   i.original_name, i.ext, i.bytes, i.width, i.height,
-                   i.thumb_width, i.thumb_height, i.dominant_color, i.created_at,
-                   i.thumb_path, i.stored_path,
-                   i.title_override, i.description, i.tags_json, i.collection_override
-            FROM user_favorites f
-            JOIN images i ON i.uuid = f.image_uuid
-            WHERE f.user_id=? AND i.deleted_at IS NULL
-            ORDER BY f.created_at DESC
+            i.id AS image_id,
+            f.image_uuid AS uuid,
+            f.created_at AS favorited_at,
+            i.original_name, i.ext, i.bytes, i.width, i.height,
+            i.thumb_width, i.thumb_height, i.dominant_color, i.created_at,
+            i.thumb_path, i.stored_path,
+            i.title_override, i.description, i.tags_json, i.collection_override
             """,
+            from_where,
             (user.id,),
-        ).fetchall()
+            ("f.created_at", "f.rowid"),
+            cursor,
+            limit,
+        )
+        total = conn.execute(f"SELECT COUNT(*) AS c {from_where}", (user.id,)).fetchone()["c"]
 
-    collections_meta, default_collection, _ = static_site.load_collections_config()
+    index = static_site.collection_index()
     items = []
     for row in rows:
-        item = _build_image_item(dict(row), collections_meta, default_collection)
+        item = _build_image_item(dict(row), index)
         items.append(item)
-    return jsonify({"ok": True, "images": items, "total": len(items)})
+    return jsonify({"ok": True, "images": items, "total": total, "next_cursor": next_cursor})
 
 
 @bp.post("/api/favorites/<uuid>/toggle")
@@ -577,33 +580,42 @@ def gallery_images(gallery_id: int):
     user, err = _require_user()
     if err:
         return err
+    try:
+        limit, cursor = db.parse_page_args(request.args.get("limit"), request.args.get("cursor"), 3)
+    except ValueError as exc:
+        return _json_error(str(exc))
     db.ensure_schema()
     with db.connect() as conn:
         gallery = _load_gallery(conn, gallery_id, user.id)
         if not gallery:
             return _json_error("画廊不存在", 404)
-        rows = conn.execute(
+        rows, next_cursor = db.keyset_page(
+            conn,
+            """
+            i.id AS image_id,
+            i.uuid, i.original_name, i.ext, i.bytes, i.width, i.height,
+            i.thumb_width, i.thumb_height, i.dominant_color, i.created_at,
+            i.thumb_path, i.stored_path,
+            i.title_override, i.description, i.tags_json, i.collection_override,
+            gi.created_at AS added_at
+            """,
             """
-            SELECT i.id AS image_id,
-                   i.uuid, i.original_name, i.ext, i.bytes, i.width, i.height,
-                   i.thumb_width, i.thumb_height, i.dominant_color, i.created_at,
-                   i.thumb_path, i.stored_path,
-                   i.title_override, i.description, i.tags_json, i.collection_override,
-                   gi.created_at AS added_at
             FROM user_gallery_images gi
             JOIN images i ON i.uuid = gi.image_uuid
             WHERE gi.gallery_id=? AND i.deleted_at IS NULL
-            ORDER BY gi.position DESC, gi.created_at DESC
             """,
             (gallery_id,),
-        ).fetchall()
+            ("gi.position", "gi.created_at", "gi.rowid"),
+            cursor,
+            limit,
+        )
 
-    collections_meta, default_collection, _ = static_site.load_collections_config()
+    index = static_site.collection_index()
     items = []
     for row in rows:
-        item = _build_image_item(dict(row), collections_meta, default_collection)
+        item = _build_image_item(dict(row), index)
         items.append(item)
-    return jsonify({"ok": True, "gallery": gallery, "images": items})
+    return jsonify({"ok": True, "gallery": gallery, "images": items, "next_cursor": next_cursor})
 
 
 @bp.post("/api/galleries/<int:gallery_id>/items")
@@ -649,6 +661,53 @@ def update_gallery_items(gallery_id: int):
     return jsonify({"ok": True, "status": status})
 
 
+@bp.get("/api/search")
+def search_images():
+    """
+    站点公开作品的动态检索，结构与静态搜索索引的记录一致；静态索引过大时由 search.js 改用。
+    q 为文本词，tag 可多个（含子标签），cursor 为不透明的续页标记。
+    """
+    db.ensure_schema()
+    if not config.SEARCH_API or not fulltext.available():
+        return _json_error("搜索接口未启用", 404)
+    tags = [str(v).strip() for v in request.args.getlist("tag") if str(v).strip()]
+    collection = str(request.args.get("collection") or "").strip()
+    orientation = str(request.args.get("orientation") or "").strip().lower()
+    try:
+        limit, cursor = db.parse_page_args(request.args.get("limit"), request.args.get("cursor"), 1)
+    except ValueError as exc:
+        return _json_error(str(exc))
+    # 排名结果没有稳定的键集，续页标记里存的是偏移量
+    offset = cursor[0] if cursor else 0
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        return _json_error("cursor 无效")
+    try:
+        with db.connect() as conn:
+            rows = fulltext.search(
+                conn,
+                str(request.args.get("q") or "").strip(),
+                tags,
+                "" if collection == "all" else collection,
+                "" if orientation == "all" else orientation,
+                limit + 1,
+                offset,
+            )
+    except ValueError as exc:
+        return _json_error(str(exc))
+
+    index = static_site.collection_index()
+    items = []
+    for row in rows[:limit]:
+        row_dict = dict(row)
+        item = _build_image_item(row_dict, index)
+        item["bytes"] = row_dict.get("bytes")
+        item["orientation"] = static_site.classify_orientation(row_dict.get("width"), row_dict.get("height"))
+        item["size_bucket"] = static_site.size_bucket(row_dict.get("width"), row_dict.get("height"))
+        items.append(item)
+    next_cursor = db.encode_cursor([offset + limit]) if len(rows) > limit else None
+    return jsonify({"ok": True, "images": items, "next_cursor": next_cursor})
+
+
 @bp.get("/api/images/<uuid>")
 def image_meta(uuid: str):
     user, err = _require_user()
@@ -674,9 +733,8 @@ def image_meta(uuid: str):
     if not (is_admin or is_owner):
         return _json_error("无权限", 403)
 
-    collections_meta, default_collection, _ = static_site.load_collections_config()
     tags = _load_tags_from_row(dict(row))
-    collection = _resolve_collection(dict(row), collections_meta, default_collection)
+    collection = _resolve_collection(dict(row), static_site.collection_index())
     collections, default_collection = _load_collections_list()
 
     return jsonify(
@@ -700,13 +758,6 @@ def image_meta(uuid: str):
     )
 
 
-def _touch_rebuild_flag(reason: str) -> None:
-    try:
-        config.FORCE_REBUILD_FLAG.write_text(reason, encoding="utf-8")
-    except Exception:
-        pass
-
-
 @bp.post("/api/images/<uuid>/update")
 def update_image(uuid: str):
     user, err = _require_user()
@@ -743,6 +794,7 @@ def update_image(uuid: str):
         is_owner = row["owner_user_id"] == user.id
         if not (is_admin or is_owner):
             return _json_error("无权限", 403)
+        tags_json = json.dumps(tags or [], ensure_ascii=False)
         conn.execute(
             """
             UPDATE images
@@ -752,13 +804,16 @@ def update_image(uuid: str):
             (
                 title or None,
                 description or None,
-                json.dumps(tags or [], ensure_ascii=False),
+                tags_json,
                 collection or None,
                 uuid,
             ),
         )
+        db.write_image_tags(conn, uuid, tags_json)
+        fulltext.update_images(conn, [uuid])
+        db.mark_dirty("image", [uuid], "user_image_updated", conn=conn)
 
-    _touch_rebuild_flag("user_image_updated")
+    db.notify_dirty()
     try:
         db.insert_audit("user_update_image", uuid, user.username)
     except Exception:
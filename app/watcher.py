@@ -0,0 +1,188 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from . import config
+
+RAW = "raw"
+FLAG = "flag"
+STATIC = "static"
+ALL_CHANNELS = frozenset({RAW, FLAG, STATIC})
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_RAW_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO
+_FLAG_MASK = _IN_CREATE | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_ATTRIB
+_STATIC_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+_EVENT_HEADER = struct.Struct("iIII")
+# 一次写入会先后产生 CREATE、CLOSE_WRITE 等多个事件，可能分批到达；唤醒后短暂等待把它们并入同一次唤醒
+_SETTLE_SECONDS = 0.02
+_SETTLE_ROUNDS = 10
+
+
+class PollingWatcher:
+    """
+    兜底模式：固定间隔睡眠，醒来后视为所有来源都可能有变化。
+    """
+
+    event_driven = False
+
+    def wait(self, timeout: float) -> Set[str]:
+        time.sleep(timeout)
+        return set(ALL_CHANNELS)
+
+    def close(self) -> None:
+        return None
+
+
+class InotifyWatcher:
+    """
+    Linux inotify 唤醒：监听 raw 目录新文件、强制重建标记/待重建信号与 static 整棵树。
+    通过 ctypes 直接调用 libc，不引入额外依赖；目录被删除重建后在下一次 wait 时自动补挂。
+    """
+
+    event_driven = True
+
+    def __init__(self, libc: ctypes.CDLL) -> None:
+        self._libc = libc
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches: Dict[int, Tuple[str, Path]] = {}
+        self._ensure_watches()
+
+    def _add_watch(self, channel: str, path: Path, mask: int) -> bool:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(path)), mask | _IN_ONLYDIR)
+        if wd < 0:
+            return False
+        self._watches[wd] = (channel, path)
+        return True
+
+    def _watched(self, channel: str, path: Path) -> bool:
+        return (channel, path) in self._watches.values()
+
+    def _watch_static_tree(self, root: Path) -> None:
+        for dirpath, _dirnames, _filenames in os.walk(root):
+            path = Path(dirpath)
+            if not self._watched(STATIC, path):
+                self._add_watch(STATIC, path, _STATIC_MASK)
+
+    def _ensure_watches(self) -> Set[str]:
+        """
+        补挂缺失的监听；返回新挂上的来源（挂载期间可能错过事件，按有变化处理）。
+        """
+        added: Set[str] = set()
+        if config.RAW_DIR.is_dir() and not self._watched(RAW, config.RAW_DIR):
+            if self._add_watch(RAW, config.RAW_DIR, _RAW_MASK):
+                added.add(RAW)
+        flag_dir = config.FORCE_REBUILD_FLAG.parent
+        if flag_dir.is_dir() and not self._watched(FLAG, flag_dir):
+            if self._add_watch(FLAG, flag_dir, _FLAG_MASK):
+                added.add(FLAG)
+        if config.STATIC.is_dir() and not self._watched(STATIC, config.STATIC):
+            self._watch_static_tree(config.STATIC)
+            added.add(STATIC)
+        return added
+
+    def _drain(self) -> Set[str]:
+        channels: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & _IN_Q_OVERFLOW:
+                    channels.update(ALL_CHANNELS)
+                    continue
+                watch = self._watches.get(wd)
+                if not watch:
+                    continue
+                channel, path = watch
+                if mask & _IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    channels.add(channel)
+                    continue
+                name = os.fsdecode(raw_name)
+                if channel == FLAG:
+                    if name in (config.FORCE_REBUILD_FLAG.name, config.BUILD_DIRTY_SIGNAL.name):
+                        channels.add(FLAG)
+                    continue
+                if channel == STATIC and mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._watch_static_tree(path / name)
+                channels.add(channel)
+        return channels
+
+    def wait(self, timeout: float) -> Set[str]:
+        added = self._ensure_watches()
+        if added:
+            return added | self._drain()
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return set()
+        channels = self._drain()
+        for _ in range(_SETTLE_ROUNDS):
+            ready, _, _ = select.select([self._fd], [], [], _SETTLE_SECONDS)
+            if not ready:
+                break
+            channels |= self._drain()
+        return channels
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def create_watcher():
+    """
+    按 WORKER_WAKEUP 选择唤醒方式：auto 在 Linux 上优先 inotify，失败时回退轮询。
+    """
+    mode = config.WORKER_WAKEUP
+    if mode != "poll":
+        libc = _load_libc()
+        if libc is not None:
+            try:
+                return InotifyWatcher(libc)
+            except OSError:
+                pass
+    return PollingWatcher()
@@ -4,8 +4,9 @@ import os
 import re
 import shutil
 import time
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
 try:
     from zoneinfo import ZoneInfo  # type: ignore
 except Exception:  # pragma: no cover
@@ -13,9 +14,11 @@ except Exception:  # pragma: no cover
 
 from . import config
 from . import db
+from . import fulltext
 from . import image_utils
 from . import static_site
-from .storage import detect_mime, ensure_dirs, fsync_path, move_to_quarantine
+from . import watcher as watcher_mod
+from .storage import atomic_move, detect_mime, ensure_dirs, fsync_path, move_to_quarantine
 
 
 def parse_uuid_from_name(path: Path) -> Optional[str]:
@@ -26,10 +29,14 @@ def parse_uuid_from_name(path: Path) -> Optional[str]:
 THUMB_NAME_PATTERN = re.compile(r"^L(\d{8})A(\d{3})\.(?:jpg|webp)$")
 
 
-def next_thumb_filename(today: Optional[datetime.date] = None) -> str:
+def next_thumb_filename(
+    today: Optional[datetime.date] = None,
+    reserved: Optional[Iterable[str]] = None,
+) -> str:
     """
     生成短路径缩略图名：L + 日期 + 序号（如 L20251220A001）。
     单线程 worker，按 DB 已有记录递增，确保可维护与可追踪。
+    并行批处理时，reserved 传入本批已分配但尚未入库的文件名。
     """
     date = today or datetime.date.today()
     date_str = date.strftime("%Y%m%d")
@@ -38,20 +45,22 @@ def next_thumb_filename(today: Optional[datetime.date] = None) -> str:
             "SELECT thumb_path FROM images WHERE thumb_path LIKE ?",
             (f"thumb/L{date_str}A%",),
         ).fetchall()
+    names = [Path(row["thumb_path"]).name for row in rows if row["thumb_path"]]
+    names.extend(reserved or [])
     max_seq = 0
-    for row in rows:
-        name = Path(row["thumb_path"]).name if row["thumb_path"] else ""
+    for name in names:
         match = THUMB_NAME_PATTERN.match(name)
-        if match:
+        if match and match.group(1) == date_str:
             max_seq = max(max_seq, int(match.group(2)))
     return f"L{date_str}A{max_seq + 1:03d}{config.THUMB_EXT}"
 
 
-def next_raw_file() -> Optional[Path]:
+def pending_raw_files(limit: Optional[int] = None) -> List[Path]:
     candidates = sorted(
         [p for p in config.RAW_DIR.iterdir() if p.is_file()],
         key=lambda p: p.stat().st_mtime,
     )
+    found: List[Path] = []
     with db.connect() as conn:
         for path in candidates:
             uuid = parse_uuid_from_name(path)
@@ -62,24 +71,33 @@ def next_raw_file() -> Optional[Path]:
             row = conn.execute("SELECT status FROM images WHERE uuid=?", (uuid,)).fetchone()
             if row and row["status"] in ("processed", "published", "quarantined"):
                 continue
-            return path
-    return None
+            found.append(path)
+            if limit and len(found) >= limit:
+                break
+    return found
 
 
-def process_file(path: Path) -> bool:
-    db.ensure_schema()
-    ensure_dirs()
+def next_raw_file() -> Optional[Path]:
+    found = pending_raw_files(limit=1)
+    return found[0] if found else None
+
+
+def _prepare_file(path: Path, reserved: Optional[Iterable[str]] = None) -> Optional[Tuple[str, str, str, str]]:
+    """
+    父进程内的校验与缩略图命名，失败时直接隔离。
+    返回 (uuid, ext, mime, thumb_filename)。
+    """
     uuid = parse_uuid_from_name(path)
     if not uuid:
         move_to_quarantine(path, "invalid_filename")
         db.insert_audit("quarantine", path.name, "invalid filename")
-        return False
+        return None
 
     ext = path.suffix.lower()
     if ext not in config.ALLOWED_MIME.values():
         move_to_quarantine(path, f"ext_not_allowed:{ext}")
         db.insert_audit("quarantine", path.name, f"ext_not_allowed:{ext}")
-        return False
+        return None
 
     mime = detect_mime(path)
     with db.connect() as conn:
@@ -90,20 +108,44 @@ def process_file(path: Path) -> bool:
     thumb_filename = (
         Path(existing["thumb_path"]).name
         if existing and existing["thumb_path"]
-        else next_thumb_filename()
+        else next_thumb_filename(reserved=reserved)
     )
-    thumb_path = config.THUMB_DIR / thumb_filename
-    try:
-        width, height = image_utils.read_dimensions(path)
-        sha256 = image_utils.compute_sha256(path)
-        size_bytes = path.stat().st_size
-        thumb_width, thumb_height = image_utils.make_thumbnail(path, thumb_path)
-        color = image_utils.dominant_color(thumb_path)
-    except Exception as exc:  # noqa: BLE001
-        move_to_quarantine(path, f"processing_failed:{exc}")
-        db.insert_audit("quarantine", path.name, f"processing_failed:{exc}")
-        return False
+    return uuid, ext, mime, thumb_filename
+
+
+def analyze_raw_file(
+    path: str,
+    thumb_path: str,
+    budget_bytes: Optional[int] = None,
+) -> image_utils.ImageAnalysis:
+    """
+    CPU 密集部分：解码、哈希、生成缩略图与主色。
+    只读原图、只写缩略图，不访问数据库，可在子进程中执行。
+    """
+    return image_utils.analyze_image(Path(path), Path(thumb_path), budget_bytes=budget_bytes)
+
+
+def _quarantine_failed(path: Path, exc: BaseException) -> None:
+    move_to_quarantine(path, f"processing_failed:{exc}")
+    db.insert_audit("quarantine", path.name, f"processing_failed:{exc}")
+
 
+def _defer_file(path: Path, exc: BaseException) -> None:
+    """
+    预估解码内存超出预算的图片移入 deferred 目录，等队列空闲后单独处理，避免 worker 被 OOM 杀死。
+    """
+    atomic_move(path, config.DEFERRED_DIR / path.name)
+    db.insert_audit("deferred", path.name, str(exc))
+
+
+def _commit_processed(
+    path: Path,
+    uuid: str,
+    ext: str,
+    mime: str,
+    thumb_filename: str,
+    result: image_utils.ImageAnalysis,
+) -> None:
     with db.transaction() as conn:
         pending = conn.execute(
             """
@@ -115,8 +157,8 @@ def process_file(path: Path) -> bool:
         ).fetchone()
         conn.execute(
             """
-            INSERT INTO images (uuid, original_name, ext, mime, width, height, bytes, sha256, status, stored_path, thumb_path, thumb_width, thumb_height, dominant_color, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'processed', ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            INSERT INTO images (uuid, original_name, ext, mime, width, height, bytes, sha256, status, stored_path, thumb_path, thumb_width, thumb_height, thumb_renditions, dominant_color, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'processed', ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
             ON CONFLICT(uuid) DO UPDATE SET
                 ext=excluded.ext,
                 mime=excluded.mime,
@@ -129,6 +171,7 @@ def process_file(path: Path) -> bool:
                 thumb_path=excluded.thumb_path,
                 thumb_width=excluded.thumb_width,
                 thumb_height=excluded.thumb_height,
+                thumb_renditions=excluded.thumb_renditions,
                 dominant_color=excluded.dominant_color,
                 updated_at=CURRENT_TIMESTAMP
             """,
@@ -137,15 +180,16 @@ def process_file(path: Path) -> bool:
                 path.name,
                 ext,
                 mime or "",
-                width,
-                height,
-                size_bytes,
-                sha256,
+                result.width,
+                result.height,
+                result.bytes,
+                result.sha256,
                 f"raw/{path.name}",
                 f"thumb/{thumb_filename}",
-                thumb_width,
-                thumb_height,
-                color,
+                result.thumb_width,
+                result.thumb_height,
+                result.renditions_json(),
+                result.dominant_color,
             ),
         )
         if pending:
@@ -164,21 +208,238 @@ def process_file(path: Path) -> bool:
                     uuid,
                 ),
             )
+            db.write_image_tags(conn, uuid, pending["tags_json"])
             conn.execute("DELETE FROM upload_requests WHERE uuid=?", (uuid,))
+        fulltext.update_images(conn, [uuid])
         conn.execute(
             "INSERT INTO jobs (image_uuid, stage, status, message) VALUES (?, ?, ?, ?)",
             (uuid, "process", "done", ""),
         )
 
+
+def process_file(path: Path) -> bool:
+    db.ensure_schema()
+    ensure_dirs()
+    prepared = _prepare_file(path)
+    if not prepared:
+        return False
+    uuid, ext, mime, thumb_filename = prepared
+    try:
+        result = analyze_raw_file(str(path), str(config.THUMB_DIR / thumb_filename))
+    except image_utils.DecodeBudgetExceeded as exc:
+        _defer_file(path, exc)
+        return False
+    except Exception as exc:  # noqa: BLE001
+        _quarantine_failed(path, exc)
+        return False
+    _commit_processed(path, uuid, ext, mime, thumb_filename, result)
     return True
 
 
+def process_deferred_file() -> bool:
+    """
+    处理一张 deferred 图片：不设内存预算，在独立的单进程子进程中解码。
+    即使子进程被 OOM 杀死也不影响 worker 主进程，此时仅隔离该文件。
+    成功后移回 raw 目录再入库，与常规流程的存储路径保持一致。
+    """
+    if not config.DEFERRED_DIR.exists():
+        return False
+    candidates = sorted(
+        [p for p in config.DEFERRED_DIR.iterdir() if p.is_file()],
+        key=lambda p: p.stat().st_mtime,
+    )
+    if not candidates:
+        return False
+    path = candidates[0]
+    db.ensure_schema()
+    ensure_dirs()
+    prepared = _prepare_file(path)
+    if not prepared:
+        return False
+    uuid, ext, mime, thumb_filename = prepared
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(
+                analyze_raw_file,
+                str(path),
+                str(config.THUMB_DIR / thumb_filename),
+                0,
+            ).result()
+    except Exception as exc:  # noqa: BLE001
+        _quarantine_failed(path, exc)
+        return False
+    raw_path = config.RAW_DIR / path.name
+    atomic_move(path, raw_path)
+    _commit_processed(raw_path, uuid, ext, mime, thumb_filename, result)
+    return True
+
+
+def _plan_waves(
+    items: List[Tuple[Path, Tuple[str, str, str, str]]],
+    max_workers: int,
+    memory_limit: int,
+) -> Iterator[List[Tuple[Path, Tuple[str, str, str, str]]]]:
+    """
+    按进程数与估算解码内存切分批次；单张超限的图片独占一批，不会被跳过。
+    """
+    wave: List[Tuple[Path, Tuple[str, str, str, str]]] = []
+    wave_bytes = 0
+    for item in items:
+        cost = image_utils.estimate_decode_bytes(item[0])
+        if wave and (len(wave) >= max_workers or wave_bytes + cost > memory_limit):
+            yield wave
+            wave = []
+            wave_bytes = 0
+        wave.append(item)
+        wave_bytes += cost
+    if wave:
+        yield wave
+
+
+def create_process_pool() -> Optional[ProcessPoolExecutor]:
+    if config.WORKER_PROCESSES <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=config.WORKER_PROCESSES)
+
+
+def _finish_item(path: Path, item: Tuple[str, str, str, str], analyze) -> bool:
+    """
+    取子进程结果并提交：超出内存预算的移入 deferred，其他失败隔离。进程池损坏（BrokenExecutor）向上抛出。
+    """
+    try:
+        result = analyze()
+    except BrokenExecutor:
+        raise
+    except image_utils.DecodeBudgetExceeded as exc:
+        _defer_file(path, exc)
+        return False
+    except Exception as exc:  # noqa: BLE001
+        _quarantine_failed(path, exc)
+        return False
+    uuid, ext, mime, thumb_filename = item
+    _commit_processed(path, uuid, ext, mime, thumb_filename, result)
+    return True
+
+
+def _process_isolated(path: Path, item: Tuple[str, str, str, str]) -> bool:
+    """
+    进程池损坏后逐张重试：每张图片在独立的单进程子进程中解码，再次导致子进程退出的即为元凶，隔离该文件。
+    """
+    thumb_path = str(config.THUMB_DIR / item[3])
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return _finish_item(path, item, pool.submit(analyze_raw_file, str(path), thumb_path).result)
+    except BrokenExecutor as exc:
+        _quarantine_failed(path, exc)
+        return False
+
+
+def _process_batch(paths: List[Path], pool: Executor) -> Tuple[int, bool]:
+    """
+    process_batch 的实现，另外返回进程池是否仍可用（损坏后调用方需丢弃并重建）。
+    """
+    db.ensure_schema()
+    ensure_dirs()
+    prepared: List[Tuple[Path, Tuple[str, str, str, str]]] = []
+    reserved: List[str] = []
+    for path in paths:
+        item = _prepare_file(path, reserved=reserved)
+        if not item:
+            continue
+        prepared.append((path, item))
+        reserved.append(item[3])
+
+    processed = 0
+    remaining = list(prepared)
+    try:
+        for wave in _plan_waves(prepared, config.WORKER_PROCESSES, config.WORKER_MEMORY_LIMIT_BYTES):
+            futures = [
+                pool.submit(analyze_raw_file, str(path), str(config.THUMB_DIR / item[3]))
+                for path, item in wave
+            ]
+            for (path, item), future in zip(wave, futures):
+                if _finish_item(path, item, future.result):
+                    processed += 1
+                remaining.pop(0)
+    except BrokenExecutor:
+        # 无法确定是哪张图让子进程退出，剩余文件逐张隔离重试，不在 worker 主进程里解码
+        for path, item in remaining:
+            if _process_isolated(path, item):
+                processed += 1
+        return processed, False
+    return processed, True
+
+
+def process_batch(paths: List[Path], pool: Optional[Executor] = None) -> int:
+    """
+    并行处理一批原图，返回成功数量。
+    子进程只负责解码与编码；缩略图命名与 SQLite 提交留在父进程，并按输入顺序进行。
+    本批的缩略图名在提交前就已预留，其中有文件被隔离或移入 deferred 时，
+    L{date}A{seq} 序号会留下空缺（串行模式会复用该序号），但顺序不变。
+    进程池异常时剩余文件各自在独立的单进程子进程中重试。
+    """
+    if pool is None:
+        return sum(1 for path in paths if process_file(path))
+    processed, _ = _process_batch(paths, pool)
+    return processed
+
+
+def drain_raw_queue(limit: Optional[int] = None) -> bool:
+    """
+    处理 raw 目录中的待处理文件，返回是否有成功入库的图片。
+    limit 限制本轮最多处理的文件数（供合并发布按批次上限及时发布），None 表示排空。
+    进程池只在存在多张待处理图片时按需创建，排空后即释放，空闲时不占内存；损坏后下一批重新创建。
+    """
+    processed_any = False
+    remaining = limit
+    if config.WORKER_PROCESSES <= 1:
+        while remaining is None or remaining > 0:
+            path = next_raw_file()
+            if not path:
+                break
+            ok = process_file(path)
+            processed_any = processed_any or ok
+            if remaining is not None:
+                remaining -= 1
+        return processed_any
+
+    pool: Optional[ProcessPoolExecutor] = None
+    try:
+        while remaining is None or remaining > 0:
+            batch_limit = config.WORKER_PROCESSES * 2
+            if remaining is not None:
+                batch_limit = min(batch_limit, remaining)
+                remaining -= batch_limit
+            batch = pending_raw_files(limit=batch_limit)
+            if not batch:
+                break
+            if pool is None and len(batch) > 1:
+                pool = create_process_pool()
+            if pool is None:
+                processed = sum(1 for path in batch if process_file(path))
+            else:
+                processed, pool_ok = _process_batch(batch, pool)
+                if not pool_ok:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    pool = None
+            if processed:
+                processed_any = True
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return processed_any
+
+
 def rebuild_and_publish(
     log_build: bool = True,
     changed_uuids: Optional[List[str]] = None,
     full_rebuild: bool = True,
 ) -> Path:
-    build_id = f"build_{int(time.time())}"
+    """
+    构建并发布，返回新的发布代目录（generations/<build_id>）。
+    """
+    # 构建读取的是当前库状态，构建开始前已登记的待重建记录在发布后即可清除
+    dirty_upto = db.pending_dirty().upto
     rows = images_for_site()
     base_dir = config.WWW_DIR if not full_rebuild and config.WWW_DIR.exists() else None
     staging_dir = static_site.build_site(
@@ -187,29 +448,31 @@ def rebuild_and_publish(
         changed_uuids=changed_uuids,
         full_rebuild=full_rebuild,
     )
-    static_site.publish(staging_dir)
+    generation = static_site.publish(staging_dir)
     write_last_static_mtime(latest_static_mtime())
     clear_force_flag()
+    db.clear_dirty(dirty_upto)
     if log_build:
         try:
             with db.transaction() as conn:
                 conn.execute(
-                    "INSERT INTO builds (build_id, status, staging_path, published_at, created_at, updated_at) VALUES (?, 'published', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
-                    (build_id, str(staging_dir)),
+                    "INSERT INTO builds (build_id, status, staging_path, generation, published_at, created_at, updated_at) VALUES (?, 'published', ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+                    (generation.name, str(staging_dir), generation.name),
                 )
         except Exception:
             pass
-    return staging_dir
+    return generation
 
 
 def images_for_site() -> List[dict]:
+    # 没有统计信息时规划器会偏向 status 单列索引再排序；这里直接走按时间排好的部分索引
     db.ensure_schema()
     with db.connect() as conn:
         return conn.execute(
             """
-            SELECT id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height, sha256, dominant_color, created_at, thumb_path,
+            SELECT id, uuid, original_name, ext, bytes, width, height, thumb_width, thumb_height, thumb_renditions, sha256, dominant_color, created_at, thumb_path,
                    title_override, description, tags_json, collection_override
-            FROM images
+            FROM images INDEXED BY idx_images_site_created
             WHERE status IN ('processed','published')
               AND deleted_at IS NULL
             ORDER BY created_at DESC
@@ -217,32 +480,105 @@ def images_for_site() -> List[dict]:
         ).fetchall()
 
 
+def pending_publish_count() -> int:
+    with db.connect() as conn:
+        return int(conn.execute("SELECT COUNT(*) AS c FROM images WHERE status='processed'").fetchone()["c"])
+
+
+class PublishScheduler:
+    """
+    合并发布调度：记录待发布图片数的变化时间，
+    静默期（无新图入库）满、最早待发布图片等待超过最大延迟、或待发布数达到批次上限时才允许发布，
+    使连续上传只触发一次增量构建。时钟可注入以便测试。
+    """
+
+    def __init__(
+        self,
+        quiet_seconds: Optional[float] = None,
+        max_delay_seconds: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        clock=time.monotonic,
+    ) -> None:
+        self.quiet_seconds = config.PUBLISH_QUIET_SECONDS if quiet_seconds is None else quiet_seconds
+        self.max_delay_seconds = (
+            config.PUBLISH_MAX_DELAY_SECONDS if max_delay_seconds is None else max_delay_seconds
+        )
+        self.max_batch = config.PUBLISH_MAX_BATCH if max_batch is None else max_batch
+        self._clock = clock
+        self.reset()
+
+    def reset(self) -> None:
+        self._pending = 0
+        self._first_seen: Optional[float] = None
+        self._last_change: Optional[float] = None
+
+    def observe(self, pending: int) -> None:
+        if pending <= 0:
+            self.reset()
+            return
+        now = self._clock()
+        if self._first_seen is None:
+            self._first_seen = now
+        if pending != self._pending:
+            self._pending = pending
+            self._last_change = now
+
+    def remaining_capacity(self) -> Optional[int]:
+        """
+        本批次还能再收多少张；批次上限 <= 0 时不限制。
+        """
+        if self.max_batch <= 0:
+            return None
+        return max(self.max_batch - self._pending, 0)
+
+    def seconds_until_due(self) -> Optional[float]:
+        if not self._pending or self._first_seen is None or self._last_change is None:
+            return None
+        if self.max_batch > 0 and self._pending >= self.max_batch:
+            return 0.0
+        now = self._clock()
+        quiet_left = self._last_change + self.quiet_seconds - now
+        delay_left = self._first_seen + self.max_delay_seconds - now
+        return max(min(quiet_left, delay_left), 0.0)
+
+    def due(self) -> bool:
+        left = self.seconds_until_due()
+        return left is not None and left <= 0
+
+
+def can_build_incrementally() -> bool:
+    """
+    已发布站点带有构建 manifest 时，模板、静态资源、配置与数据的变化都能按输出粒度识别，
+    强制重建标记与 static 变更也只需增量构建。
+    """
+    return config.WWW_DIR.exists() and bool(static_site.load_build_manifest(config.WWW_DIR))
+
+
 def publish_ready_images() -> bool:
     with db.connect() as conn:
         pending = [row["uuid"] for row in conn.execute("SELECT uuid FROM images WHERE status='processed'").fetchall()]
     if not pending:
         return False
 
-    static_changed = latest_static_mtime() > read_last_static_mtime()
-    force_rebuild = config.FORCE_REBUILD_FLAG.exists()
-    full_rebuild = force_rebuild or static_changed or not config.WWW_DIR.exists()
-    staging_dir = rebuild_and_publish(
+    dirty_images = db.pending_dirty().images()
+    generation = rebuild_and_publish(
         log_build=False,
-        changed_uuids=pending,
-        full_rebuild=full_rebuild,
+        changed_uuids=sorted(set(pending) | dirty_images),
+        full_rebuild=not can_build_incrementally(),
     )
 
     with db.transaction() as conn:
-        conn.execute(
-            "UPDATE images SET status='published', updated_at=CURRENT_TIMESTAMP WHERE status='processed'"
+        conn.executemany(
+            "UPDATE images SET status='published', updated_at=CURRENT_TIMESTAMP WHERE uuid=? AND status='processed'",
+            [(uuid,) for uuid in pending],
         )
         conn.executemany(
             "INSERT INTO jobs (image_uuid, stage, status, message) VALUES (?, ?, ?, ?)",
             [(uuid, "publish", "done", "published to www") for uuid in pending],
         )
         conn.execute(
-            "INSERT INTO builds (build_id, status, staging_path, published_at, created_at, updated_at) VALUES (?, 'published', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
-            (f"build_{int(time.time())}", str(staging_dir)),
+            "INSERT INTO builds (build_id, status, staging_path, generation, image_count, published_at, created_at, updated_at) VALUES (?, 'published', ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            (generation.name, str(config.WWW_STAGING / generation.name), generation.name, len(pending)),
         )
     write_status_snapshot()
     return True
@@ -270,7 +606,9 @@ def read_last_static_mtime() -> float:
 
 def write_last_static_mtime(ts: float) -> None:
     config.LAST_STATIC_MTIME.parent.mkdir(parents=True, exist_ok=True)
-    config.LAST_STATIC_MTIME.write_text(str(ts), encoding="utf-8")
+    tmp_path = config.LAST_STATIC_MTIME.with_suffix(".tmp")
+    tmp_path.write_text(str(ts), encoding="utf-8")
+    tmp_path.replace(config.LAST_STATIC_MTIME)
 
 
 def clear_force_flag() -> None:
@@ -384,12 +722,13 @@ def collect_status_metrics() -> dict:
     paused = config.UPLOAD_PAUSE_FLAG.exists()
     statuses: dict = {"total": 0, "processed": 0, "published": 0, "quarantined": 0}
     last_build = {}
+    db.ensure_schema()
     with db.connect() as conn:
         for row in conn.execute("SELECT status, COUNT(*) AS c FROM images GROUP BY status"):
             statuses[row["status"]] = row["c"]
             statuses["total"] += row["c"]
         build = conn.execute(
-            "SELECT build_id, published_at FROM builds ORDER BY published_at DESC LIMIT 1"
+            "SELECT build_id, image_count, generation, published_at FROM builds ORDER BY published_at DESC, id DESC LIMIT 1"
         ).fetchone()
         if build:
             published_at = build["published_at"]
@@ -401,7 +740,18 @@ def collect_status_metrics() -> dict:
                 published_local = dt.astimezone(tz).isoformat()
             except Exception:
                 published_local = published_at or ""
-            last_build = {"id": build["build_id"], "published_at": published_at, "published_at_local": published_local}
+            last_build = {
+                "id": build["build_id"],
+                "image_count": build["image_count"],
+                "generation": build["generation"],
+                "live_generation": static_site.live_site_dir().name,
+                "published_at": published_at,
+                "published_at_local": published_local,
+            }
+            build_manifest = static_site.load_build_manifest(config.WWW_DIR)
+            if build_manifest:
+                last_build["outputs"] = build_manifest.get("stats")
+                last_build["clone"] = build_manifest.get("clone")
 
     raw_files = len([p for p in config.RAW_DIR.glob("*") if p.is_file()])
     thumb_files = len([p for p in config.THUMB_DIR.glob("*") if p.is_file()])
@@ -468,6 +818,24 @@ def collect_status_metrics() -> dict:
     return metrics
 
 
+def _trim_status_history(history: list, generated_at: str) -> list:
+    """
+    只保留 STATUS_HISTORY_SECONDS 内的快照（按 generated_at），再按 STATUS_HISTORY_MAX 截断。
+    快照随 worker 唤醒写入，间隔不固定，按条数裁剪会让曲线覆盖的时间跨度随唤醒频率变化。
+    """
+    cutoff = datetime.datetime.fromisoformat(generated_at) - datetime.timedelta(seconds=config.STATUS_HISTORY_SECONDS)
+    kept = []
+    for item in history:
+        try:
+            ts = datetime.datetime.fromisoformat(item["generated_at"])
+        except (TypeError, KeyError, ValueError):
+            continue
+        if ts.tzinfo is None or ts < cutoff:
+            continue
+        kept.append(item)
+    return kept[-max(1, config.STATUS_HISTORY_MAX):]
+
+
 def write_status_snapshot() -> None:
     """
     写入静态探针文件，供 /status.html 读取。
@@ -494,7 +862,7 @@ def write_status_snapshot() -> None:
     except Exception:
         history = []
     history.append(metrics)
-    history = history[-120:]  # 保留最近 120 条
+    history = _trim_status_history(history, metrics["generated_at"])
     tmp_hist = persist_dir / "status_history.json.tmp"
     tmp_hist.write_text(json.dumps(history, ensure_ascii=False), encoding="utf-8")
     os.replace(tmp_hist, history_path)
@@ -518,9 +886,12 @@ def write_status_snapshot() -> None:
     for name in ["status.json", "status_history.json"]:
         src = persist_dir / name
         dst = target_dir / name
+        tmp_dst = dst.with_suffix(".json.tmp")
         try:
-            shutil.copy2(src, dst)
-            os.chmod(dst, 0o644)
+            # 线上文件可能与构建中的 staging 共享 inode，替换而不是原地覆盖
+            shutil.copy2(src, tmp_dst)
+            os.chmod(tmp_dst, 0o644)
+            os.replace(tmp_dst, dst)
         except PermissionError:
             sync_failed = True
         except Exception:
@@ -533,19 +904,37 @@ def write_status_snapshot() -> None:
             pass
 
 
-def ensure_static_up_to_date() -> bool:
+def refresh_search_index() -> bool:
+    """
+    标签/分区配置变化后在后台重写搜索索引的展开标签与 image_collections，公开搜索请求本身从不写库。
+    返回是否重写了搜索索引。
     """
-    即使没有新图片，只要前端源码变更或存在强制标记，就重建并发布。
+    db.ensure_schema()
+    with db.transaction() as conn:
+        static_site.sync_collection_table(conn)
+        return fulltext.refresh(conn)
+
+
+def ensure_static_up_to_date(check_static: bool = True) -> bool:
+    """
+    即使没有新图片，只要前端源码变更、build_dirty 队列非空或存在强制标记，就重建并发布。
+    check_static=False 时跳过 static 目录扫描（事件模式下确认 static 未变化）。
     返回是否执行了重建。
     """
     force = config.FORCE_REBUILD_FLAG.exists()
+    dirty = db.pending_dirty()
+    if not force and not dirty and not check_static:
+        return False
     current_mtime = latest_static_mtime()
     last_mtime = read_last_static_mtime()
-    need_rebuild = force or current_mtime > last_mtime
+    need_rebuild = force or bool(dirty) or current_mtime > last_mtime
     if not need_rebuild:
         return False
 
-    staging_dir = rebuild_and_publish()
+    rebuild_and_publish(
+        changed_uuids=sorted(dirty.images()),
+        full_rebuild=not can_build_incrementally(),
+    )
     write_last_static_mtime(current_mtime)
     clear_force_flag()
     write_status_snapshot()
@@ -553,33 +942,50 @@ def ensure_static_up_to_date() -> bool:
 
 
 def loop(interval: int = 5) -> None:
+    """
+    主循环。Linux 下默认由 inotify 唤醒（raw 新文件、强制重建标记、static 变更），
+    空闲时阻塞等待，WORKER_IDLE_TIMEOUT 到期做一次周期维护；否则退回 interval 秒轮询。
+    新图入库后由 PublishScheduler 合并，到期才发布，连续上传只构建一次。
+    """
     static_site.ensure_www_readable()
     last_perm_fix = time.time()
-    while True:
-        ensure_dirs()
-        now = time.time()
-        if now - last_perm_fix >= 60:
-            static_site.ensure_www_readable()
-            last_perm_fix = now
-
-        processed_any = False
+    ensure_dirs()
+    static_site.start_generation_reaper()
+    watcher = watcher_mod.create_watcher()
+    idle_timeout = config.WORKER_IDLE_TIMEOUT if watcher.event_driven else interval
+    static_dirty = True
+    scheduler = PublishScheduler()
+    try:
         while True:
-            path = next_raw_file()
-            if not path:
-                break
-            ok = process_file(path)
-            processed_any = processed_any or ok
-
-        if publish_ready_images():
-            static_site.ensure_www_readable()
-            last_perm_fix = time.time()
-            continue
-
-        ensure_static_up_to_date()
+            ensure_dirs()
+            now = time.time()
+            if now - last_perm_fix >= config.PERMISSION_AUDIT_INTERVAL:
+                static_site.audit_www_permissions()
+                last_perm_fix = now
+
+            capacity = scheduler.remaining_capacity()
+            processed_any = drain_raw_queue(limit=capacity)
+            # deferred 图片同样计入批次上限，批次已满时等发布后再处理
+            if not processed_any and capacity != 0:
+                processed_any = process_deferred_file()
+
+            scheduler.observe(pending_publish_count())
+            if scheduler.due() and publish_ready_images():
+                scheduler.reset()
+                continue
 
-        write_status_snapshot()
-        if not processed_any:
-            time.sleep(interval)
+            refresh_search_index()
+            ensure_static_up_to_date(check_static=static_dirty or not watcher.event_driven)
+            static_dirty = False
+
+            write_status_snapshot()
+            if not processed_any:
+                publish_wait = scheduler.seconds_until_due()
+                timeout = idle_timeout if publish_wait is None else min(idle_timeout, publish_wait)
+                events = watcher.wait(timeout)
+                static_dirty = watcher_mod.STATIC in events
+    finally:
+        watcher.close()
 
 
 def main():
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(os.environ.get("GALLERY_ROOT", "/opt/PotatoGallery"))
+sys.path.insert(0, str(ROOT))
+
+from app import config  # noqa: E402
+from app import static_site  # noqa: E402
+from app import worker  # noqa: E402
+
+
+def _build(images) -> dict:
+    started = time.perf_counter()
+    staging = static_site.build_site(images, full_rebuild=True)
+    total = time.perf_counter() - started
+    stats = static_site.load_build_manifest(staging).get("stats", {})
+    shutil.rmtree(staging, ignore_errors=True)
+    result = dict(stats.get("templates") or {})
+    result["pages"] = stats.get("rendered", 0)
+    result["total_seconds"] = round(total, 4)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report template compile vs render time per full build (nothing is published)")
+    parser.add_argument("--runs", type=int, default=3, help="Builds with a warm in-memory environment")
+    args = parser.parse_args()
+
+    images = worker.images_for_site()
+    report = {"images": len(images)}
+
+    shutil.rmtree(config.TEMPLATE_CACHE_DIR, ignore_errors=True)
+    static_site._template_cache = static_site._TemplateCache()
+    report["cold"] = _build(images)
+
+    # 模拟一次性命令行进程：内存中的环境是新的，只有字节码缓存可用
+    static_site._template_cache = static_site._TemplateCache()
+    report["bytecode_cache"] = _build(images)
+
+    report["warm"] = [_build(images) for _ in range(max(0, args.runs))]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -19,24 +19,25 @@ if id "$RUN_AS" >/dev/null 2>&1 && command -v runuser >/dev/null 2>&1; then
   runuser -u "$RUN_AS" -- "$PYTHON" - <<'PY'
 from app import worker, storage
 storage.ensure_dirs()
-staging = worker.rebuild_and_publish()
+generation = worker.rebuild_and_publish()
 worker.write_status_snapshot()
-print(f"rebuild published from {staging}")
+print(f"rebuild published as generation {generation.name}")
 print("status files:", (worker.config.WWW_DIR / "status.html"), (worker.config.WWW_DIR / "status" / "index.html"), (worker.config.WWW_DIR / "static" / "status.json"))
 PY
 else
   "$PYTHON" - <<'PY'
 from app import worker, storage
 storage.ensure_dirs()
-staging = worker.rebuild_and_publish()
+generation = worker.rebuild_and_publish()
 worker.write_status_snapshot()
-print(f"rebuild published from {staging}")
+print(f"rebuild published as generation {generation.name}")
 print("status files:", (worker.config.WWW_DIR / "status.html"), (worker.config.WWW_DIR / "status" / "index.html"), (worker.config.WWW_DIR / "static" / "status.json"))
 PY
 fi
 
 if command -v chown >/dev/null 2>&1; then
-  chown -R gallery:www-data "$GALLERY_ROOT/storage/www" || true
+  chown -h gallery:www-data "$GALLERY_ROOT/storage/www" || true
+  chown -R gallery:www-data "$GALLERY_ROOT/storage/generations" || true
 fi
 
 if command -v systemctl >/dev/null 2>&1; then
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(os.environ.get("GALLERY_ROOT", "/opt/PotatoGallery"))
+sys.path.insert(0, str(ROOT))
+
+from app import db  # noqa: E402
+from app import static_site  # noqa: E402
+
+
+def cmd_list() -> int:
+    current = static_site.live_site_dir()
+    rows = [
+        {"generation": path.name, "current": path.resolve() == current}
+        for path in static_site.list_generations()
+    ]
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_rollback(target: str, steps: int) -> int:
+    try:
+        chosen = static_site.rollback(target or None, steps=steps)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 1
+    db.ensure_schema()
+    with db.transaction() as conn:
+        conn.execute(
+            "INSERT INTO builds (build_id, status, staging_path, generation, published_at, created_at, updated_at) VALUES (?, 'published', ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            (f"rollback_{chosen.name}_{os.getpid()}", str(chosen), chosen.name),
+        )
+    print(json.dumps({"rolled_back_to": chosen.name}, ensure_ascii=False))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Switch www back to a retained publish generation")
+    parser.add_argument("generation", nargs="?", default="", help="Generation name (default: previous one)")
+    parser.add_argument("--steps", type=int, default=1, help="How many generations to go back")
+    parser.add_argument("--list", action="store_true", help="List retained generations")
+    args = parser.parse_args()
+
+    if args.list:
+        return cmd_list()
+    return cmd_rollback(args.generation, args.steps)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
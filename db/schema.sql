@@ -17,6 +17,7 @@ CREATE TABLE IF NOT EXISTS images (
     thumb_path TEXT,                 -- thumb 目录下的相对路径
     thumb_width INTEGER,
     thumb_height INTEGER,
+    thumb_renditions TEXT,           -- JSON 数组：多尺寸/多格式缩略图 [{file,width,height,format}]
     dominant_color TEXT,             -- #RRGGBB
     title_override TEXT,
     description TEXT,
@@ -32,7 +33,15 @@ CREATE TABLE IF NOT EXISTS images (
 
 CREATE INDEX IF NOT EXISTS idx_images_status ON images(status);
 CREATE INDEX IF NOT EXISTS idx_images_created_at ON images(created_at);
-CREATE INDEX IF NOT EXISTS idx_images_deleted_at ON images(deleted_at);
+-- 列表接口：未删除作品按时间倒序（可按上传者、状态过滤）
+CREATE INDEX IF NOT EXISTS idx_images_live_created ON images(created_at) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_images_trash_created ON images(created_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_images_owner_live_created ON images(owner_user_id, created_at) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_images_site_created ON images(created_at)
+    WHERE status IN ('processed','published') AND deleted_at IS NULL;
+-- 全文索引 images_fts（FTS5 trigram）依赖 SQLite 的 FTS5 扩展，由 app/db.py 的 ensure_schema 按需创建；
+-- 标题/描述/原文件名由触发器增量同步，tags 列（展开后的标签）由 app/fulltext.py 维护。
+-- 后台文本过滤与公开搜索 /api/search 共用这张表；不可用时文本过滤退回 LIKE
 
 
 -- 相册表
@@ -77,11 +86,22 @@ CREATE TABLE IF NOT EXISTS builds (
     build_id TEXT NOT NULL UNIQUE,
     status TEXT NOT NULL CHECK (status IN ('pending','building','ready','published','failed')),
     staging_path TEXT NOT NULL,
+    image_count INTEGER,             -- 本次发布合并的新图片数
+    generation TEXT,                 -- 发布代目录名（storage/generations/<generation>），回滚时切回
     published_at DATETIME,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 待重建内容队列：API 修改后写入，worker 增量构建发布后按 id 清理
+CREATE TABLE IF NOT EXISTS build_dirty (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL CHECK (kind IN ('image','tag','collection','site','template')),
+    ref TEXT,                            -- 为空表示该类内容整体变化
+    reason TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
 -- 审计/异常日志
 CREATE TABLE IF NOT EXISTS audit_log (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -154,6 +174,29 @@ CREATE TABLE IF NOT EXISTS upload_requests (
 
 CREATE INDEX IF NOT EXISTS idx_upload_requests_owner ON upload_requests(owner_user_id);
 
+-- 规范化的作品标签（与 images.tags_json 双写，position 保持原顺序）
+CREATE TABLE IF NOT EXISTS image_tags (
+    image_uuid TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (image_uuid, tag),
+    FOREIGN KEY (image_uuid) REFERENCES images(uuid) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_tags_tag ON image_tags(tag, image_uuid);
+
+-- collections.json 中 uuid → 分区映射的物化副本（由程序按配置摘要重写，不加外键）
+CREATE TABLE IF NOT EXISTS image_collections (
+    uuid TEXT PRIMARY KEY,
+    collection TEXT NOT NULL
+);
+
+-- 物化数据的同步状态：已写入 image_collections 的配置摘要、images_fts 标签列的标签配置签名
+CREATE TABLE IF NOT EXISTS search_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
 -- 用户收藏（个人点赞）
 CREATE TABLE IF NOT EXISTS user_favorites (
     user_id INTEGER NOT NULL,
@@ -194,3 +237,4 @@ CREATE TABLE IF NOT EXISTS user_gallery_images (
 );
 
 CREATE INDEX IF NOT EXISTS idx_user_gallery_images_gallery ON user_gallery_images(gallery_id);
+CREATE INDEX IF NOT EXISTS idx_user_gallery_images_order ON user_gallery_images(gallery_id, position, created_at);
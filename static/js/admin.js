@@ -107,6 +107,7 @@
   const trashBtn = document.querySelector("[data-admin-toggle-trash]");
   const queryInput = document.querySelector("[data-admin-query]");
   const collectionFilter = document.querySelector("[data-admin-collection-filter]");
+  const orientationFilter = document.querySelector("[data-admin-orientation-filter]");
   const collectionList = document.querySelector("[data-admin-collection-list]");
   const addCollectionBtn = document.querySelector("[data-admin-add-collection]");
   const saveCollectionsBtn = document.querySelector("[data-admin-save-collections]");
@@ -347,8 +348,9 @@
     });
   }
 
-  function renderImages(list) {
+  function renderImages(list, append) {
     if (!grid) return;
+    if (append && !list.length) return;
     if (!list.length) {
       grid.innerHTML = "";
       if (empty) empty.classList.add("show");
@@ -382,7 +384,7 @@
       (collections || []).map((item) => [item.slug, item.title || item.slug])
     );
 
-    grid.innerHTML = list
+    const html = list
       .map((img) => {
         const titleText = img.title || "未命名作品";
         const descriptionText = img.description || "";
@@ -482,10 +484,23 @@
       })
       .join("");
 
-    initTagSuggest(grid);
-    initTagEditors(grid);
+    let cards;
+    if (append) {
+      const holder = document.createElement("div");
+      holder.innerHTML = html;
+      cards = Array.from(holder.children);
+      cards.forEach((card) => grid.appendChild(card));
+    } else {
+      grid.innerHTML = html;
+      cards = Array.from(grid.querySelectorAll("[data-admin-uuid]"));
+    }
 
-    grid.querySelectorAll("[data-admin-uuid]").forEach((card) => {
+    cards.forEach((card) => {
+      initTagSuggest(card);
+      initTagEditors(card);
+    });
+
+    cards.forEach((card) => {
       const uuid = card.dataset.adminUuid;
       const img = list.find((item) => item.uuid === uuid);
       const select = card.querySelector("[data-field='collection']");
@@ -538,33 +553,63 @@
     window.GalleryTagSuggest.initTagInputs(inputs);
   }
 
-  function applyFilters() {
-    const term = (queryInput && queryInput.value.trim().toLowerCase()) || "";
+  // 筛选在服务端完成：搜索框里 # 开头的词按标签过滤，其余词匹配标题 / 描述；
+  // 作品按 (时间, id) 游标分页，滚动到底部附近时加载下一页
+  function imagesUrl() {
+    const params = new URLSearchParams({ status: showTrash ? "trash" : "active" });
     const collection = collectionFilter ? collectionFilter.value : "all";
-    const filtered = images.filter((img) => {
-      if (collection !== "all" && img.collection !== collection) return false;
-      if (!term) return true;
-      const hay = `${img.title || ""} ${img.description || ""}`.toLowerCase();
-      const tags = (img.tags || []).map((t) => String(t).toLowerCase());
-      if (term.startsWith("#")) {
-        const tagTerm = term.slice(1);
-        return tags.some((t) => t.includes(tagTerm));
+    if (collection && collection !== "all") params.set("collection", collection);
+    const orientation = orientationFilter ? orientationFilter.value : "all";
+    if (orientation && orientation !== "all") params.set("orientation", orientation);
+    const words = [];
+    ((queryInput && queryInput.value.trim()) || "").split(/\s+/).forEach((word) => {
+      if (!word) return;
+      if (word.startsWith("#")) {
+        if (word.length > 1) params.append("tag", word.slice(1));
+        return;
       }
-      return hay.includes(term) || tags.some((t) => t.includes(term));
+      words.push(word);
     });
-    renderImages(filtered);
+    if (words.length) params.set("q", words.join(" "));
+    return `/upload/admin/images?${params.toString()}`;
   }
 
-  async function loadImages() {
-    const data = await fetchJSON(`/upload/admin/images?status=${showTrash ? "trash" : "active"}`);
-    images = data.images || [];
+  function onImagesPage(data, isFirst) {
+    const page = data.images || [];
+    if (!isFirst) {
+      images = images.concat(page);
+      renderImages(page, true);
+      return;
+    }
+    images = page;
     collections = data.collections || [];
     defaultCollection = data.default_collection || "";
+    const selectedCollection = collectionFilter ? collectionFilter.value : "";
     renderCollections();
     renderCollectionFilter();
+    if (collectionFilter && selectedCollection) collectionFilter.value = selectedCollection;
     renderUploadCollections();
     bindCollectionActions();
-    applyFilters();
+    renderImages(images);
+  }
+
+  let imagesLoader = null;
+
+  function loadImages() {
+    if (!imagesLoader) {
+      if (window.GalleryPagedLoader) {
+        imagesLoader = window.GalleryPagedLoader.create({
+          anchor: grid,
+          fetchPage: (cursor) => fetchJSON(window.GalleryPagedLoader.withCursor(imagesUrl(), cursor)),
+          onPage: onImagesPage,
+        });
+      } else {
+        imagesLoader = {
+          reset: async () => onImagesPage(await fetchJSON(imagesUrl()), true),
+        };
+      }
+    }
+    return imagesLoader.reset();
   }
 
   async function loadAuthConfig() {
@@ -651,11 +696,19 @@
     }
 
     if (queryInput) {
-      queryInput.addEventListener("input", applyFilters);
+      let queryTimer = null;
+      queryInput.addEventListener("input", () => {
+        if (queryTimer) window.clearTimeout(queryTimer);
+        queryTimer = window.setTimeout(() => loadImages(), 250);
+      });
     }
 
     if (collectionFilter) {
-      collectionFilter.addEventListener("change", applyFilters);
+      collectionFilter.addEventListener("change", () => loadImages());
+    }
+
+    if (orientationFilter) {
+      orientationFilter.addEventListener("change", () => loadImages());
     }
 
     if (addCollectionBtn) {
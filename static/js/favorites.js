@@ -408,6 +408,17 @@
     return data;
   }
 
+  // 筛选面板需要完整的收藏列表：首屏渲染后在后台按游标继续拉取剩余分页
+  async function loadRemaining(cursor) {
+    while (cursor) {
+      const data = await fetchJSON(`/api/favorites?cursor=${encodeURIComponent(cursor)}`);
+      images = images.concat(data.images || []);
+      cursor = data.next_cursor || "";
+      buildFacets();
+      applyFilters();
+    }
+  }
+
   async function init() {
     try {
       await fetchJSON("/auth/me");
@@ -427,7 +438,8 @@
       ]);
       images = favData.images || [];
       tagIndex = buildTagIndex(tagData);
-      if (totalStat) totalStat.textContent = String(images.length);
+      const total = favData.total != null ? favData.total : images.length;
+      if (totalStat) totalStat.textContent = String(total);
       if (countChip) countChip.textContent = String(images.length);
       buildFacets();
       const urlQ = new URLSearchParams(window.location.search).get("q") || "";
@@ -439,6 +451,7 @@
       } else if (empty) {
         empty.classList.add("show");
       }
+      loadRemaining(favData.next_cursor);
     } catch (err) {
       if (empty) empty.classList.add("show");
     }
@@ -17,6 +17,10 @@
     tag: "",
     tagSlugMap: null,
     tagIndex: null,
+    complete: true,
+    postings: null,
+    candidates: null,
+    loadedIds: new Set(),
   };
 
   const expandedTagsCache = new Map();
@@ -520,7 +524,61 @@
     grid.classList.add("masonry-ready");
   }
 
-  function applyFilters(data) {
+  // 与 static_site.text_bigrams 一致：小写、按码点切分、跳过含空白的组合
+  function termBigrams(term) {
+    const chars = Array.from(String(term || "").toLowerCase());
+    const grams = [];
+    for (let i = 0; i < chars.length - 1; i += 1) {
+      if (/\s/.test(chars[i]) || /\s/.test(chars[i + 1])) continue;
+      grams.push(chars[i] + chars[i + 1]);
+    }
+    return grams;
+  }
+
+  // 倒排索引按分片存放，各片分别差分编码，解码后合并
+  function postingSet(group, key) {
+    const postings = state.postings;
+    const cacheKey = `${group}:${key}`;
+    if (postings.decoded.has(cacheKey)) return postings.decoded.get(cacheKey);
+    const ids = new Set();
+    postings.parts.forEach((part) => {
+      let current = 0;
+      ((part[group] || {})[key] || []).forEach((delta) => {
+        current += delta;
+        ids.add(current);
+      });
+    });
+    postings.decoded.set(cacheKey, ids);
+    return ids;
+  }
+
+  // 用倒排索引求候选 id 集合（标签精确、文本为超集）；无可用条件时返回 null 表示不限制
+  function candidateIds(includeTags, textTerms) {
+    if (!state.postings) return null;
+    const sets = includeTags.map((tag) => postingSet("tags", tag));
+    textTerms.forEach((term) => {
+      termBigrams(term).forEach((gram) => sets.push(postingSet("terms", gram)));
+    });
+    if (!sets.length) return null;
+    sets.sort((a, b) => a.size - b.size);
+    const [smallest, ...rest] = sets;
+    const result = new Set();
+    smallest.forEach((id) => {
+      if (rest.every((set) => set.has(id))) result.add(id);
+    });
+    return result;
+  }
+
+  function candidatesLoaded() {
+    if (!state.candidates) return false;
+    for (const id of state.candidates) {
+      if (!state.loadedIds.has(id)) return false;
+    }
+    return true;
+  }
+
+  // remote 为服务端检索时：文本词与标签已由接口匹配（含别名、祖先标签与原文件名），本地只做其余筛选
+  function applyFilters(data, remote) {
     const query = parseQuery(state.q, state.tagIndex);
     const filters = query.filters;
     const now = new Date();
@@ -556,7 +614,11 @@
       }
     }
 
+    const candidates = remote ? null : candidateIds(includeTags, textTerms);
+    state.candidates = candidates;
+
     const filtered = data.filter((img) => {
+      if (candidates && !candidates.has(img.image_id)) return false;
       const matchCollection =
         effectiveCollection === "all" ||
         String(img.collection || "").toLowerCase() === effectiveCollection;
@@ -613,7 +675,7 @@
         return expanded;
       })();
 
-      if (includeTags.length) {
+      if (includeTags.length && !remote) {
         const hasAll = includeTags.every((tag) => expandedTags.has(tag));
         if (!hasAll) return false;
       }
@@ -624,7 +686,7 @@
 
       if (textTerms.length || textExclude.length) {
         const hay = `${img.title || ""} ${img.description || ""} ${(img.tags || []).join(" ")}`.toLowerCase();
-        if (textTerms.some((term) => term && !hay.includes(term))) return false;
+        if (!remote && textTerms.some((term) => term && !hay.includes(term))) return false;
         if (textExclude.some((term) => term && hay.includes(term))) return false;
       }
 
@@ -661,10 +723,118 @@
 
     renderCards(result, state.tagSlugMap);
     if (empty) {
-      empty.classList.toggle("show", result.length === 0);
+      const settled = remote ? remote.done() : state.complete || candidatesLoaded();
+      empty.classList.toggle("show", result.length === 0 && settled);
     }
   }
 
+  function hasActiveFilter() {
+    return Boolean(
+      state.q.trim() ||
+        state.tag ||
+        state.collection !== "all" ||
+        state.orientation !== "all" ||
+        state.size !== "all" ||
+        state.time !== "all"
+    );
+  }
+
+  function fetchJson(url, options) {
+    return fetch(url, options).then((resp) => {
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      return resp.json();
+    });
+  }
+
+  // 分片按新到旧排列，文件名带内容哈希，走浏览器默认缓存；清单本身每次重新获取
+  function createChunkLoader(chunks) {
+    let next = 0;
+    let pending = null;
+    return {
+      done() {
+        return next >= chunks.length;
+      },
+      loadNext() {
+        if (pending) return pending;
+        if (next >= chunks.length) return Promise.resolve([]);
+        pending = fetchJson(`/static/data/${chunks[next].path}`)
+          .then((payload) => {
+            next += 1;
+            pending = null;
+            return payload.images || [];
+          })
+          .catch((err) => {
+            pending = null;
+            throw err;
+          });
+        return pending;
+      },
+    };
+  }
+
+  // 服务端检索：文本词、标签、分区与方向交给 /api/search，结果按页累积；条件不变时复用已取回的结果
+  function createRemoteSearch(path) {
+    const items = [];
+    let key = null;
+    let cursor = null;
+    let generation = 0;
+    let pending = null;
+
+    function params() {
+      const query = parseQuery(state.q, state.tagIndex);
+      const search = new URLSearchParams();
+      if (query.textTerms.length) search.set("q", query.textTerms.join(" "));
+      const tags = query.includeTags.slice();
+      if (state.tag) tags.push(resolveTag(normalizeTagName(state.tag), state.tagIndex));
+      tags.filter(Boolean).forEach((tag) => search.append("tag", tag));
+      const collection = query.filters.collection || state.collection;
+      if (collection !== "all") search.set("collection", collection);
+      const orientation = query.filters.orientation || state.orientation;
+      if (orientation !== "all") search.set("orientation", orientation);
+      return search;
+    }
+
+    function fetchPage(search) {
+      const current = generation;
+      if (cursor) search.set("cursor", cursor);
+      pending = fetchJson(`${path}?${search.toString()}`)
+        .then((payload) => {
+          if (current !== generation) return false;
+          pending = null;
+          (payload.images || []).forEach((item) => items.push(item));
+          cursor = payload.next_cursor || null;
+          return true;
+        })
+        .catch((err) => {
+          if (current === generation) pending = null;
+          throw err;
+        });
+      return pending;
+    }
+
+    return {
+      items,
+      done() {
+        return !cursor && !pending;
+      },
+      // 返回 Promise<boolean>：false 表示这次结果已被更新的条件取代，不必渲染
+      refresh() {
+        const search = params();
+        const nextKey = search.toString();
+        if (nextKey === key) return pending ? pending.then(() => true) : Promise.resolve(true);
+        key = nextKey;
+        generation += 1;
+        cursor = null;
+        items.length = 0;
+        return fetchPage(search);
+      },
+      loadNext() {
+        if (pending || !cursor) return Promise.resolve(false);
+        return fetchPage(params());
+      },
+    };
+  }
+
   function debounce(fn, delay) {
     let timer;
     return function (...args) {
@@ -673,15 +843,106 @@
     };
   }
 
-  function init(data, tagSlugMap, tagIndex) {
+  function init(data, tagSlugMap, tagIndex, loader, postingsPaths, searchApi) {
     const query = new URLSearchParams(window.location.search).get("q") || "";
     setQuery(query);
 
     state.tagSlugMap = tagSlugMap;
     state.tagIndex = tagIndex;
+    state.complete = !loader || loader.done();
     expandedTagsCache.clear();
     dateCache.clear();
-    const apply = () => applyFilters(data);
+    data.forEach((img) => state.loadedIds.add(img.image_id));
+    let nearEnd = false;
+    let postingsRequested = !postingsPaths.length;
+    let apply = () => applyFilters(data);
+    // 有筛选条件时需要完整数据，逐片补齐；否则只在滚动到底部附近时加载下一片
+    // 倒排索引只在第一次出现筛选条件时获取（各分片一份，文件名带内容哈希可长期缓存）；
+    // 候选作品都已加载时不再拉取后续分片
+    const loadPostings = () => {
+      if (postingsRequested || !hasActiveFilter()) return;
+      postingsRequested = true;
+      Promise.all(postingsPaths.map((path) => fetchJson(`/static/data/${path}`)))
+        .then((parts) => {
+          state.postings = { parts, decoded: new Map() };
+          apply();
+        })
+        .catch(() => {});
+    };
+    const loadMore = () => {
+      loadPostings();
+      if (state.complete || !(nearEnd || hasActiveFilter())) return;
+      if (!nearEnd && candidatesLoaded()) return;
+      loader
+        .loadNext()
+        .then((items) => {
+          items.forEach((item) => {
+            data.push(item);
+            state.loadedIds.add(item.image_id);
+          });
+          state.complete = loader.done();
+          apply();
+        })
+        .catch(() => {
+          state.complete = true;
+          applyFilters(data);
+        });
+    };
+    let remote = searchApi ? createRemoteSearch(searchApi) : null;
+    // 接口不可用（未启用或请求失败）时退回静态索引
+    const remoteFailed = () => {
+      remote = null;
+      apply();
+    };
+    const loadMoreRemote = () => {
+      if (!nearEnd || remote.done()) return;
+      remote
+        .loadNext()
+        .then((fresh) => {
+          if (!fresh || !remote) return;
+          applyFilters(remote.items, remote);
+          loadMoreRemote();
+        })
+        .catch(remoteFailed);
+    };
+    const applyRemote = () => {
+      remote
+        .refresh()
+        .then((fresh) => {
+          if (!fresh || !remote) return;
+          applyFilters(remote.items, remote);
+          loadMoreRemote();
+        })
+        .catch(remoteFailed);
+    };
+    if (loader) {
+      apply = () => {
+        if (remote && hasActiveFilter()) {
+          applyRemote();
+          return;
+        }
+        applyFilters(data);
+        loadMore();
+      };
+      const sentinel = document.createElement("div");
+      sentinel.setAttribute("aria-hidden", "true");
+      grid.insertAdjacentElement("afterend", sentinel);
+      if ("IntersectionObserver" in window) {
+        new IntersectionObserver(
+          (entries) => {
+            nearEnd = entries.some((entry) => entry.isIntersecting);
+            if (remote && hasActiveFilter()) {
+              loadMoreRemote();
+              return;
+            }
+            loadMore();
+          },
+          { rootMargin: "800px 0px" }
+        ).observe(sentinel);
+      } else {
+        nearEnd = true;
+      }
+    }
     const debounced = debounce(apply, 120);
 
     inputs.forEach((input) => {
@@ -730,18 +991,38 @@
       .catch(() => null);
   }
 
-  Promise.all([
-    fetch("/static/data/search_index.json", { cache: "no-store" }).then((resp) => resp.json()),
-    loadTagIndexData(),
-  ])
-    .then(([payload, tagIndex]) => {
+  // 分片清单可用时先只取最新一片，其余按需加载；旧格式或清单缺失时回退到完整索引
+  function loadSearchData() {
+    return fetchJson("/static/data/search_manifest.json", { cache: "no-store" })
+      .then((manifest) => {
+        if (!manifest.chunked) throw new Error("search index is not chunked");
+        const loader = createChunkLoader(manifest.chunks || []);
+        return loader.loadNext().then((images) => ({ payload: { ...manifest, images }, loader }));
+      })
+      .catch(() =>
+        fetchJson("/static/data/search_index.json", { cache: "no-store" }).then((payload) => ({
+          payload,
+          loader: null,
+        }))
+      );
+  }
+
+  Promise.all([loadSearchData(), loadTagIndexData()])
+    .then(([{ payload, loader }, tagIndex]) => {
       const data = payload.images || [];
       const tagSlugMap = new Map(
         (payload.tags || []).map((item) => [String(item.tag), item.slug])
       );
       const resolvedTagIndex =
         tagIndex || buildFallbackTagIndex((payload.tags || []).map((item) => item.tag));
-      init(data, tagSlugMap, resolvedTagIndex);
+      init(
+        data,
+        tagSlugMap,
+        resolvedTagIndex,
+        loader,
+        loader ? (payload.chunks || []).map((chunk) => chunk.postings).filter(Boolean) : [],
+        loader ? payload.search_api || "" : ""
+      );
     })
     .catch(() => {
       if (empty) empty.classList.add("show");
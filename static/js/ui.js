@@ -212,6 +212,78 @@
 
   window.GalleryMasonry = { init: initMasonry };
 
+  // 列表接口的游标分页：哨兵元素进入视口附近时加载下一页，直到 next_cursor 为空
+  function createPagedLoader(options) {
+    const { anchor, fetchPage, onPage } = options;
+    let cursor = null;
+    let done = false;
+    let busy = false;
+    let first = true;
+    let nearEnd = false;
+    let generation = 0;
+    const sentinel = document.createElement('div');
+    sentinel.setAttribute('aria-hidden', 'true');
+    sentinel.dataset.pagedSentinel = '';
+    if (anchor) anchor.insertAdjacentElement('afterend', sentinel);
+
+    async function loadNext() {
+      if (busy || done) return;
+      busy = true;
+      const token = generation;
+      let data = null;
+      try {
+        data = await fetchPage(cursor);
+      } finally {
+        if (token === generation) busy = false;
+      }
+      if (token !== generation) return;
+      cursor = data.next_cursor || null;
+      done = !cursor;
+      const isFirst = first;
+      first = false;
+      onPage(data, isFirst);
+      // 一页不足以填满视口时继续加载
+      if (nearEnd && !done) {
+        window.requestAnimationFrame(() => loadNext().catch(() => {}));
+      }
+    }
+
+    function reset() {
+      generation += 1;
+      cursor = null;
+      done = false;
+      busy = false;
+      first = true;
+      return loadNext();
+    }
+
+    if ('IntersectionObserver' in window) {
+      new IntersectionObserver(
+        (entries) => {
+          nearEnd = entries.some((entry) => entry.isIntersecting);
+          if (nearEnd) loadNext().catch(() => {});
+        },
+        { rootMargin: '800px 0px' }
+      ).observe(sentinel);
+    } else {
+      nearEnd = true;
+    }
+
+    return {
+      reset,
+      loadNext,
+      isDone: () => done,
+    };
+  }
+
+  function withCursor(url, cursor) {
+    if (!cursor) return url;
+    const joiner = url.includes('?') ? '&' : '?';
+    return `${url}${joiner}cursor=${encodeURIComponent(cursor)}`;
+  }
+
+  window.GalleryPagedLoader = { create: createPagedLoader, withCursor };
+
   const leftSidebar = document.querySelector('[data-left-sidebar]');
   const leftToggles = Array.from(document.querySelectorAll('[data-left-toggle]'));
   const sidebarDim = document.querySelector('[data-sidebar-dim]');
@@ -106,11 +106,11 @@
 
     if (loginHint) loginHint.textContent = `已登录：${me.user}`;
 
-    async function loadImages() {
-      const data = await fetchJSON("/api/my/images");
+    function renderPage(data, isFirst) {
       const images = data.images || [];
-      renderCollectionOptions(collectionSelect, data.collections || [], true);
+      if (isFirst) renderCollectionOptions(collectionSelect, data.collections || [], true);
       if (!gallery) return;
+      if (!isFirst && !images.length) return;
       if (!images.length) {
         gallery.innerHTML = "";
         if (empty) empty.classList.add("show");
@@ -122,7 +122,7 @@
         return;
       }
       if (empty) empty.classList.remove("show");
-      gallery.innerHTML = images
+      const html = images
         .map((img) => {
           const tags = (img.tags || []).map((t) => `#${escapeHtml(t)}`).join(" ");
           const detailPath = escapeHtml(resolveDetailPath(img));
@@ -155,8 +155,18 @@
         `;
         })
         .join("");
+      let cards;
+      if (isFirst) {
+        gallery.innerHTML = html;
+        cards = gallery.querySelectorAll("[data-card-link]");
+      } else {
+        const holder = document.createElement("div");
+        holder.innerHTML = html;
+        cards = Array.from(holder.children);
+        cards.forEach((card) => gallery.appendChild(card));
+      }
       if (window.GalleryCardLinks) {
-        window.GalleryCardLinks.init(gallery.querySelectorAll('[data-card-link]'));
+        window.GalleryCardLinks.init(cards);
       }
       if (masonry) {
         masonry.refresh();
@@ -165,6 +175,26 @@
       gallery.classList.add("masonry-ready");
     }
 
+    // 作品列表按游标分页，滚动到底部附近时追加下一页
+    let imagesLoader = null;
+
+    function loadImages() {
+      if (!imagesLoader) {
+        if (window.GalleryPagedLoader && gallery) {
+          imagesLoader = window.GalleryPagedLoader.create({
+            anchor: gallery,
+            fetchPage: (cursor) => fetchJSON(window.GalleryPagedLoader.withCursor("/api/my/images", cursor)),
+            onPage: renderPage,
+          });
+        } else {
+          imagesLoader = {
+            reset: async () => renderPage(await fetchJSON("/api/my/images"), true),
+          };
+        }
+      }
+      return imagesLoader.reset();
+    }
+
     if (form) {
       form.addEventListener("submit", async (event) => {
         event.preventDefault();
@@ -1,6 +1,8 @@
 import json
 from uuid import uuid4
 
+import pytest
+
 from test_pipeline import make_image, seed_test_root, setup_env
 
 
@@ -344,3 +346,315 @@ def test_tag_alias_intro_and_slug(tmp_path):
     assert alias_page.exists()
     alias_html = alias_page.read_text(encoding="utf-8")
     assert "合并至" in alias_html
+
+
+def test_admin_edit_queues_dirty_image_for_incremental_build(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    auth = modules["app.auth"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+
+    storage.ensure_dirs()
+    auth.create_user("admin", "secret", groups=[config.ADMIN_GROUP])
+    uids = [uuid4().hex for _ in range(2)]
+    for uid in uids:
+        make_image(config.RAW_DIR / f"{uid}.png")
+        assert worker.process_file(config.RAW_DIR / f"{uid}.png")
+    assert worker.publish_ready_images()
+    assert not worker.ensure_static_up_to_date()
+
+    client = upload_service.create_app().test_client()
+    assert client.post("/upload/admin/login", json={"username": "admin", "password": "secret"}).status_code == 200
+    resp = client.post(
+        f"/upload/admin/images/{uids[0]}/update",
+        json={"title": "改过的标题", "description": "", "tags": "", "collection": ""},
+    )
+    assert resp.status_code == 200
+    assert not config.FORCE_REBUILD_FLAG.exists()
+    assert config.BUILD_DIRTY_SIGNAL.exists()
+    dirty = db.pending_dirty()
+    assert dirty.images() == {uids[0]}
+
+    with db.connect() as conn:
+        ids = {
+            row["uuid"]: row["id"]
+            for row in conn.execute("SELECT uuid, id FROM images").fetchall()
+        }
+    other_detail = config.WWW_DIR / "images" / str(ids[uids[1]]) / "index.html"
+    other_inode = other_detail.stat().st_ino
+
+    assert worker.ensure_static_up_to_date(check_static=False)
+    assert not db.pending_dirty()
+    edited = (config.WWW_DIR / "images" / str(ids[uids[0]]) / "index.html").read_text()
+    assert "改过的标题" in edited
+    assert other_detail.stat().st_ino == other_inode
+    assert not worker.ensure_static_up_to_date(check_static=False)
+
+
+def test_admin_images_filter_by_collection(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    auth = modules["app.auth"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    static_site = modules["app.static_site"]
+    upload_service = modules["app.upload_service"]
+
+    storage.ensure_dirs()
+    auth.create_user("admin", "secret", groups=[config.ADMIN_GROUP])
+    mine, other, overridden = uuid4().hex, uuid4().hex, uuid4().hex
+    for uid in (mine, other, overridden):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+    with db.transaction() as conn:
+        conn.execute("UPDATE images SET collection_override='mine' WHERE uuid=?", (overridden,))
+
+    cfg_path = config.STATIC / "data" / "collections.json"
+    cfg_path.parent.mkdir(parents=True, exist_ok=True)
+    collections_cfg = {
+        "collections": {
+            "mine": {"title": "我的作品", "uuids": [mine]},
+            "favorites": {"title": "他人作品", "uuids": []},
+        },
+        "default_collection": "favorites",
+    }
+    cfg_path.write_text(json.dumps(collections_cfg, ensure_ascii=False), encoding="utf-8")
+    index = static_site.collection_index()
+    assert static_site.collection_index() is index
+    assert index.resolve(mine) == "mine"
+    assert index.resolve(other) == "favorites"
+
+    app = upload_service.create_app()
+    client = app.test_client()
+    resp = client.post("/upload/admin/login", json={"username": "admin", "password": "secret"})
+    assert resp.status_code == 200
+
+    resp = client.get("/upload/admin/images?collection=mine")
+    assert {item["uuid"] for item in resp.get_json()["images"]} == {mine, overridden}
+    resp = client.get("/upload/admin/images?collection=favorites")
+    assert [item["uuid"] for item in resp.get_json()["images"]] == [other]
+
+    # 配置文件替换后索引与物化表一起刷新
+    collections_cfg["collections"]["mine"]["uuids"] = [other]
+    tmp = cfg_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(collections_cfg, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(cfg_path)
+    assert static_site.collection_index() is not index
+    # 同步所在的事务回滚后，下次查询仍会重写物化表
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            static_site.sync_collection_table(conn)
+            raise RuntimeError("rollback")
+    resp = client.get("/upload/admin/images?collection=mine")
+    images = resp.get_json()["images"]
+    assert {item["uuid"] for item in images} == {other, overridden}
+    assert all(item["collection"] == "mine" for item in images)
+
+
+def test_admin_tag_rename_and_delete_are_set_based(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    auth = modules["app.auth"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+
+    storage.ensure_dirs()
+    data_dir = config.STATIC / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    tags_cfg = {"tags": [{"tag": "猫咪", "aliases": ["猫猫"]}, {"tag": "天空"}]}
+    (data_dir / "tags.json").write_text(json.dumps(tags_cfg, ensure_ascii=False), encoding="utf-8")
+    auth.create_user("admin", "secret", groups=[config.ADMIN_GROUP])
+    first, second, third = "c" * 32, "d" * 32, "e" * 32
+    for uid in (first, second, third):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+
+    app = upload_service.create_app()
+    client = app.test_client()
+    resp = client.post("/upload/admin/login", json={"username": "admin", "password": "secret"})
+    assert resp.status_code == 200
+    resp = client.post(f"/upload/admin/images/{first}/update", json={"tags": "#猫咪 #天空"})
+    assert resp.status_code == 200
+    with db.transaction() as conn:
+        # 旧数据里可能同时出现新旧标签，以及别名写法
+        conn.execute("UPDATE images SET tags_json=? WHERE uuid=?", (json.dumps(["天空", "猫", "猫咪"]), second))
+        db.write_image_tags(conn, second, json.dumps(["天空", "猫", "猫咪"]))
+        conn.execute("UPDATE images SET tags_json=? WHERE uuid=?", (json.dumps(["猫猫"]), third))
+        db.write_image_tags(conn, third, json.dumps(["猫猫"]))
+
+    tags = {item["tag"]: item["count"] for item in client.get("/upload/admin/tags").get_json()["tags"]}
+    assert tags == {"猫咪": 3, "天空": 2}
+
+    resp = client.post("/upload/admin/tags/rename", json={"from": "猫咪", "to": "猫"})
+    assert resp.get_json() == {"ok": True, "updated": 2}
+    with db.connect() as conn:
+        rows = dict(conn.execute("SELECT uuid, tags_json FROM images").fetchall())
+    assert json.loads(rows[first]) == ["猫", "天空"]
+    assert json.loads(rows[second]) == ["天空", "猫"]
+    assert json.loads(rows[third]) == ["猫猫"]
+
+    resp = client.post("/upload/admin/tags/delete", json={"tag": "天空"})
+    assert resp.get_json() == {"ok": True, "updated": 2}
+    with db.connect() as conn:
+        rows = dict(conn.execute("SELECT uuid, tags_json FROM images").fetchall())
+        dirty = {row["ref"] for row in conn.execute("SELECT ref FROM build_dirty WHERE kind='image'")}
+    assert json.loads(rows[first]) == ["猫"]
+    assert json.loads(rows[second]) == ["猫"]
+    assert {first, second} <= dirty
+
+
+def test_image_tags_backfilled_on_migration(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    uid = uuid4().hex
+    raw_path = config.RAW_DIR / f"{uid}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+    with db.transaction() as conn:
+        conn.execute("DROP TABLE image_tags")
+        conn.execute("UPDATE images SET tags_json=? WHERE uuid=?", (json.dumps(["B", " a ", "b"]), uid))
+
+    db._SCHEMA_READY = False
+    db.ensure_schema()
+    with db.connect() as conn:
+        rows = conn.execute(
+            "SELECT tag, position FROM image_tags WHERE image_uuid=? ORDER BY position", (uid,)
+        ).fetchall()
+    assert [(row["tag"], row["position"]) for row in rows] == [("b", 0), ("a", 1)]
+
+
+def test_admin_images_server_side_filters(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    auth = modules["app.auth"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+
+    storage.ensure_dirs()
+    data_dir = config.STATIC / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    tags_cfg = {
+        "tags": [{"tag": "动物"}, {"tag": "猫咪", "aliases": ["猫猫"], "parents": ["动物"]}, {"tag": "天空"}]
+    }
+    (data_dir / "tags.json").write_text(json.dumps(tags_cfg, ensure_ascii=False), encoding="utf-8")
+    auth.create_user("admin", "secret", groups=[config.ADMIN_GROUP])
+    auth.create_user("alice", "secret")
+    cat, sky, square = uuid4().hex, uuid4().hex, uuid4().hex
+    for uid in (cat, sky, square):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+    rows = [
+        (cat, "夏日的黑猫咪", "窗台上打盹", ["猫猫"], 800, 1200, "2024-03-01 10:00:00", "alice"),
+        (sky, "Blue Sky", "clouds over the hill", ["天空"], 1600, 900, "2024-03-05 10:00:00", None),
+        (square, "方形头像", "", ["猫咪", "天空"], 500, 500, "2024-04-01 10:00:00", None),
+    ]
+    with db.transaction() as conn:
+        for uid, title, desc, tags, width, height, created_at, owner in rows:
+            conn.execute(
+                """
+                UPDATE images
+                SET title_override=?, description=?, tags_json=?, width=?, height=?, created_at=?,
+                    owner_user_id=(SELECT id FROM auth_users WHERE username=?)
+                WHERE uuid=?
+                """,
+                (title, desc, json.dumps(tags, ensure_ascii=False), width, height, created_at, owner, uid),
+            )
+            db.write_image_tags(conn, uid, json.dumps(tags, ensure_ascii=False))
+
+    app = upload_service.create_app()
+    client = app.test_client()
+    resp = client.post("/upload/admin/login", json={"username": "admin", "password": "secret"})
+    assert resp.status_code == 200
+
+    def uuids(query):
+        resp = client.get(f"/upload/admin/images?{query}")
+        assert resp.status_code == 200, resp.get_json()
+        return [item["uuid"] for item in resp.get_json()["images"]]
+
+    # 别名写法的标签同样命中；多个 tag 取交集
+    assert uuids("tag=猫咪") == [square, cat]
+    assert uuids("tag=猫咪&tag=天空") == [square]
+    # 父标签与 /api/search 口径一致，包含子标签（及其别名）的作品
+    assert uuids("tag=动物") == [square, cat]
+    assert uuids("owner=alice") == [cat]
+    assert uuids("q=黑猫咪") == [cat]
+    assert uuids("q=clouds hill") == [sky]
+    assert uuids("q=猫") == [cat]
+    assert uuids("orientation=portrait") == [cat]
+    assert uuids("orientation=square") == [square]
+    assert uuids("since=2024-03-02&until=2024-03-31") == [sky]
+    assert uuids("until=2024-03-05&orientation=landscape") == [sky]
+    assert client.get("/upload/admin/images?since=03/02").status_code == 400
+
+    # 全文索引随 images 的改动增量更新
+    with db.transaction() as conn:
+        conn.execute("UPDATE images SET title_override='晚霞' WHERE uuid=?", (sky,))
+    assert uuids("q=Blue Sky") == []
+    assert uuids("q=晚霞 clouds") == [sky]
+
+
+def test_tag_registry_is_cached_until_config_changes(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    tagging = modules["app.tagging"]
+
+    data_dir = config.STATIC / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    cfg_path = data_dir / "tags.json"
+    tags_cfg = {
+        "tags": [
+            {"tag": "生物"},
+            {"tag": "动物", "parents": ["生物"]},
+            {"tag": "猫咪", "aliases": ["猫猫"], "parents": ["动物"]},
+        ]
+    }
+    cfg_path.write_text(json.dumps(tags_cfg, ensure_ascii=False), encoding="utf-8")
+
+    registry = tagging.tag_registry()
+    assert tagging.tag_registry() is registry
+    assert registry.alias_map["猫猫"] == "猫咪"
+    assert registry.ancestors["猫咪"] == {"动物", "生物"}
+    assert registry.child_map["动物"] == ["猫咪"]
+    assert registry.missing_parents(["猫咪"]) == ["动物"]
+
+    # 取出的配置是副本，修改不会污染共享快照
+    meta, order = tagging.load_tags_config()
+    meta["猫咪"]["aliases"].append("喵")
+    meta.pop("生物")
+    assert tagging.tag_registry() is registry
+    assert registry.meta["猫咪"]["aliases"] == ["猫猫"] and "生物" in registry.meta
+
+    tagging.save_tags_config(meta, order)
+    saved = tagging.tag_registry()
+    assert saved is not registry
+    assert saved.alias_map["喵"] == "猫咪"
+    assert "生物" not in saved.meta
+
+    # 其他进程改写文件（原子替换）后同样重新加载
+    tags_cfg["tags"].append({"tag": "天空"})
+    tmp = cfg_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(tags_cfg, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(cfg_path)
+    assert "天空" in tagging.tag_registry().meta
@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+
+import pytest
+
+from test_pipeline import seed_test_root, setup_env
+
+
+def test_connections_are_reused_per_thread_and_preconfigured(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+
+    conn = db.connect()
+    assert db.connect() is conn
+    with db.transaction() as tx:
+        assert tx is conn
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == db.config.DB_BUSY_TIMEOUT_MS
+
+    # 调用方 close() 后连接仍可继续使用
+    conn.close()
+    assert db.connect().execute("SELECT 1").fetchone()[0] == 1
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(db.connect()))
+    thread.start()
+    thread.join()
+    assert others[0] is not conn
+
+    # 数据库文件被替换（如从备份恢复）后重新打开
+    db_path = db.DB_PATH
+    db.release_thread_connection()
+    replaced = db_path.with_name("replaced.db")
+    replaced.write_bytes(db_path.read_bytes())
+    old = db.connect()
+    replaced.replace(db_path)
+    assert db.connect() is not old
+
+
+def test_replaced_database_is_migrated_again(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+    worker = modules["app.worker"]
+
+    db.ensure_schema()
+    assert worker.images_for_site() == []
+    # 从不含新索引的备份恢复：images_for_site 指定的部分索引要在新文件上补建
+    with db.connect() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.release_thread_connection()
+    backup = db.DB_PATH.with_name("backup.db")
+    source, target = sqlite3.connect(db.DB_PATH), sqlite3.connect(backup)
+    source.backup(target)
+    source.close()
+    target.execute("PRAGMA journal_mode=DELETE")
+    target.execute("DROP INDEX idx_images_site_created")
+    target.commit()
+    target.close()
+    backup.replace(db.DB_PATH)
+
+    assert worker.images_for_site() == []
+    with db.connect() as conn:
+        names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert "idx_images_site_created" in names
+
+
+def test_nested_transactions_commit_once_at_the_outermost_level(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+    db.ensure_schema()
+
+    def events():
+        with db.connect() as conn:
+            return [row["event"] for row in conn.execute("SELECT event FROM audit_log ORDER BY id")]
+
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO audit_log (event, ref) VALUES ('outer', NULL)")
+            db.insert_audit("inner", None)
+            with db.connect() as reader:
+                reader.execute("SELECT 1").fetchone()
+            raise RuntimeError("boom")
+    assert events() == []
+
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO audit_log (event, ref) VALUES ('outer', NULL)")
+        db.insert_audit("inner", None)
+    assert events() == ["outer", "inner"]
+
+
+def test_auth_writes_join_the_callers_transaction(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+    auth = modules["app.auth"]
+    db.ensure_schema()
+
+    # 不传 conn 时共享线程连接：外层事务回滚时一并撤销，且不会提前提交外层的写入
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO audit_log (event, ref) VALUES ('outer', NULL)")
+            auth.create_user("alice", "secret")
+            auth.set_password("alice", "changed")
+            auth.create_invite("invite-code")
+            assert conn.depth == 1
+            raise RuntimeError("boom")
+    conn = db.connect()
+    assert conn.depth == 0
+    assert conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM auth_users").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM auth_invites").fetchone()[0] == 0
+
+    auth.create_user("bob", "secret")
+    assert auth.authenticate("bob", "secret")
@@ -0,0 +1,105 @@
+import os
+from uuid import uuid4
+
+import pytest
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def test_publish_swaps_symlink_and_rolls_back(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    (config.WWW_DIR / "legacy.html").write_text("old layout", encoding="utf-8")
+    uid = uuid4().hex
+    make_image(config.RAW_DIR / f"{uid}.png")
+    assert worker.process_file(config.RAW_DIR / f"{uid}.png")
+    assert worker.publish_ready_images()
+
+    assert config.WWW_DIR.is_symlink()
+    first = static_site.live_site_dir()
+    assert first.parent == config.GENERATIONS_DIR
+    assert (config.WWW_DIR / "index.html").exists()
+    names = [path.name for path in static_site.list_generations()]
+    assert names[0] == first.name
+    assert any(name.startswith("legacy_") for name in names)
+    with db.connect() as conn:
+        row = conn.execute("SELECT build_id, generation FROM builds ORDER BY id DESC LIMIT 1").fetchone()
+    assert row["generation"] == first.name == row["build_id"]
+
+    second = worker.rebuild_and_publish(full_rebuild=True)
+    assert static_site.live_site_dir() == second.resolve()
+    assert first.exists()
+
+    assert static_site.rollback() == first
+    assert static_site.live_site_dir() == first.resolve()
+    assert static_site.rollback(second.name) == second
+    with pytest.raises(ValueError):
+        static_site.rollback("missing")
+
+    # 最新的发布代与当前（已回滚到的）发布代都保留
+    static_site.rollback(first.name)
+    removed = static_site.reap_generations(keep=1)
+    assert removed and all(name.startswith("legacy_") for name in removed)
+    assert first.exists() and second.exists()
+
+    static_site.rollback(second.name)
+    assert static_site.reap_generations(keep=1) == [first.name]
+    assert not first.exists()
+    assert static_site.live_site_dir() == second.resolve()
+    assert not list(config.WWW_DIR.parent.glob(".www.*.tmp"))
+    assert not os.path.exists(config.WWW_STAGING / first.name)
+
+
+def test_rollback_survives_static_check(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    uid = uuid4().hex
+    make_image(config.RAW_DIR / f"{uid}.png")
+    assert worker.process_file(config.RAW_DIR / f"{uid}.png")
+    assert worker.publish_ready_images()
+    first = static_site.live_site_dir()
+    assert not worker.ensure_static_up_to_date()
+
+    # 前端源码变更触发一次新的发布
+    source = config.STATIC / "styles" / "gallery.css"
+    stamp = worker.latest_static_mtime() + 10
+    os.utime(source, (stamp, stamp))
+    assert worker.ensure_static_up_to_date()
+    second = static_site.live_site_dir()
+    assert second != first
+
+    # 回滚到旧的发布代后 static 未再变化，worker 不会重新构建把回滚覆盖掉
+    assert static_site.rollback() == first
+    assert not worker.ensure_static_up_to_date()
+    assert static_site.live_site_dir() == first
+
+
+def test_publish_without_reaper_thread_reaps_inline(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    config.PUBLISH_GENERATIONS = 2
+    # 命令行发布（bin/refresh_static.sh、maintenance）不会启动后台清理线程
+    published = []
+    for _ in range(4):
+        worker.rebuild_and_publish(full_rebuild=True)
+        published.append(static_site.live_site_dir())
+    assert static_site.list_generations() == [published[-1], published[-2]]
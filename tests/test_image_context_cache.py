@@ -0,0 +1,57 @@
+import json
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def _add_image(config, worker):
+    raw_path = config.RAW_DIR / f"{uuid4().hex}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+
+
+def test_image_context_recomputed_only_for_changed_rows(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    db_module = modules["app.db"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    _add_image(config, worker)
+    _add_image(config, worker)
+
+    def build():
+        staging = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+        return static_site.load_build_manifest(staging)["stats"]["image_contexts"]
+
+    assert build() == {"reused": 0, "computed": 2}
+    assert config.IMAGE_CONTEXT_CACHE_PATH.exists()
+
+    # 新进程：内存为空，从磁盘缓存恢复
+    static_site._image_context_cache = static_site._ImageContextCache()
+    assert build() == {"reused": 2, "computed": 0}
+
+    target = worker.images_for_site()[0]["uuid"]
+    with db_module.transaction() as conn:
+        conn.execute("UPDATE images SET title_override = ? WHERE uuid = ?", ("新标题", target))
+    assert build() == {"reused": 1, "computed": 1}
+    staging = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+    detail = next(img for img in worker.images_for_site() if img["uuid"] == target)
+    page = staging / static_site.image_detail_path(detail["id"], target).lstrip("/")
+    assert "新标题" in page.read_text(encoding="utf-8")
+
+    # 标签配置变化让所有缓存失效
+    tags_path = config.STATIC / "data" / "tags.json"
+    data = json.loads(tags_path.read_text(encoding="utf-8"))
+    data["tags"].append({"tag": "新标签", "intro": ""})
+    tags_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert build()["computed"] == 2
+
+    with db_module.transaction() as conn:
+        conn.execute("UPDATE images SET deleted_at = CURRENT_TIMESTAMP WHERE uuid = ?", (target,))
+    build()
+    entries = json.loads(config.IMAGE_CONTEXT_CACHE_PATH.read_text(encoding="utf-8"))["entries"]
+    assert set(entries) == {img["uuid"] for img in worker.images_for_site()}
@@ -0,0 +1,70 @@
+import hashlib
+
+import pytest
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def test_analyze_image_single_pass(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    image_utils = modules["app.image_utils"]
+
+    src = tmp_path / "src.png"
+    make_image(src, size=(1920, 1080), color=(10, 200, 40))
+    target = tmp_path / "thumb" / "out.webp"
+
+    result = image_utils.analyze_image(src, target)
+
+    assert (result.width, result.height) == (1920, 1080)
+    assert result.bytes == src.stat().st_size
+    assert result.sha256 == hashlib.sha256(src.read_bytes()).hexdigest()
+    assert (result.thumb_width, result.thumb_height) == (960, 540)
+    assert target.exists()
+    assert result.dominant_color == image_utils.dominant_color(target)
+
+
+def test_analyze_image_rejects_corrupt_file(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    image_utils = modules["app.image_utils"]
+
+    src = tmp_path / "broken.png"
+    make_image(src)
+    src.write_bytes(src.read_bytes()[:64])
+
+    with pytest.raises(Exception):
+        image_utils.analyze_image(src, tmp_path / "thumb.webp")
+
+
+def test_jpeg_thumbnail_uses_reduced_decode(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    image_utils = modules["app.image_utils"]
+
+    src = tmp_path / "large.jpg"
+    from PIL import Image
+
+    Image.new("RGB", (6000, 4000), (120, 80, 200)).save(src, format="JPEG", quality=80)
+
+    assert image_utils.estimate_decode_bytes(src) <= 6000 * 4000 * 4 * 5 // 16
+    result = image_utils.analyze_image(src, tmp_path / "large.webp")
+    assert (result.width, result.height) == (6000, 4000)
+    assert (result.thumb_width, result.thumb_height) == (960, 640)
+
+
+def test_analyze_image_respects_peak_budget(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    image_utils = modules["app.image_utils"]
+
+    src = tmp_path / "wide.png"
+    make_image(src, size=(2400, 1600))
+    target = tmp_path / "wide.webp"
+
+    with pytest.raises(image_utils.DecodeBudgetExceeded):
+        image_utils.analyze_image(src, target, budget_bytes=1024 * 1024)
+    assert not target.exists()
+
+    result = image_utils.analyze_image(src, target, budget_bytes=0)
+    assert (result.thumb_width, result.thumb_height) == (960, 640)
@@ -1,4 +1,5 @@
 import importlib
+import json
 import os
 import shutil
 import sqlite3
@@ -99,3 +100,220 @@ def test_incremental_build_reuses_detail_pages(tmp_path):
     new_search_inode = (staging2 / "static" / "data" / "search_index.json").stat().st_ino
     assert new_search_inode != base_search_inode
     assert (staging2 / "images" / str(image_id2) / "index.html").exists()
+
+
+def test_manifest_rewrites_only_outputs_with_changed_inputs(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    db_module = modules["app.db"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    uuid1 = uuid4().hex
+    uuid2 = uuid4().hex
+    image_id1 = insert_image(db_module, uuid1, "published")
+    image_id2 = insert_image(db_module, uuid2, "published")
+    static_site.publish(static_site.build_site(worker.images_for_site(), full_rebuild=True))
+    assert worker.can_build_incrementally()
+
+    def inode(rel):
+        return (config.WWW_DIR / rel).stat().st_ino
+
+    before = {
+        rel: inode(rel)
+        for rel in [
+            f"images/{image_id1}/index.html",
+            f"images/{image_id2}/index.html",
+            "admin/index.html",
+            "tags/index.html",
+            "sitemap.xml",
+            "index.html",
+        ]
+    }
+
+    with db_module.transaction() as conn:
+        conn.execute("UPDATE images SET title_override='新标题' WHERE uuid=?", (uuid1,))
+    staging = static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False)
+    static_site.publish(staging)
+
+    manifest = static_site.load_build_manifest(config.WWW_DIR)
+    assert manifest["stats"]["rendered"] <= 6
+    assert manifest["stats"]["removed"] <= 2  # 旧的搜索分片与倒排索引
+    assert inode(f"images/{image_id1}/index.html") != before[f"images/{image_id1}/index.html"]
+    assert "新标题" in (config.WWW_DIR / "images" / str(image_id1) / "index.html").read_text()
+    assert inode("index.html") != before["index.html"]
+    for rel in [f"images/{image_id2}/index.html", "admin/index.html", "tags/index.html", "sitemap.xml"]:
+        assert inode(rel) == before[rel], rel
+
+    with db_module.transaction() as conn:
+        conn.execute("UPDATE images SET deleted_at=CURRENT_TIMESTAMP WHERE uuid=?", (uuid2,))
+    staging = static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False)
+    assert not (staging / "images" / str(image_id2)).exists()
+    assert (staging / "images" / str(image_id1) / "index.html").exists()
+    assert static_site.load_build_manifest(staging)["stats"]["removed"] >= 2
+
+
+def test_paginated_archive_pages_stay_stable(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    db_module = modules["app.db"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+    config.LIST_PAGE_SIZE = 2
+
+    def add_image(idx):
+        uid = uuid4().hex
+        image_id = insert_image(db_module, uid, "published")
+        with db_module.transaction() as conn:
+            conn.execute(
+                "UPDATE images SET created_at=? WHERE id=?",
+                (f"2024-01-01 00:00:{idx:02d}", image_id),
+            )
+        return image_id
+
+    ids = [add_image(idx) for idx in range(6)]
+    static_site.publish(static_site.build_site(worker.images_for_site(), full_rebuild=True))
+
+    page1 = config.WWW_DIR / "page" / "1" / "index.html"
+    page2 = config.WWW_DIR / "page" / "2" / "index.html"
+    html = page1.read_text(encoding="utf-8")
+    assert f"/images/{ids[0]}/" in html and f"/images/{ids[1]}/" in html
+    assert f"/images/{ids[2]}/" not in html
+    assert 'rel="prev" href="/page/2/"' in html
+    assert 'rel="next" href="/page/2/"' in (config.WWW_DIR / "index.html").read_text(encoding="utf-8")
+    assert not (config.WWW_DIR / "page" / "3").exists()
+    assert "/page/2/" in (config.WWW_DIR / "sitemap.xml").read_text(encoding="utf-8")
+    inodes = (page1.stat().st_ino, page2.stat().st_ino)
+
+    newest = add_image(6)
+    static_site.publish(
+        static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False)
+    )
+    assert (page1.stat().st_ino, page2.stat().st_ino) == inodes
+    assert f"/images/{newest}/" in (config.WWW_DIR / "index.html").read_text(encoding="utf-8")
+
+
+def test_search_index_chunks_are_content_addressed(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    db_module = modules["app.db"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+    config.SEARCH_CHUNK_SIZE = 2
+
+    for idx in range(6):
+        image_id = insert_image(db_module, uuid4().hex, "published")
+        with db_module.transaction() as conn:
+            conn.execute(
+                "UPDATE images SET created_at=? WHERE id=?",
+                (f"2024-01-01 00:00:{idx:02d}", image_id),
+            )
+    static_site.publish(static_site.build_site(worker.images_for_site(), full_rebuild=True))
+
+    data_dir = config.WWW_DIR / "static" / "data"
+
+    def load_manifest():
+        return json.loads((data_dir / "search_manifest.json").read_text(encoding="utf-8"))
+
+    manifest = load_manifest()
+    assert manifest["chunked"] is True
+    assert manifest["total"] == 6
+    assert [chunk["images"] for chunk in manifest["chunks"]] == [2, 2, 2]
+    assert manifest["chunks"][0]["newest"] > manifest["chunks"][-1]["oldest"]
+    before = {chunk["path"]: (data_dir / chunk["path"]).stat().st_ino for chunk in manifest["chunks"]}
+    postings_before = [chunk["postings"] for chunk in manifest["chunks"]]
+    assert "postings" not in manifest and len(set(postings_before)) == 3
+
+    insert_image(db_module, uuid4().hex, "processed")
+    staging = static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False)
+    static_site.publish(staging)
+
+    manifest = load_manifest()
+    paths = [chunk["path"] for chunk in manifest["chunks"]]
+    assert [chunk["images"] for chunk in manifest["chunks"]] == [3, 2, 2]
+    assert paths[0] not in before
+    for path in paths[1:]:
+        assert (data_dir / path).stat().st_ino == before[path]
+    files = sorted(p.name for p in (data_dir / "search").iterdir() if not p.name.startswith("postings-"))
+    assert files == sorted(Path(p).name for p in paths)
+    # 倒排索引按分片切开：新作品只让最新一片的倒排文件换名
+    postings = [chunk["postings"] for chunk in manifest["chunks"]]
+    assert postings[0] not in postings_before
+    assert postings[1:] == postings_before[1:]
+
+    # 筛选走 /api/search 时不生成倒排索引
+    config.SEARCH_API_MIN_INDEX_BYTES = 0
+    static_site.publish(static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False))
+    manifest = load_manifest()
+    assert manifest["search_api"] == "/api/search"
+    assert all("postings" not in chunk for chunk in manifest["chunks"])
+    assert not list((data_dir / "search").glob("postings-*"))
+
+
+def test_search_postings_expand_parents_and_delta_encode(tmp_path):
+    seed_test_root(tmp_path)
+    static_site = setup_env(tmp_path)["app.static_site"]
+
+    images = [
+        {"id": 7, "title": "夏日猫咪", "description": "", "tags": ["猫咪"]},
+        {"id": 3, "title": "Blue Sky", "description": "clouds", "tags": ["风景"]},
+        {"id": 12, "title": "黑猫", "description": "", "tags": ["猫咪", "风景"]},
+    ]
+    postings = static_site.search_postings(images, {"猫咪": ["动物"], "动物": ["生物"]})
+
+    def decode(deltas):
+        ids, current = [], 0
+        for delta in deltas:
+            current += delta
+            ids.append(current)
+        return ids
+
+    assert postings["tags"]["猫咪"] == [7, 5]
+    assert decode(postings["tags"]["生物"]) == [7, 12]
+    assert decode(postings["tags"]["风景"]) == [3, 12]
+    assert decode(postings["terms"]["猫咪"]) == [7, 12]
+    assert decode(postings["terms"]["sk"]) == [3]
+    assert not any(" " in gram for gram in postings["terms"])
+
+
+def test_layout_pages_untouched_when_only_images_change(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    db_module = modules["app.db"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    insert_image(db_module, uuid4().hex, "published")
+    static_site.publish(static_site.build_site(worker.images_for_site(), full_rebuild=True))
+    layout_pages = [
+        "admin/index.html",
+        "admin/images/index.html",
+        "admin/upload/index.html",
+        "admin/collections/index.html",
+        "admin/auth/index.html",
+        "admin/tags/index.html",
+        "auth/login/index.html",
+        "auth/register/index.html",
+        "404.html",
+        "maintenance.html",
+        "error/index.html",
+        "dmca/index.html",
+        "wiki/index.html",
+        "my/index.html",
+        "favorites/index.html",
+    ]
+    before = {rel: (config.WWW_DIR / rel).stat().st_ino for rel in layout_pages}
+
+    insert_image(db_module, uuid4().hex, "processed")
+    static_site.publish(
+        static_site.build_site(worker.images_for_site(), base_dir=config.WWW_DIR, full_rebuild=False)
+    )
+    written = set(static_site.load_build_manifest(config.WWW_DIR)["written"])
+    assert "index.html" in written
+    assert not written & set(layout_pages)
+    for rel in layout_pages:
+        assert (config.WWW_DIR / rel).stat().st_ino == before[rel], rel
@@ -84,3 +84,30 @@ def test_regenerate_thumbnails_replaces_old_jpg(tmp_path):
     assert row["thumb_path"].endswith(".webp")
     assert (config.THUMB_DIR / row["thumb_path"].split("/")[-1]).exists()
     assert not old_jpg.exists()
+
+
+def test_regenerate_thumbnails_decodes_over_budget_originals_in_child(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    maintenance = modules["app.maintenance"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    uid = "e" * 32
+    raw_path = config.RAW_DIR / f"{uid}.png"
+    make_image(raw_path, size=(400, 300))
+    assert worker.process_file(raw_path)
+
+    # 入库之后调小预算：原图已超出常规预算，重新生成时不能计入失败
+    config.IMAGE_PEAK_BUDGET_BYTES = 64 * 1024
+    report = maintenance.regenerate_thumbnails(publish=False)
+    assert report["updated"] == 1
+    assert report["failed"] == []
+
+    with db.connect() as conn:
+        row = conn.execute("SELECT thumb_path, thumb_renditions FROM images WHERE uuid=?", (uid,)).fetchone()
+    assert row["thumb_renditions"]
+    assert (config.THUMB_DIR / row["thumb_path"].split("/")[-1]).exists()
@@ -1,3 +1,4 @@
+import datetime
 import importlib
 import json
 import os
@@ -47,8 +48,10 @@ def reload_modules():
         "app.db",
         "app.image_utils",
         "app.tagging",
+        "app.site_clone",
         "app.static_site",
         "app.upload_service",
+        "app.watcher",
         "app.worker",
         "app.maintenance",
     ]:
@@ -664,6 +667,34 @@ def test_status_snapshot_and_page(tmp_path):
     assert persist_history.exists()
 
 
+def test_status_history_is_trimmed_by_time_window(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+
+    storage.ensure_dirs()
+    worker.write_status_snapshot()
+    history_path = config.STATUS_DATA_DIR / "status_history.json"
+    latest = json.loads(history_path.read_text())[-1]
+    now = datetime.datetime.fromisoformat(latest["generated_at"])
+
+    def snapshot(seconds_ago):
+        return {**latest, "generated_at": (now - datetime.timedelta(seconds=seconds_ago)).isoformat()}
+
+    # 快照间隔随 worker 唤醒变化：曲线只保留时间窗口内的点，而不是固定条数
+    old = [snapshot(config.STATUS_HISTORY_SECONDS + 3600 - i * 60) for i in range(50)]
+    recent = [snapshot(300), snapshot(60), {"generated_at": "bogus"}]
+    history_path.write_text(json.dumps(old + recent), encoding="utf-8")
+    worker.write_status_snapshot()
+    history = json.loads(history_path.read_text())
+    assert [item["generated_at"] for item in history[:2]] == [recent[0]["generated_at"], recent[1]["generated_at"]]
+    assert len(history) == 3
+    published = json.loads((config.WWW_DIR / "static" / "status_history.json").read_text())
+    assert published == history
+
+
 def test_status_snapshot_marks_force_rebuild_on_sync_failure(tmp_path, monkeypatch):
     seed_test_root(tmp_path)
     modules = setup_env(tmp_path)
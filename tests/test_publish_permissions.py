@@ -0,0 +1,59 @@
+import os
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def test_publish_writes_public_modes_under_strict_umask(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    raw_path = config.RAW_DIR / f"{uuid4().hex}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+
+    old_umask = os.umask(0o077)
+    try:
+        assert worker.publish_ready_images()
+    finally:
+        os.umask(old_umask)
+
+    manifest = static_site.load_build_manifest(config.WWW_DIR)
+    assert "index.html" in manifest["written"]
+    for rel in ["index.html", "tags/index.html", "static/data/search_manifest.json"]:
+        assert ((config.WWW_DIR / rel).stat().st_mode & 0o777) == 0o644, rel
+    for rel in ["", "tags", "static/data/search"]:
+        assert ((config.WWW_DIR / rel).stat().st_mode & 0o777) == 0o755, rel
+
+
+def test_permission_audit_samples_and_escalates(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    raw_path = config.RAW_DIR / f"{uuid4().hex}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+    assert worker.publish_ready_images()
+
+    clean = static_site.audit_www_permissions(sample=8)
+    assert clean["checked"] >= 8
+    assert clean["fixed"] == 0 and not clean["full_repair"]
+    assert static_site.audit_www_permissions(sample=0)["checked"] == 0
+
+    css_file = config.WWW_DIR / "static" / "styles" / "gallery.css"
+    css_file.chmod(0o600)
+    config.WWW_DIR.chmod(0o700)
+    result = static_site.audit_www_permissions(sample=1)
+    assert result["full_repair"]
+    assert (config.WWW_DIR.stat().st_mode & 0o777) == 0o755
+    assert (css_file.stat().st_mode & 0o777) == 0o644
@@ -0,0 +1,70 @@
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_scheduler_waits_for_quiet_period_and_caps_delay(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    worker = modules["app.worker"]
+
+    clock = FakeClock()
+    scheduler = worker.PublishScheduler(quiet_seconds=3, max_delay_seconds=10, max_batch=5, clock=clock)
+    assert not scheduler.due()
+    assert scheduler.seconds_until_due() is None
+
+    scheduler.observe(1)
+    assert scheduler.seconds_until_due() == 3
+    clock.now += 2
+    scheduler.observe(2)
+    assert not scheduler.due()
+    assert scheduler.remaining_capacity() == 3
+
+    for count in range(3, 6):
+        clock.now += 2
+        scheduler.observe(count)
+    assert scheduler.remaining_capacity() == 0
+    assert scheduler.due()
+
+    scheduler.reset()
+    scheduler.max_batch = 100
+    for count in range(1, 7):
+        scheduler.observe(count)
+        clock.now += 2
+    assert scheduler.due()
+
+    scheduler.observe(0)
+    assert not scheduler.due()
+
+
+def test_batched_publish_records_image_count(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    for idx in range(3):
+        make_image(config.RAW_DIR / f"{uuid4().hex}.png", size=(200 + idx, 120))
+
+    assert worker.drain_raw_queue(limit=2)
+    assert worker.pending_publish_count() == 2
+    assert worker.drain_raw_queue(limit=2)
+    assert worker.pending_publish_count() == 3
+    assert not worker.drain_raw_queue(limit=2)
+
+    assert worker.publish_ready_images()
+    with db.connect() as conn:
+        builds = conn.execute("SELECT image_count FROM builds").fetchall()
+    assert [row["image_count"] for row in builds] == [3]
+    assert worker.collect_status_metrics()["last_build"]["image_count"] == 3
@@ -0,0 +1,119 @@
+from test_pipeline import seed_test_root, setup_env
+
+# 与各列表接口相同的 WHERE / ORDER BY 形态
+HOT_QUERIES = {
+    "idx_images_live_created": (
+        "SELECT uuid FROM images WHERE deleted_at IS NULL ORDER BY created_at DESC",
+        (),
+    ),
+    "idx_images_trash_created": (
+        "SELECT uuid FROM images WHERE deleted_at IS NOT NULL ORDER BY created_at DESC",
+        (),
+    ),
+    "idx_images_owner_live_created": (
+        "SELECT uuid FROM images WHERE deleted_at IS NULL AND owner_user_id=? ORDER BY created_at DESC",
+        (1,),
+    ),
+    "idx_images_site_created": (
+        """
+        SELECT uuid FROM images INDEXED BY idx_images_site_created
+        WHERE status IN ('processed','published')
+          AND deleted_at IS NULL
+        ORDER BY created_at DESC
+        """,
+        (),
+    ),
+    "idx_user_favorites_created": (
+        """
+        SELECT f.image_uuid FROM user_favorites f
+        JOIN images i ON i.uuid = f.image_uuid
+        WHERE f.user_id=? AND i.deleted_at IS NULL
+        ORDER BY f.created_at DESC
+        """,
+        (1,),
+    ),
+    "idx_user_gallery_images_order": (
+        """
+        SELECT i.uuid FROM user_gallery_images gi
+        JOIN images i ON i.uuid = gi.image_uuid
+        WHERE gi.gallery_id=? AND i.deleted_at IS NULL
+        ORDER BY gi.position DESC, gi.created_at DESC
+        """,
+        (1,),
+    ),
+}
+
+
+def _plan(conn, sql, params):
+    return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def test_hot_list_queries_use_matching_indexes(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+    db.ensure_schema()
+
+    with db.connect() as conn:
+        for index, (sql, params) in HOT_QUERIES.items():
+            plan = _plan(conn, sql, params)
+            assert any(index in step for step in plan), (index, plan)
+            # 排序直接由索引顺序给出，不需要临时 B 树，也不扫描整张 images
+            assert not any("TEMP B-TREE" in step for step in plan), (index, plan)
+            assert not any(step.startswith("SCAN") and "USING" not in step for step in plan), (index, plan)
+
+
+def test_indexes_added_to_existing_databases(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+
+    with db.transaction() as conn:
+        for index in HOT_QUERIES:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+    db._SCHEMA_READY = False
+    db.ensure_schema()
+    with db.connect() as conn:
+        names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert set(HOT_QUERIES) <= names
+
+
+def test_keyset_pages_continue_from_the_index(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    db = modules["app.db"]
+    db.ensure_schema()
+
+    shapes = [
+        ("FROM images WHERE deleted_at IS NULL", (), ("created_at", "id"), "idx_images_live_created"),
+        (
+            "FROM images WHERE deleted_at IS NULL AND owner_user_id=?",
+            (1,),
+            ("created_at", "id"),
+            "idx_images_owner_live_created",
+        ),
+        (
+            "FROM user_favorites f JOIN images i ON i.uuid = f.image_uuid WHERE f.user_id=? AND i.deleted_at IS NULL",
+            (1,),
+            ("f.created_at", "f.rowid"),
+            "idx_user_favorites_created",
+        ),
+        (
+            "FROM user_gallery_images gi JOIN images i ON i.uuid = gi.image_uuid WHERE gi.gallery_id=? AND i.deleted_at IS NULL",
+            (1,),
+            ("gi.position", "gi.created_at", "gi.rowid"),
+            "idx_user_gallery_images_order",
+        ),
+    ]
+    conn = db.connect()
+    for from_where, params, order, index in shapes:
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            db.keyset_page(conn, "1 AS one", from_where, params, order, [0] * len(order), 10)
+        finally:
+            conn.set_trace_callback(None)
+        sql = next(stmt for stmt in statements if stmt.lstrip().startswith("SELECT"))
+        plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        assert any(index in step for step in plan), (index, plan)
+        assert not any("TEMP B-TREE" in step for step in plan), (index, plan)
@@ -0,0 +1,206 @@
+import importlib
+import json
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def _write_tags(config, tags):
+    data_dir = config.STATIC / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    (data_dir / "tags.json").write_text(json.dumps({"tags": tags}, ensure_ascii=False), encoding="utf-8")
+
+
+def test_search_api_ranks_and_expands_tags(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    auth = modules["app.auth"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+    fulltext = importlib.import_module("app.fulltext")
+
+    storage.ensure_dirs()
+    _write_tags(
+        config,
+        [
+            {"tag": "动物"},
+            {"tag": "猫咪", "aliases": ["kitty"], "parents": ["动物"]},
+            {"tag": "天空"},
+        ],
+    )
+    auth.create_user("admin", "secret", groups=[config.ADMIN_GROUP])
+    cat, sky, hidden = uuid4().hex, uuid4().hex, uuid4().hex
+    for uid in (cat, sky, hidden):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+    with db.transaction() as conn:
+        conn.execute("UPDATE images SET deleted_at=CURRENT_TIMESTAMP WHERE uuid=?", (hidden,))
+
+    app = upload_service.create_app()
+    client = app.test_client()
+    resp = client.post("/upload/admin/login", json={"username": "admin", "password": "secret"})
+    assert resp.status_code == 200
+    updates = {
+        cat: {"title": "Sleepy Cat 窗台上的猫", "description": "午后阳光", "tags": "#猫咪 #动物"},
+        sky: {"title": "Sunset Sky", "description": "a cloud shaped like a cat 猫形状的云朵", "tags": "#天空"},
+        hidden: {"title": "Sunset cat", "tags": "#猫咪 #动物"},
+    }
+    for uid, payload in updates.items():
+        assert client.post(f"/upload/admin/images/{uid}/update", json=payload).status_code == 200
+    # 旧数据可能只有子标签（或别名写法），检索时按标签层级补齐
+    with db.transaction() as conn:
+        conn.execute("UPDATE images SET tags_json=? WHERE uuid=?", (json.dumps(["kitty"]), cat))
+        db.write_image_tags(conn, cat, json.dumps(["kitty"]))
+        fulltext.update_images(conn, [cat])
+
+    def search(query):
+        resp = client.get(f"/api/search?{query}")
+        assert resp.status_code == 200, resp.get_json()
+        return resp.get_json()
+
+    # 标题命中排在简介命中之前；回收站中的作品不出现
+    assert [item["uuid"] for item in search("q=cat")["images"]] == [cat, sky]
+    # 不足 3 个字符的词无法走 trigram，按时间倒序返回
+    assert [item["uuid"] for item in search("q=猫")["images"]] == [sky, cat]
+    assert [item["uuid"] for item in search("q=sunset")["images"]] == [sky]
+    # 别名与祖先标签写入索引，标签筛选包含子标签
+    assert [item["uuid"] for item in search("q=kitty")["images"]] == [cat]
+    assert [item["uuid"] for item in search("q=动物")["images"]] == [cat]
+    assert [item["uuid"] for item in search("tag=动物")["images"]] == [cat]
+    record = search("tag=猫咪")["images"][0]
+    assert record["tags"] == ["猫咪"]
+    assert record["orientation"] == "landscape"
+    assert {"detail_path", "thumb_filename", "size_bucket", "bytes"} <= set(record)
+
+    page = search("limit=1")
+    assert len(page["images"]) == 1 and page["next_cursor"]
+    rest = search(f"limit=1&cursor={page['next_cursor']}")
+    assert {page["images"][0]["uuid"], rest["images"][0]["uuid"]} == {cat, sky}
+    assert rest["next_cursor"] is None
+    assert client.get("/api/search?cursor=bogus").status_code == 400
+    assert client.get(f"/api/search?cursor={db.encode_cursor([True])}").status_code == 400
+
+    # 后台文本过滤与公开搜索共用 images_fts，但只匹配标题/简介/原文件名
+    def admin_uuids(query):
+        return [item["uuid"] for item in client.get(f"/upload/admin/images?q={query}").get_json()["images"]]
+
+    assert admin_uuids("sleepy") == [cat]
+    assert admin_uuids("kitty") == []
+
+    # 编辑后立即可搜；标签层级变化后由 worker 整列重写，搜索请求本身不写库
+    client.post(f"/upload/admin/images/{sky}/update", json={"title": "晚霞", "tags": "#天空"})
+    assert search("q=sunset")["images"] == []
+    _write_tags(config, [{"tag": "自然"}, {"tag": "天空", "parents": ["自然"]}, {"tag": "猫咪"}])
+    assert [item["uuid"] for item in search("tag=自然")["images"]] == [sky]
+    assert [item["uuid"] for item in search("q=kitty")["images"]] == [cat]
+    assert worker.refresh_search_index()
+    assert not worker.refresh_search_index()
+    assert search("q=kitty")["images"] == []
+    assert [item["uuid"] for item in search("q=自然")["images"]] == [sky]
+
+
+def test_search_reads_collections_synced_by_worker(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+
+    storage.ensure_dirs()
+    mine, other = uuid4().hex, uuid4().hex
+    for uid in (mine, other):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+    worker.refresh_search_index()
+    cfg_path = config.STATIC / "data" / "collections.json"
+    cfg_path.write_text(
+        json.dumps(
+            {
+                "collections": {"mine": {"title": "我的作品", "uuids": [mine]}, "favorites": {"title": "他人作品"}},
+                "default_collection": "favorites",
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    client = upload_service.create_app().test_client()
+
+    def collection_uuids():
+        resp = client.get("/api/search?collection=mine")
+        assert resp.status_code == 200
+        return [item["uuid"] for item in resp.get_json()["images"]]
+
+    # 公开搜索只读 image_collections，不在请求里重写
+    with db.connect() as conn:
+        before = conn.total_changes
+        assert collection_uuids() == []
+        assert conn.total_changes == before
+    worker.refresh_search_index()
+    assert collection_uuids() == [mine]
+
+
+def test_legacy_fts_tables_are_merged_into_images_fts(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    fulltext = importlib.import_module("app.fulltext")
+
+    storage.ensure_dirs()
+    _write_tags(config, [{"tag": "猫咪", "aliases": ["kitty"]}])
+    uid = uuid4().hex
+    raw_path = config.RAW_DIR / f"{uid}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+    with db.transaction() as conn:
+        conn.execute("UPDATE images SET title_override='Sleepy Cat', tags_json=? WHERE uuid=?", ('["猫咪"]', uid))
+        # 旧版：外部内容的 images_fts（无 tags 列）加独立的 search_fts
+        for trigger in ("images_fts_insert", "images_fts_delete", "images_fts_update"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE images_fts")
+        conn.execute(
+            "CREATE VIRTUAL TABLE images_fts USING fts5(title_override, description, original_name, "
+            "content='images', content_rowid='id', tokenize='trigram')"
+        )
+        conn.execute("CREATE VIRTUAL TABLE search_fts USING fts5(title, description, original_name, tags)")
+    db._SCHEMA_READY = False
+    db.ensure_schema()
+
+    with db.connect() as conn:
+        names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master")}
+        assert "search_fts" not in names
+        assert [row["uuid"] for row in fulltext.search(conn, "kitty")] == [uid]
+        assert [row["uuid"] for row in fulltext.search(conn, "sleepy")] == [uid]
+
+
+def test_search_manifest_points_to_api_for_large_indexes(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    raw_path = config.RAW_DIR / f"{uuid4().hex}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+
+    def manifest():
+        staging = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+        return json.loads((staging / "static" / "data" / "search_manifest.json").read_text(encoding="utf-8"))
+
+    assert "search_api" not in manifest()
+    config.SEARCH_API_MIN_INDEX_BYTES = 0
+    assert manifest()["search_api"] == "/api/search"
+    config.SEARCH_API = False
+    assert "search_api" not in manifest()
@@ -0,0 +1,59 @@
+import errno
+import os
+
+from test_pipeline import seed_test_root, setup_env
+
+
+def _make_tree(root):
+    (root / "images" / "1").mkdir(parents=True)
+    (root / "index.html").write_text("home", encoding="utf-8")
+    (root / "images" / "1" / "index.html").write_text("detail", encoding="utf-8")
+    (root / "static").mkdir()
+    (root / "static" / "app.js").write_text("js", encoding="utf-8")
+
+
+def test_hardlink_clone_counts_and_atomic_write_breaks_link(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    site_clone = modules["app.site_clone"]
+    static_site = modules["app.static_site"]
+
+    src = tmp_path / "published"
+    dst = tmp_path / "staging"
+    _make_tree(src)
+
+    stats = site_clone.clone_tree(src, dst, preferred="hardlink")
+    assert stats.strategy == "hardlink"
+    assert (stats.files, stats.linked, stats.copied, stats.dirs) == (3, 3, 0, 4)
+    assert os.path.samefile(src / "index.html", dst / "index.html")
+
+    static_site._atomic_write_text(dst / "index.html", "new home")
+    assert (src / "index.html").read_text(encoding="utf-8") == "home"
+    assert (dst / "index.html").read_text(encoding="utf-8") == "new home"
+
+    # 残留的 .tmp 同样可能是线上文件的硬链接，写入前必须断开
+    os.link(src / "static" / "app.js", dst / "static" / "app.js.tmp")
+    static_site._atomic_write_text(dst / "static" / "app.js", "js2")
+    assert (src / "static" / "app.js").read_text(encoding="utf-8") == "js"
+
+
+def test_clone_falls_back_per_file_when_links_unsupported(tmp_path, monkeypatch):
+    seed_test_root(tmp_path)
+    site_clone = setup_env(tmp_path)["app.site_clone"]
+
+    src = tmp_path / "published"
+    dst = tmp_path / "staging"
+    _make_tree(src)
+    calls = []
+
+    def refuse_link(a, b):
+        calls.append(a)
+        raise OSError(errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(site_clone.os, "link", refuse_link)
+    stats = site_clone.clone_tree(src, dst, preferred="hardlink")
+    assert len(calls) == 1
+    assert stats.strategy == "copy"
+    assert (stats.linked, stats.copied) == (0, 3)
+    assert stats.bytes_copied == len("home") + len("detail") + len("js")
+    assert (dst / "images" / "1" / "index.html").read_text(encoding="utf-8") == "detail"
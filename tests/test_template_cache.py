@@ -0,0 +1,37 @@
+import os
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def test_template_environment_reused_until_templates_change(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    static_site = modules["app.static_site"]
+
+    storage.ensure_dirs()
+    raw_path = config.RAW_DIR / f"{uuid4().hex}.png"
+    make_image(raw_path)
+    assert worker.process_file(raw_path)
+
+    first = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+    stats = static_site.load_build_manifest(first)["stats"]["templates"]
+    assert stats["loaded"] > 0
+    assert stats["render_seconds"] > 0
+    env = static_site._template_cache.environment()
+    assert any(config.TEMPLATE_CACHE_DIR.iterdir())
+
+    second = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+    assert static_site.load_build_manifest(second)["stats"]["templates"]["loaded"] == 0
+    assert static_site._template_cache.environment() is env
+
+    template = static_site.TEMPLATE_DIR / "404.html.j2"
+    template.write_text(template.read_text(encoding="utf-8") + "\n<!-- changed -->", encoding="utf-8")
+    st = template.stat()
+    os.utime(template, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    third = static_site.build_site(worker.images_for_site(), full_rebuild=True)
+    assert static_site._template_cache.environment() is not env
+    assert "<!-- changed -->" in (third / "404.html").read_text(encoding="utf-8")
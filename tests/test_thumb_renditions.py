@@ -0,0 +1,60 @@
+from pathlib import Path
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def test_worker_generates_rendition_ladder_and_srcset(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    maintenance = modules["app.maintenance"]
+    image_utils = modules["app.image_utils"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    uid = uuid4().hex
+    raw_path = config.RAW_DIR / f"{uid}.png"
+    make_image(raw_path, size=(1600, 1200))
+
+    assert worker.process_file(raw_path)
+    assert worker.publish_ready_images()
+
+    with db.connect() as conn:
+        row = conn.execute(
+            "SELECT thumb_path, thumb_width, thumb_renditions FROM images WHERE uuid=?",
+            (uid,),
+        ).fetchone()
+    thumb_name = Path(row["thumb_path"]).name
+    stem = Path(thumb_name).stem
+    renditions = image_utils.parse_renditions(row["thumb_renditions"])
+    assert [(r["file"], r["width"], r["height"]) for r in renditions] == [
+        (f"{stem}-480w{config.THUMB_EXT}", 480, 360),
+        (f"{stem}-240w{config.THUMB_EXT}", 240, 180),
+    ]
+    assert all((config.THUMB_DIR / r["file"]).exists() for r in renditions)
+
+    html = (config.WWW_DIR / "index.html").read_text()
+    expected = (
+        f'srcset="/thumb/{stem}-240w{config.THUMB_EXT} 240w, '
+        f'/thumb/{stem}-480w{config.THUMB_EXT} 480w, /thumb/{thumb_name} 960w"'
+    )
+    assert expected in html
+    assert f'sizes="{config.THUMB_SIZES_ATTR}"' in html
+
+    assert maintenance.cleanup_orphan_thumbs() == []
+
+
+def test_small_image_skips_renditions(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    image_utils = modules["app.image_utils"]
+
+    src = tmp_path / "small.png"
+    make_image(src, size=(200, 120))
+    result = image_utils.analyze_image(src, tmp_path / "thumb" / "small.webp")
+
+    assert result.renditions == ()
+    assert result.renditions_json() == "[]"
@@ -297,3 +297,71 @@ def test_user_gallery_flow(tmp_path):
     resp = client.get(f"/api/galleries/{gallery_id}/images", headers=headers, base_url=base_url)
     data = resp.get_json()
     assert not data["images"]
+
+
+def _collect_pages(client, url, **kwargs):
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        query = f"{url}?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        data = client.get(query, **kwargs).get_json()
+        seen.extend(item["uuid"] for item in data["images"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if not cursor:
+            return seen, pages, data
+
+
+def test_user_lists_use_keyset_pagination(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    auth = modules["app.auth"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+    upload_service = modules["app.upload_service"]
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+
+    storage.ensure_dirs()
+    alice = auth.create_user("alice", "secret123", groups=["user"])
+    uids = [str(n) * 32 for n in range(1, 6)]
+    for uid in uids:
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        assert worker.process_file(raw_path)
+    with db.transaction() as conn:
+        # 同一秒内的作品靠 id 区分先后
+        conn.execute("UPDATE images SET owner_user_id=?, created_at='2025-01-01 00:00:00'", (alice.id,))
+        conn.execute("UPDATE images SET created_at='2025-01-02 00:00:00' WHERE uuid=?", (uids[0],))
+        expected = [row["uuid"] for row in conn.execute("SELECT uuid FROM images ORDER BY created_at DESC, id DESC")]
+    assert expected[0] == uids[0]
+
+    app = upload_service.create_app()
+    client = app.test_client()
+    assert _login(client, "alice", "secret123").status_code == 200
+    headers = {"X-Forwarded-Proto": "https"}
+    base_url = "https://example.com"
+
+    seen, pages, _ = _collect_pages(client, "/api/my/images", headers=headers, base_url=base_url)
+    assert seen == expected
+    assert pages == 3
+
+    for uid in reversed(uids):
+        resp = client.post(f"/api/favorites/{uid}/toggle", headers=headers, base_url=base_url)
+        assert resp.status_code == 200
+    seen, pages, last = _collect_pages(client, "/api/favorites", headers=headers, base_url=base_url)
+    assert sorted(seen) == sorted(uids)
+    assert len(set(seen)) == len(uids)
+    assert last["total"] == len(uids)
+
+    resp = client.get("/api/my/images?cursor=not-a-cursor", headers=headers, base_url=base_url)
+    assert resp.status_code == 400
+    # 构造的游标（对象、布尔值）在绑定到 SQL 之前就被拒绝
+    for crafted in ([{}, {}], [True, 1], [None, 1]):
+        resp = client.get(
+            f"/api/my/images?cursor={db.encode_cursor(crafted)}", headers=headers, base_url=base_url
+        )
+        assert resp.status_code == 400
+    resp = client.get("/api/my/images?limit=0", headers=headers, base_url=base_url)
+    assert resp.status_code == 400
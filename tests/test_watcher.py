@@ -0,0 +1,58 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+
+def _fire_later(action, delay=0.05):
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify 仅在 Linux 可用")
+def test_inotify_wakes_on_raw_flag_and_static(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    watcher_mod = modules["app.watcher"]
+
+    storage.ensure_dirs()
+    watcher = watcher_mod.create_watcher()
+    try:
+        assert watcher.event_driven
+        assert watcher.wait(0.05) == set()
+
+        _fire_later(lambda: make_image(config.RAW_DIR / "a.png"))
+        started = time.monotonic()
+        assert watcher_mod.RAW in watcher.wait(5)
+        assert time.monotonic() - started < 2
+
+        (config.STORAGE / ".upload_paused").write_text("x", encoding="utf-8")
+        assert watcher.wait(0.05) == set()
+        _fire_later(lambda: config.FORCE_REBUILD_FLAG.write_text("x", encoding="utf-8"))
+        assert watcher.wait(5) == {watcher_mod.FLAG}
+        assert watcher.wait(0.1) == set()
+
+        new_dir = config.STATIC / "js" / "extra"
+        new_dir.mkdir()
+        assert watcher_mod.STATIC in watcher.wait(1)
+        _fire_later(lambda: (new_dir / "x.js").write_text("1", encoding="utf-8"))
+        assert watcher.wait(5) == {watcher_mod.STATIC}
+    finally:
+        watcher.close()
+
+
+def test_poll_mode_fallback(tmp_path, monkeypatch):
+    monkeypatch.setenv("GALLERY_WORKER_WAKEUP", "poll")
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    watcher_mod = modules["app.watcher"]
+
+    watcher = watcher_mod.create_watcher()
+    assert not watcher.event_driven
+    assert watcher.wait(0) == set(watcher_mod.ALL_CHANNELS)
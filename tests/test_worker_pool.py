@@ -0,0 +1,117 @@
+import os
+from pathlib import Path
+from uuid import uuid4
+
+from test_pipeline import make_image, seed_test_root, setup_env
+
+CRASH_UUID = "dead" * 8
+_PARENT_PID = os.getpid()
+_real_analyze = None
+# 在 worker 主进程（而非子进程）里解码过的文件
+main_process_decodes = []
+
+
+def _analyze_or_crash(path, thumb_path, budget_bytes=None):
+    if os.getpid() == _PARENT_PID:
+        main_process_decodes.append(Path(path).name)
+    elif CRASH_UUID in path:
+        os._exit(1)
+    return _real_analyze(path, thumb_path, budget_bytes)
+
+
+def test_parallel_batch_keeps_thumb_order(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    config.WORKER_PROCESSES = 2
+    uids = [uuid4().hex for _ in range(3)]
+    for idx, uid in enumerate(uids):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path, size=(300 + idx * 20, 200))
+        os.utime(raw_path, (1_700_000_000 + idx, 1_700_000_000 + idx))
+
+    bad_uid = uuid4().hex
+    bad_path = config.RAW_DIR / f"{bad_uid}.png"
+    bad_path.write_bytes(b"not an image")
+    os.utime(bad_path, (1_700_000_010, 1_700_000_010))
+
+    assert worker.drain_raw_queue()
+
+    with db.connect() as conn:
+        rows = {
+            row["uuid"]: row
+            for row in conn.execute("SELECT uuid, status, thumb_path, width FROM images").fetchall()
+        }
+    names = [Path(rows[uid]["thumb_path"]).name for uid in uids]
+    assert [name[10:13] for name in names] == ["001", "002", "003"]
+    assert all(rows[uid]["status"] == "processed" for uid in uids)
+    assert [rows[uid]["width"] for uid in uids] == [300, 320, 340]
+    assert all((config.THUMB_DIR / name).exists() for name in names)
+    assert bad_uid not in rows
+    assert (config.QUARANTINE_DIR / bad_path.name).exists()
+
+
+def test_over_budget_image_goes_to_deferred_lane(tmp_path):
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    config.IMAGE_PEAK_BUDGET_BYTES = 64 * 1024
+    uid = uuid4().hex
+    raw_path = config.RAW_DIR / f"{uid}.png"
+    make_image(raw_path, size=(400, 300))
+
+    assert worker.process_file(raw_path) is False
+    deferred_path = config.DEFERRED_DIR / raw_path.name
+    assert deferred_path.exists()
+    assert not raw_path.exists()
+    assert worker.next_raw_file() is None
+
+    assert worker.process_deferred_file()
+    assert raw_path.exists()
+    assert not deferred_path.exists()
+    with db.connect() as conn:
+        row = conn.execute("SELECT status, stored_path FROM images WHERE uuid=?", (uid,)).fetchone()
+    assert row["status"] == "processed"
+    assert row["stored_path"] == f"raw/{raw_path.name}"
+
+
+def test_broken_pool_isolates_the_crashing_file(tmp_path, monkeypatch):
+    global _real_analyze
+    seed_test_root(tmp_path)
+    modules = setup_env(tmp_path)
+    config = modules["app.config"]
+    storage = modules["app.storage"]
+    worker = modules["app.worker"]
+    db = modules["app.db"]
+
+    storage.ensure_dirs()
+    config.WORKER_PROCESSES = 2
+    _real_analyze = worker.analyze_raw_file
+    monkeypatch.setattr(worker, "analyze_raw_file", _analyze_or_crash)
+    main_process_decodes.clear()
+    # 每批 4 张：第一批里有一张会让子进程直接退出，第二批需要新建的进程池
+    uids = [uuid4().hex for _ in range(5)]
+    uids.insert(1, CRASH_UUID)
+    for idx, uid in enumerate(uids):
+        raw_path = config.RAW_DIR / f"{uid}.png"
+        make_image(raw_path)
+        os.utime(raw_path, (1_700_000_000 + idx, 1_700_000_000 + idx))
+
+    assert worker.drain_raw_queue()
+
+    assert main_process_decodes == []
+    assert (config.QUARANTINE_DIR / f"{CRASH_UUID}.png").exists()
+    with db.connect() as conn:
+        statuses = {row["uuid"]: row["status"] for row in conn.execute("SELECT uuid, status FROM images")}
+    assert CRASH_UUID not in statuses
+    assert all(statuses[uid] == "processed" for uid in uids if uid != CRASH_UUID)